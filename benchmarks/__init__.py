@@ -0,0 +1,120 @@
+"""Micro-benchmarks for httpmq python client"""
+
+import asyncio
+import json
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from aiohttp import web
+
+
+def measure_rate(func: Callable[[], None], iterations: int) -> float:
+    """Measure how many times per second a function can be called
+
+    :param func: the function to call
+    :param iterations: number of calls to make
+    :return: calls per second
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def print_table(title: str, header: Tuple[str, ...], rows: List[Tuple[object, ...]]):
+    """Print a simple result table
+
+    :param title: table title
+    :param header: column names
+    :param rows: table rows
+    """
+    widths = [
+        max(len(str(row[idx])) for row in [header] + rows) for idx in range(len(header))
+    ]
+    print(f"\n{title}")
+    for row in [header] + rows:
+        print("  ".join(str(cell).rjust(widths[idx]) for idx, cell in enumerate(row)))
+
+
+class StubDataplane:
+    """
+    Minimal local stand-in for the httpmq dataplane API.
+
+    Publishes are acknowledged without being stored, and every push subscription receives
+    the same pre-built records before the server closes the connection. The server runs
+    its own event loop in a separate thread, so it does not add lag to the measured loop.
+    """
+
+    def __init__(self, records: Optional[List[bytes]] = None):
+        """Constructor
+
+        :param records: NDJSON records sent to every push subscription
+        """
+        self.records = records if records is not None else []
+        self.base_url = None
+        self.__loop = asyncio.new_event_loop()
+        self.__runner: Optional[web.AppRunner] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    async def publish_handler(request: web.Request):
+        """Accept a publish"""
+        await request.read()
+        return web.Response(
+            body=json.dumps(
+                {
+                    "request_id": request.headers.get("Httpmq-Request-Id", ""),
+                    "success": True,
+                }
+            ),
+            content_type="application/json",
+        )
+
+    async def subscribe_handler(self, request: web.Request):
+        """Stream the pre-built records"""
+        response = web.StreamResponse()
+        await response.prepare(request=request)
+        for record in self.records:
+            await response.write(record)
+            await response.write(b"\n")
+        await response.write_eof()
+        return response
+
+    async def __serve(self) -> str:
+        """Start serving on a local port"""
+        app = web.Application(client_max_size=2**30)
+        app.router.add_routes(
+            [
+                web.post("/v1/data/subject/{subject}", StubDataplane.publish_handler),
+                web.get(
+                    "/v1/data/stream/{stream}/consumer/{consumer}",
+                    self.subscribe_handler,
+                ),
+            ]
+        )
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, host="127.0.0.1", port=0)
+        await site.start()
+        return f"http://127.0.0.1:{self.__runner.addresses[0][1]}"
+
+    async def start(self) -> str:
+        """Start serving on a local port
+
+        :return: the base URL of the server
+        """
+        self.__thread = threading.Thread(target=self.__loop.run_forever, daemon=True)
+        self.__thread.start()
+        self.base_url = await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self.__serve(), self.__loop)
+        )
+        return self.base_url
+
+    async def stop(self):
+        """Stop serving"""
+        await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self.__runner.cleanup(), self.__loop)
+        )
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
+        self.__loop.close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""Benchmark the JSON codecs across the publish, ACK and subscribe-decode paths"""
+
+# pylint: disable=no-value-for-parameter
+
+import base64
+import json
+import click
+import httpmq
+from httpmq.codec import JSONCodec, OrjsonCodec, StdlibJSONCodec
+from httpmq.models import DataplaneAckSeqNum, GoutilsRestAPIBaseResponse
+from benchmarks import measure_rate, print_table
+
+PUBLISH_RESPONSE = (
+    b'{"request_id":"3f1f6b46-5cde-4f22-9d0b-6bd1e2b2f6a5","success":true}'
+)
+RECORDS_PER_CHUNK = 100
+
+
+def build_records(count: int, payload_size: int) -> bytes:
+    """Build a push subscription stream chunk containing `count` NDJSON records"""
+    b64_msg = base64.b64encode(b"x" * payload_size).decode("ascii")
+    records = []
+    for seq in range(count):
+        record = {
+            "b64_msg": b64_msg,
+            "consumer": "bench-consumer",
+            "request_id": "bench-request",
+            "sequence": {"consumer": seq, "stream": seq},
+            "stream": "bench-stream",
+            "subject": "bench.subject",
+            "success": True,
+        }
+        records.append(json.dumps(record))
+    return ("\n".join(records) + "\n").encode("utf-8")
+
+
+def legacy_row(iterations: int, chunk: bytes):
+    """Measure the stdlib `json` calls used before the codec abstraction"""
+
+    def publish_resp():
+        GoutilsRestAPIBaseResponse.from_dict(json.loads(PUBLISH_RESPONSE))
+
+    def ack_encode():
+        json.dumps(DataplaneAckSeqNum(consumer=1, stream=1).to_dict()).encode("utf-8")
+
+    def subscribe_decode():
+        _ = [json.loads(line) for line in chunk.decode("utf-8").split("\n") if line]
+
+    return (
+        "legacy",
+        measure_rate(publish_resp, iterations),
+        measure_rate(ack_encode, iterations),
+        measure_rate(subscribe_decode, iterations // RECORDS_PER_CHUNK)
+        * RECORDS_PER_CHUNK,
+    )
+
+
+def codec_row(codec: JSONCodec, iterations: int, chunk: bytes):
+    """Measure one codec"""
+    splitter = httpmq.DataClient.RxMessageSplitter(json_codec=codec)
+
+    def publish_resp():
+        GoutilsRestAPIBaseResponse.from_dict(codec.loads(PUBLISH_RESPONSE))
+
+    def ack_encode():
+        codec.dumps(DataplaneAckSeqNum(consumer=1, stream=1).to_dict())
+
+    def subscribe_decode():
+        splitter.process_new_segment(chunk)
+
+    return (
+        codec.name,
+        measure_rate(publish_resp, iterations),
+        measure_rate(ack_encode, iterations),
+        measure_rate(subscribe_decode, iterations // RECORDS_PER_CHUNK)
+        * RECORDS_PER_CHUNK,
+    )
+
+
+@click.command()
+@click.option("--iterations", default=20000, help="Iterations per measurement")
+@click.option("--payload-size", default=100, help="Message payload size in bytes")
+def main(iterations: int, payload_size: int):
+    """Benchmark the JSON codecs"""
+    codecs = [StdlibJSONCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        print("orjson not installed; only benchmarking the stdlib codec")
+
+    chunk = build_records(count=RECORDS_PER_CHUNK, payload_size=payload_size)
+    rows = [legacy_row(iterations=iterations, chunk=chunk)]
+    rows.extend(
+        codec_row(codec=codec, iterations=iterations, chunk=chunk) for codec in codecs
+    )
+    print_table(
+        title=f"JSON codec throughput (ops/sec, {payload_size} byte payloads)",
+        header=("codec", "publish-resp", "ack-encode", "subscribe-decode"),
+        rows=[(row[0], *[f"{rate:,.0f}" for rate in row[1:]]) for row in rows],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""Benchmark bytes on the wire and CPU cost of each message compressor"""
+
+# pylint: disable=no-value-for-parameter
+
+import functools
+import json
+import click
+from httpmq import compression
+from httpmq.payload import b64encode_buffer
+from benchmarks import measure_rate, print_table
+
+
+def build_payload(size: int) -> bytes:
+    """Build a verbose JSON document of about `size` bytes"""
+    records = []
+    total = 0
+    idx = 0
+    while total < size:
+        record = {
+            "event_id": f"evt-{idx:08d}",
+            "event_type": "sensor.reading",
+            "source": {"site": "site-12", "device": f"device-{idx % 97}"},
+            "value": idx * 0.37,
+            "tags": ["calibrated", "primary"],
+        }
+        records.append(record)
+        total += len(json.dumps(record))
+        idx += 1
+    return json.dumps(records).encode("utf-8")
+
+
+@click.command()
+@click.option("--iterations", default=2000, help="Messages per measurement")
+def main(iterations: int):
+    """Benchmark bytes on the wire and CPU cost of each message compressor"""
+    rows = []
+    compressors = compression.available_compressors()
+    for size in [1024, 16384, 262144]:
+        payload = build_payload(size)
+        count = max(20, iterations * 1024 // size)
+        rows.append(
+            (len(payload), "none", len(b64encode_buffer(payload)), "-", "-", "-")
+        )
+        for name, compressor in compressors.items():
+            compressed = compression.compress(payload, compressor)
+            wire = len(b64encode_buffer(compressed if compressed else payload))
+            compress_rate = measure_rate(
+                functools.partial(compression.compress, payload, compressor), count
+            )
+            decompress_rate = measure_rate(
+                functools.partial(compression.decompress, compressed), count
+            )
+            rows.append(
+                (
+                    len(payload),
+                    name,
+                    wire,
+                    f"{wire / len(b64encode_buffer(payload)):.2f}",
+                    f"{1e6 / compress_rate:.1f}",
+                    f"{1e6 / decompress_rate:.1f}",
+                )
+            )
+    print_table(
+        title=(
+            "Message compression: Base64 bytes on the wire and CPU time per message"
+            f" (compressors available: {', '.join(compressors)})"
+        ),
+        header=(
+            "msg bytes",
+            "compressor",
+            "wire bytes",
+            "wire ratio",
+            "compress usec",
+            "decompress usec",
+        ),
+        rows=rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
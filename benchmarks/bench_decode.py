@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""Benchmark decoding push subscription records into ReceivedMessage"""
+
+# pylint: disable=no-value-for-parameter
+
+import base64
+import json
+import click
+import httpmq
+from httpmq.models import ApisAPIRestRespDataMessage
+from benchmarks import measure_rate, print_table
+
+
+def build_record(payload_size: int) -> bytes:
+    """Build one push subscription NDJSON record"""
+    return json.dumps(
+        {
+            "b64_msg": base64.b64encode(b"x" * payload_size).decode("ascii"),
+            "consumer": "bench-consumer",
+            "request_id": "bench-request",
+            "sequence": {"consumer": 1, "stream": 1},
+            "stream": "bench-stream",
+            "subject": "bench.subject",
+            "success": True,
+        }
+    ).encode("utf-8")
+
+
+def legacy_decode(record: bytes, codec) -> httpmq.ReceivedMessage:
+    """The model based decode used before the fast-path decoder"""
+    parsed = ApisAPIRestRespDataMessage.from_dict(codec.loads(record))
+    return httpmq.ReceivedMessage(
+        stream=parsed.stream,
+        stream_seq=parsed.sequence.stream,
+        consumer=parsed.consumer,
+        consumer_seq=parsed.sequence.consumer,
+        subject=parsed.subject,
+        request_id=parsed.request_id,
+        message=base64.b64decode(parsed.b64_msg),
+    )
+
+
+@click.command()
+@click.option("--iterations", default=20000, help="Iterations per measurement")
+def main(iterations: int):
+    """Benchmark the push subscription record decoders"""
+    decoder = httpmq.DataClient.RxMessageDecoder()
+    rows = []
+    for payload_size in [100, 100 * 1024]:
+        record = build_record(payload_size)
+        count = iterations if payload_size < 1024 else max(1, iterations // 50)
+        legacy = measure_rate(
+            lambda rec=record: legacy_decode(rec, decoder.codec), count
+        )
+        fast = measure_rate(lambda rec=record: decoder(rec).message, count)
+        rows.append(
+            (
+                f"{payload_size:,} B",
+                f"{legacy:,.0f}",
+                f"{fast:,.0f}",
+                f"{fast / legacy:.2f}x",
+            )
+        )
+    print_table(
+        title=f"Record decode throughput (msgs/sec on one core, codec={decoder.codec.name})",
+        header=("payload", "model path", "fast path", "speedup"),
+        rows=rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
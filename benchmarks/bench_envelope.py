@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""Benchmark the per-message cost of the binary message envelope"""
+
+# pylint: disable=no-value-for-parameter
+
+import base64
+import json
+import click
+from httpmq import envelope
+from httpmq.payload import b64encode_buffer
+from benchmarks import measure_rate, print_table
+
+HEADERS = {
+    "content-type": "application/json",
+    "trace-id": "4bf92f3577b34da6a3ce929d0e0e4736",
+    "timestamp": "1700000000.123456",
+}
+
+
+def json_envelope_funcs(body: bytes):
+    """Encode and decode functions for a hand-rolled JSON envelope"""
+
+    def encode() -> bytes:
+        doc = {"headers": HEADERS, "body": base64.b64encode(body).decode("ascii")}
+        return base64.b64encode(json.dumps(doc).encode("utf-8"))
+
+    encoded = encode()
+
+    def decode():
+        doc = json.loads(base64.b64decode(encoded))
+        return doc["headers"], base64.b64decode(doc["body"])
+
+    def read_headers():
+        return json.loads(base64.b64decode(encoded))["headers"]
+
+    return encode, decode, read_headers, len(encoded)
+
+
+def binary_envelope_funcs(body: bytes):
+    """Encode and decode functions for the httpmq binary envelope"""
+
+    def encode() -> bytes:
+        return b64encode_buffer(envelope.encode_headers(HEADERS)) + b64encode_buffer(
+            body
+        )
+
+    encoded = encode()
+
+    def decode():
+        return envelope.unwrap(base64.b64decode(encoded))
+
+    def read_headers():
+        return envelope.peek_headers(encoded)
+
+    return encode, decode, read_headers, len(encoded)
+
+
+def plain_funcs(body: bytes):
+    """Encode and decode functions without any envelope"""
+    encoded = b64encode_buffer(body)
+    return (
+        lambda: b64encode_buffer(body),
+        lambda: base64.b64decode(encoded),
+        lambda: None,
+        len(encoded),
+    )
+
+
+@click.command()
+@click.option("--iterations", default=20000, help="Messages per measurement")
+def main(iterations: int):
+    """Benchmark the per-message cost of the binary message envelope"""
+    rows = []
+    for size in [64, 1024, 65536]:
+        body = b'{"field":"value"}' * (size // 17 + 1)
+        body = body[:size]
+        for name, factory in [
+            ("none", plain_funcs),
+            ("JSON envelope", json_envelope_funcs),
+            ("binary envelope", binary_envelope_funcs),
+        ]:
+            encode, decode, read_headers, wire_len = factory(body)
+            count = max(100, iterations * 1024 // max(size, 1024))
+            rows.append(
+                (
+                    size,
+                    name,
+                    wire_len,
+                    f"{1e6 / measure_rate(encode, count):.2f}",
+                    f"{1e6 / measure_rate(decode, count):.2f}",
+                    f"{1e6 / measure_rate(read_headers, count):.2f}",
+                )
+            )
+    print_table(
+        title="Message envelope cost per message",
+        header=(
+            "msg bytes",
+            "envelope",
+            "wire bytes",
+            "encode usec",
+            "decode usec",
+            "headers usec",
+        ),
+        rows=rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""Benchmark the memory held by a large batch of buffered ReceivedMessage"""
+
+# pylint: disable=no-value-for-parameter
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+
+import base64
+import json
+import tracemalloc
+import click
+import httpmq
+from benchmarks import print_table
+
+
+class DictReceivedMessage:
+    """ReceivedMessage as it was before using slots"""
+
+    def __init__(
+        self, stream, stream_seq, consumer, consumer_seq, subject, message, request_id
+    ):
+        """Constructor"""
+        self.stream = stream
+        self.stream_seq = stream_seq
+        self.consumer = consumer
+        self.consumer_seq = consumer_seq
+        self.subject = subject
+        self.message = message
+        self.request_id = request_id
+
+
+def build_record(seq: int, payload_size: int) -> bytes:
+    """Build one push subscription NDJSON record"""
+    return json.dumps(
+        {
+            "b64_msg": base64.b64encode(b"x" * payload_size).decode("ascii"),
+            "consumer": "bench-consumer-3f1f6b46",
+            "request_id": "3f1f6b46-5cde-4f22-9d0b-6bd1e2b2f6a5",
+            "sequence": {"consumer": seq, "stream": seq},
+            "stream": "bench-stream-5cde4f22",
+            "subject": "bench.subject.9d0b6bd1",
+            "success": True,
+        }
+    ).encode("utf-8")
+
+
+def legacy_decode(record: bytes, codec) -> DictReceivedMessage:
+    """Decode without slots or name reuse"""
+    parsed = codec.loads(record)
+    return DictReceivedMessage(
+        stream=parsed["stream"],
+        stream_seq=parsed["sequence"]["stream"],
+        consumer=parsed["consumer"],
+        consumer_seq=parsed["sequence"]["consumer"],
+        subject=parsed["subject"],
+        request_id=parsed["request_id"],
+        message=base64.b64decode(parsed["b64_msg"]),
+    )
+
+
+def buffered_size(decode, records) -> int:
+    """Measure the memory retained by decoding and buffering all records"""
+    tracemalloc.start()
+    buffered = [decode(record) for record in records]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del buffered
+    return size
+
+
+@click.command()
+@click.option("--count", default=100000, help="Number of buffered messages")
+@click.option("--payload-size", default=16, help="Message payload size in bytes")
+def main(count: int, payload_size: int):
+    """Benchmark memory held by buffered messages"""
+    records = [build_record(seq, payload_size) for seq in range(count)]
+    decoder = httpmq.DataClient.RxMessageDecoder()
+    legacy = buffered_size(lambda rec: legacy_decode(rec, decoder.codec), records)
+    compact = buffered_size(decoder, records)
+    print_table(
+        title=f"Memory of {count:,} buffered messages ({payload_size} byte payloads)",
+        header=("container", "total MiB", "bytes/msg"),
+        rows=[
+            ("dict + fresh names", f"{legacy / 2**20:.1f}", f"{legacy / count:.0f}"),
+            (
+                "slots + reused names",
+                f"{compact / 2**20:.1f}",
+                f"{compact / count:.0f}",
+            ),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
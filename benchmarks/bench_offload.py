@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""Benchmark event loop lag when mixing small and huge messages"""
+
+# pylint: disable=no-value-for-parameter
+
+import asyncio
+import base64
+import json
+import time
+from typing import Optional
+import click
+import httpmq
+from benchmarks import StubDataplane, print_table
+
+
+def build_record(seq: int, payload: bytes) -> bytes:
+    """Build one push subscription NDJSON record"""
+    return json.dumps(
+        {
+            "b64_msg": base64.b64encode(payload).decode("ascii"),
+            "consumer": "bench-consumer",
+            "request_id": "bench-request",
+            "sequence": {"consumer": seq, "stream": seq},
+            "stream": "bench-stream",
+            "subject": "bench.subject",
+            "success": True,
+        }
+    ).encode("utf-8")
+
+
+async def run_once(payloads, records, offload_threshold: Optional[int]):
+    """Publish and receive all messages while measuring loop lag"""
+    server = StubDataplane(records=records)
+    base_url = await server.start()
+    monitor = httpmq.LoopLagMonitor(
+        interval_sec=0.002, spike_threshold_sec=0.05, log_spikes=False
+    )
+    client = httpmq.DataClient(
+        api_client=httpmq.APIClient(base_url=base_url),
+        lag_monitor=monitor,
+        offload_threshold=offload_threshold,
+    )
+    received = 0
+
+    async def handler(msg):
+        nonlocal received
+        _ = msg.message
+        received += 1
+
+    start = time.perf_counter()
+    subscriber = asyncio.create_task(
+        client.push_subscribe(
+            stream="bench-stream",
+            consumer="bench-consumer",
+            subject_filter="bench.subject",
+            forward_data_cb=handler,
+            context=httpmq.RequestContext(),
+            stop_loop=asyncio.Event(),
+            loop_interval_sec=0.001,
+        )
+    )
+    for payload in payloads:
+        await client.publish(
+            subject="bench.subject", message=payload, context=httpmq.RequestContext()
+        )
+    await subscriber
+    elapsed = time.perf_counter() - start
+    stats = monitor.get_stats()
+    await client.disconnect()
+    await server.stop()
+    assert received == len(records)
+    return stats, elapsed
+
+
+@click.command()
+@click.option("--small-count", default=200, help="Number of small messages")
+@click.option("--small-size", default=1024, help="Small message size in bytes")
+@click.option("--huge-count", default=3, help="Number of huge messages")
+@click.option("--huge-size", default=20 * 2**20, help="Huge message size in bytes")
+@click.option("--threshold", default=2**20, help="Offload threshold in bytes")
+def main(
+    small_count: int, small_size: int, huge_count: int, huge_size: int, threshold: int
+):
+    """Benchmark event loop lag with and without offloading"""
+    payloads = [b"s" * small_size] * small_count
+    step = max(1, small_count // max(1, huge_count))
+    for idx in range(huge_count):
+        payloads.insert(idx * (step + 1), b"h" * huge_size)
+    records = [build_record(seq, payload) for seq, payload in enumerate(payloads)]
+
+    rows = []
+    for name, offload_threshold in [("inline", None), ("offloaded", threshold)]:
+        stats, elapsed = asyncio.run(
+            run_once(payloads, records, offload_threshold=offload_threshold)
+        )
+        rows.append(
+            (
+                name,
+                f"{stats.p50_sec * 1e3:.1f}",
+                f"{stats.p99_sec * 1e3:.1f}",
+                f"{stats.max_sec * 1e3:.1f}",
+                f"{elapsed:.2f}",
+            )
+        )
+    print_table(
+        title=(
+            f"Event loop lag: {small_count} x {small_size} B + "
+            f"{huge_count} x {huge_size / 2**20:.0f} MiB messages"
+        ),
+        header=("mode", "p50 ms", "p99 ms", "max ms", "total sec"),
+        rows=rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
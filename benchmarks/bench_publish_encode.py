@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""Benchmark memory and throughput of encoding large publish payloads"""
+
+# pylint: disable=no-value-for-parameter
+
+import base64
+import tracemalloc
+import click
+from httpmq.payload import b64encode_buffer
+from benchmarks import measure_rate, print_table
+
+
+def peak_memory(func) -> int:
+    """Measure the peak memory allocated while running a function"""
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+@click.command()
+@click.option("--iterations", default=200, help="Iterations per measurement")
+@click.option("--message-size", default=2**20, help="Message size in bytes")
+def main(iterations: int, message_size: int):
+    """Benchmark encoding a slice of a larger buffer for publishing"""
+    backing = bytearray(message_size * 2)
+    view = memoryview(backing)[message_size // 2 : message_size // 2 + message_size]
+    preencoded = b64encode_buffer(view)
+
+    def copy_then_encode():
+        return base64.b64encode(bytes(view))
+
+    def encode_view():
+        return b64encode_buffer(view)
+
+    rows = []
+    for name, func in [
+        ("copy + b64encode", copy_then_encode),
+        ("b64encode_buffer", encode_view),
+    ]:
+        rate = measure_rate(func, iterations)
+        rows.append(
+            (
+                name,
+                f"{rate * message_size / 2**20:,.0f}",
+                f"{peak_memory(func) / 2**20:.2f}",
+            )
+        )
+    # A preencoded payload is handed to the HTTP client as is
+    rows.append(("preencoded", "no encode", f"{peak_memory(lambda: preencoded):.2f}"))
+    print_table(
+        title=f"Publish payload encoding ({message_size / 2**20:.1f} MiB messages)",
+        header=("path", "MiB/sec", "peak alloc MiB"),
+        rows=rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
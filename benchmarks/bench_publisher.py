@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""Benchmark the per-message client overhead of publishing"""
+
+# pylint: disable=no-value-for-parameter
+
+import asyncio
+import time
+import click
+import httpmq
+from benchmarks import print_table
+
+
+class StubSession:
+    """
+    Stand-in for the aiohttp session which answers every request immediately
+
+    Only the client side processing of a publish is measured; no network I/O occurs.
+    """
+
+    def __init__(self, session):
+        """Constructor
+
+        :param session: the replaced aiohttp session, closed along with the stub
+        """
+        self.__session = session
+
+    class Response:
+        """Canned successful publish response"""
+
+        def __init__(self, request_id: str):
+            """Constructor"""
+            self.host = "127.0.0.1"
+            self.real_url = "http://127.0.0.1/"
+            self.status = 200
+            self.method = "POST"
+            self.headers = {}
+            self.content_type = "application/json"
+            self.__body = b'{"request_id":"%s","success":true}' % request_id.encode()
+
+        async def read(self) -> bytes:
+            """Fetch the response body"""
+            return self.__body
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *_):
+            return False
+
+    async def close(self):
+        """Close the replaced session"""
+        await self.__session.close()
+
+    def post(self, headers, **_) -> "StubSession.Response":
+        """Answer a POST request"""
+        return StubSession.Response(headers[httpmq.common.DEFAULT_REQUEST_ID_FIELD])
+
+
+def stub_client() -> httpmq.DataClient:
+    """Define a dataplane client whose session is replaced by a stub"""
+    api_client = httpmq.APIClient(base_url="http://127.0.0.1")
+    api_client.session = StubSession(api_client.session)
+    return httpmq.DataClient(api_client=api_client)
+
+
+async def measure(publish, iterations: int) -> float:
+    """Measure the mean time per publish
+
+    :return: seconds per message
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await publish()
+    return (time.perf_counter() - start) / iterations
+
+
+async def run(iterations: int, message_size: int):
+    """Compare the publish paths"""
+    client = stub_client()
+    message = b"x" * message_size
+    publisher = client.publisher("bench.subject")
+    template = httpmq.RequestContext().add_header("X-Bench", "1")
+    templated_publisher = client.publisher("bench.subject", context=template)
+
+    async def publish_with_context():
+        await client.publish(
+            subject="bench.subject", message=message, context=httpmq.RequestContext()
+        )
+
+    async def publish_with_template():
+        await client.publish(
+            subject="bench.subject",
+            message=message,
+            context=httpmq.RequestContext().add_header("X-Bench", "1"),
+        )
+
+    rows = []
+    for name, func in [
+        ("DataClient.publish", publish_with_context),
+        ("Publisher.publish", lambda: publisher.publish(message)),
+        ("DataClient.publish + header", publish_with_template),
+        ("Publisher.publish + header", lambda: templated_publisher.publish(message)),
+    ]:
+        # Warm up
+        await measure(func, iterations // 10)
+        per_msg = await measure(func, iterations)
+        rows.append((name, f"{per_msg * 1e6:.2f}", f"{1 / per_msg:,.0f}"))
+    print_table(
+        title=f"Per-message publish overhead ({message_size} B messages, stub session)",
+        header=("path", "usec/msg", "msgs/sec"),
+        rows=rows,
+    )
+    await client.disconnect()
+
+
+@click.command()
+@click.option("--iterations", default=50000, help="Messages per measurement")
+@click.option("--message-size", default=128, help="Message size in bytes")
+def main(iterations: int, message_size: int):
+    """Benchmark the per-message client overhead of publishing"""
+    asyncio.run(run(iterations=iterations, message_size=message_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""Benchmark message size and CPU cost of each message serializer"""
+
+# pylint: disable=no-value-for-parameter
+
+import functools
+import click
+from httpmq import serialization
+from benchmarks import measure_rate, print_table
+
+
+def build_object(records: int) -> dict:
+    """Build a document holding `records` sensor readings"""
+    return {
+        "batch": "batch-0001",
+        "readings": [
+            {
+                "event_id": f"evt-{idx:08d}",
+                "device": f"device-{idx % 97}",
+                "value": idx * 0.37,
+                "count": idx,
+                "calibrated": idx % 2 == 0,
+            }
+            for idx in range(records)
+        ],
+    }
+
+
+@click.command()
+@click.option("--iterations", default=2000, help="Messages per measurement")
+def main(iterations: int):
+    """Benchmark message size and CPU cost of each message serializer"""
+    rows = []
+    serializers = serialization.available_serializers()
+    for records in [1, 100, 10000]:
+        obj = build_object(records)
+        count = max(10, iterations // records)
+        for name, serializer in serializers.items():
+            if name == "raw":
+                continue
+            data = bytes(serializer.serialize(obj))
+            serialize_rate = measure_rate(
+                functools.partial(serializer.serialize, obj), count
+            )
+            deserialize_rate = measure_rate(
+                functools.partial(serializer.deserialize, data), count
+            )
+            rows.append(
+                (
+                    records,
+                    name,
+                    len(data),
+                    f"{1e6 / serialize_rate:.1f}",
+                    f"{1e6 / deserialize_rate:.1f}",
+                )
+            )
+        # Raw bytes are passed through; shown as the floor
+        data = bytes(serializers["json"].serialize(obj))
+        raw = serializers["raw"]
+        rows.append(
+            (
+                records,
+                "raw",
+                len(data),
+                f"{1e6 / measure_rate(functools.partial(raw.serialize, data), count):.1f}",
+                f"{1e6 / measure_rate(functools.partial(raw.deserialize, data), count):.1f}",
+            )
+        )
+    print_table(
+        title=(
+            "Message serialization: size and CPU time per message"
+            f" (serializers available: {', '.join(serializers)})"
+        ),
+        header=(
+            "records",
+            "serializer",
+            "msg bytes",
+            "serialize usec",
+            "deserialize usec",
+        ),
+        rows=rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
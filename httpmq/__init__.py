@@ -1,7 +1,29 @@
 """HTTP MQ - Python Client"""
+from httpmq.batching import BatchStats, ColumnarBatch, MessageBatcher
 from httpmq.client import APIClient
 from httpmq.dataplane import DataClient, ReceivedMessage
+from httpmq.dispatch import (
+    DispatchedMessage,
+    Dispatcher,
+    DispatchStats,
+    ProcessPoolDispatcher,
+    ProcessPoolStats,
+    ThreadPoolDispatcher,
+    ThreadPoolStats,
+)
+from httpmq.drain import DrainReport, drain_all
+from httpmq.flow_control import AdaptiveInflight, FlowControlStats
 from httpmq.management import ManagementClient
+from httpmq.monitor import LoopLagMonitor, LoopLagStats
+from httpmq.outbox import Outbox, OutboxStats
+from httpmq.subscription import (
+    ManagedSubscriptionStats,
+    ResilientSubscription,
+    SubscriptionManager,
+    SubscriptionManagerStats,
+    SubscriptionStats,
+)
+from httpmq.supervisor import ConsumerSupervisor, SupervisorStats, WorkerStats
 from httpmq.common import RequestContext, HttpmqAPIError, configure_sdk_logging
 
 # Commonly used data models
@@ -0,0 +1,464 @@
+"""Micro-batched delivery of received messages to handlers"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+
+import array
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Union
+from httpmq.common import RequestContext
+from httpmq.dataplane import DataClient, ReceivedMessage
+from httpmq.drain import DrainReport, finish_tasks
+
+LOG = logging.getLogger("httpmq-sdk.dataplane")
+
+
+class ColumnarBatch:
+    """
+    A batch of received messages, stored column by column
+
+    The numeric fields are held in `array.array` columns, one entry per message, which
+    support the buffer protocol (i.e. `numpy.frombuffer(batch.stream_seq, numpy.uint64)`
+    is a zero-copy view):
+
+        stream_seq: sequence numbers within the stream (uint64)
+        consumer_seq: sequence numbers for the consumer (uint64)
+        received_at: UNIX timestamps of when the messages were received (float64)
+        subject_ids: indices into `subjects` of the message subjects (uint32)
+
+    The payloads are concatenated in one contiguous `buffer`; the payload of message `i`
+    is `buffer[offsets[i]:offsets[i + 1]]`, with `offsets` a uint64 column of one entry
+    more than the number of messages.
+    """
+
+    __slots__ = (
+        "stream",
+        "consumer",
+        "stream_seq",
+        "consumer_seq",
+        "received_at",
+        "subjects",
+        "subject_ids",
+        "offsets",
+        "buffer",
+    )
+
+    def __init__(
+        self,
+        stream: str,
+        consumer: str,
+        stream_seq: array.array,
+        consumer_seq: array.array,
+        received_at: array.array,
+        subjects: List[str],
+        subject_ids: array.array,
+        offsets: array.array,
+        buffer: bytearray,
+    ):
+        """Constructor
+
+        :param stream: name of the stream the messages are from
+        :param consumer: name of the consumer that received the messages
+        :param stream_seq: the stream sequence numbers column
+        :param consumer_seq: the consumer sequence numbers column
+        :param received_at: the receive timestamps column
+        :param subjects: the distinct subjects
+        :param subject_ids: the subject indices column
+        :param offsets: offsets of the payloads in `buffer`
+        :param buffer: the concatenated payloads
+        """
+        self.stream = stream
+        self.consumer = consumer
+        self.stream_seq = stream_seq
+        self.consumer_seq = consumer_seq
+        self.received_at = received_at
+        self.subjects = subjects
+        self.subject_ids = subject_ids
+        self.offsets = offsets
+        self.buffer = buffer
+
+    @classmethod
+    def from_messages(
+        cls,
+        messages: List[ReceivedMessage],
+        received_at: Optional[Iterable[float]] = None,
+    ) -> "ColumnarBatch":
+        """Build a columnar batch from received messages
+
+        :param messages: the messages, all from the same stream and consumer
+        :param received_at: receive timestamps of the messages; defaults to now
+        :return: the columnar batch
+        """
+        if received_at is None:
+            received_at = [time.time()] * len(messages)
+        views = [msg.message_view or b"" for msg in messages]
+        offsets = array.array("Q", [0])
+        total = 0
+        for view in views:
+            total += len(view)
+            offsets.append(total)
+        buffer = bytearray(total)
+        for idx, view in enumerate(views):
+            buffer[offsets[idx] : offsets[idx + 1]] = view
+        subject_index: Dict[str, int] = {}
+        subject_ids = array.array(
+            "I",
+            (
+                subject_index.setdefault(msg.subject, len(subject_index))
+                for msg in messages
+            ),
+        )
+        return cls(
+            stream=messages[0].stream if messages else "",
+            consumer=messages[0].consumer if messages else "",
+            stream_seq=array.array("Q", (msg.stream_seq for msg in messages)),
+            consumer_seq=array.array("Q", (msg.consumer_seq for msg in messages)),
+            received_at=array.array("d", received_at),
+            subjects=list(subject_index),
+            subject_ids=subject_ids,
+            offsets=offsets,
+            buffer=buffer,
+        )
+
+    def __len__(self) -> int:
+        """Number of messages in the batch"""
+        return len(self.stream_seq)
+
+    @property
+    def sizes(self) -> array.array:
+        """Payload sizes column (uint64)"""
+        return array.array(
+            "Q", (self.offsets[idx + 1] - self.offsets[idx] for idx in range(len(self)))
+        )
+
+    def payload(self, index: int) -> memoryview:
+        """View of the payload of one message
+
+        :param index: index of the message in the batch
+        :return: view into `buffer`
+        """
+        return memoryview(self.buffer)[self.offsets[index] : self.offsets[index + 1]]
+
+    def subject(self, index: int) -> str:
+        """Subject of one message
+
+        :param index: index of the message in the batch
+        :return: the subject
+        """
+        return self.subjects[self.subject_ids[index]]
+
+
+# Returns the indices of the messages in the batch which failed, or None if all succeeded
+BatchHandler = Callable[
+    [Union[List[ReceivedMessage], ColumnarBatch]], Awaitable[Optional[Iterable[int]]]
+]
+
+
+class BatchStats:
+    """Snapshot of the state of a MessageBatcher"""
+
+    def __init__(
+        self,
+        pending: int,
+        inflight: int,
+        batches: int,
+        messages: int,
+        succeeded: int,
+        failed: int,
+        ack_failures: int,
+        count_flushes: int,
+        bytes_flushes: int,
+        linger_flushes: int,
+        handler_time_sec: float,
+    ):
+        """Constructor
+
+        :param pending: number of messages waiting in the batch being built
+        :param inflight: number of messages received and not yet ACKed or failed
+        :param batches: number of batches passed to the handler
+        :param messages: number of messages passed to the handler
+        :param succeeded: number of messages the handler completed for
+        :param failed: number of messages the handler reported as failed, or which were
+            in a batch the handler raised an exception for
+        :param ack_failures: number of completed messages which could not be ACKed
+        :param count_flushes: number of batches flushed for reaching the max message count
+        :param bytes_flushes: number of batches flushed for reaching the max size in bytes
+        :param linger_flushes: number of batches flushed for reaching the linger time
+        :param handler_time_sec: total time spent in the handler
+        """
+        self.pending = pending
+        self.inflight = inflight
+        self.batches = batches
+        self.messages = messages
+        self.succeeded = succeeded
+        self.failed = failed
+        self.ack_failures = ack_failures
+        self.count_flushes = count_flushes
+        self.bytes_flushes = bytes_flushes
+        self.linger_flushes = linger_flushes
+        self.handler_time_sec = handler_time_sec
+
+
+class MessageBatcher:
+    """
+    Groups received messages into batches for a handler, and ACKs each batch in one pass
+
+    The batcher is the `forward_data_cb` of a subscription (or the handler of a
+    `SubscriptionManager` subscription). A batch is passed to the handler once it holds
+    `max_batch_size` messages or `max_batch_bytes` bytes of messages, or `linger_sec` after
+    its first message arrived, whichever comes first.
+
+    httpmq stops delivering once `max_msg_inflight` messages are not ACKed, so a batch never
+    holds more than `max_msg_inflight` messages; use the same `max_msg_inflight` as the
+    subscription. At most `max_msg_inflight` messages are held by the batcher at once;
+    beyond that, the call waits for a batch to complete, which holds back the subscription
+    loop.
+
+    With `columnar`, the handler is passed a `ColumnarBatch` instead of the list of
+    messages.
+
+    The handler returns the indices of the messages in the batch which failed, or None if
+    all succeeded. The other messages are then ACKed concurrently. The failed messages are
+    not ACKed, so httpmq redelivers them. If the handler raises, none of the messages of
+    the batch are ACKed.
+    """
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        handler: BatchHandler,
+        max_msg_inflight: int,
+        max_batch_size: int = 100,
+        max_batch_bytes: int = 2**20,
+        linger_sec: float = 0.05,
+        columnar: bool = False,
+        context: Optional[RequestContext] = None,
+    ):
+        """Constructor
+
+        :param data_client: client used to ACK the messages
+        :param handler: the batch handler
+        :param max_msg_inflight: the max number of inflight messages of the subscription
+        :param max_batch_size: max number of messages in a batch
+        :param max_batch_bytes: max total size of the messages in a batch. A message larger
+            than this is passed to the handler in a batch of its own.
+        :param linger_sec: max time a message waits for its batch to fill
+        :param columnar: whether to pass the batches to the handler as `ColumnarBatch`
+        :param context: template for the context of the ACK requests
+        """
+        self.data_client = data_client
+        self.handler = handler
+        self.max_msg_inflight = max_msg_inflight
+        self.max_batch_size = min(max_batch_size, max_msg_inflight)
+        self.max_batch_bytes = max_batch_bytes
+        self.linger_sec = linger_sec
+        self.columnar = columnar
+        self.context = context if context is not None else RequestContext()
+        self.__slots: Optional[asyncio.Semaphore] = None
+        self.__batch: List[ReceivedMessage] = []
+        self.__batch_received_at: List[float] = []
+        self.__batch_bytes = 0
+        self.__linger_timer: Optional[asyncio.TimerHandle] = None
+        self.__tasks: Dict[asyncio.Task, List[ReceivedMessage]] = {}
+        self.__inflight = 0
+        self.__batches = 0
+        self.__messages = 0
+        self.__succeeded = 0
+        self.__failed = 0
+        self.__ack_failures = 0
+        self.__count_flushes = 0
+        self.__bytes_flushes = 0
+        self.__linger_flushes = 0
+        self.__handler_time_sec = 0.0
+
+    def start(self):
+        """Start accepting messages"""
+        if self.__slots is None:
+            self.__slots = asyncio.Semaphore(self.max_msg_inflight)
+
+    async def stop(self):
+        """Pass the batch being built to the handler, and wait for all batches to complete"""
+        if self.__slots is None:
+            return
+        self.__flush()
+        if self.__tasks:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__slots = None
+
+    async def drain(self, timeout_sec: float) -> DrainReport:
+        """Flush the batch being built, and finish all batches within a deadline
+
+        Batches still being processed at the deadline are abandoned: they are no longer
+        awaited, and their messages not yet ACKed are not ACKed.
+
+        :param timeout_sec: time the batches are given to finish
+        :return: the drain report
+        """
+        start = time.monotonic()
+        handled = self.__succeeded + self.__failed
+        abandoned = []
+        if self.__slots is not None:
+            self.__flush()
+            abandoned = await finish_tasks(self.__tasks, timeout_sec)
+            self.__slots = None
+        return DrainReport(
+            completed=not abandoned,
+            elapsed_sec=time.monotonic() - start,
+            handled=self.__succeeded + self.__failed - handled,
+            published=0,
+            dropped=0,
+            abandoned=abandoned,
+            pending_publishes=0,
+        )
+
+    async def __call__(self, message: ReceivedMessage):
+        """Add a message to the batch being built
+
+        Returns once the message is added, not once it is processed.
+
+        :param message: the received message
+        """
+        if self.__slots is None:
+            raise RuntimeError("Batcher is not started")
+        await self.__slots.acquire()
+        self.__inflight += 1
+        # Sized without decoding the message on the event loop
+        size = message.size_hint
+        if self.__batch and self.__batch_bytes + size > self.max_batch_bytes:
+            self.__bytes_flushes += 1
+            self.__flush()
+        self.__batch.append(message)
+        self.__batch_received_at.append(time.time())
+        self.__batch_bytes += size
+        if len(self.__batch) >= self.max_batch_size:
+            self.__count_flushes += 1
+            self.__flush()
+        elif self.__batch_bytes >= self.max_batch_bytes:
+            self.__bytes_flushes += 1
+            self.__flush()
+        elif self.__linger_timer is None:
+            self.__linger_timer = asyncio.get_running_loop().call_later(
+                self.linger_sec, self.__on_linger
+            )
+
+    def get_stats(self) -> BatchStats:
+        """Fetch the current state of the batcher
+
+        :return: the batcher statistics
+        """
+        return BatchStats(
+            pending=len(self.__batch),
+            inflight=self.__inflight,
+            batches=self.__batches,
+            messages=self.__messages,
+            succeeded=self.__succeeded,
+            failed=self.__failed,
+            ack_failures=self.__ack_failures,
+            count_flushes=self.__count_flushes,
+            bytes_flushes=self.__bytes_flushes,
+            linger_flushes=self.__linger_flushes,
+            handler_time_sec=self.__handler_time_sec,
+        )
+
+    def __on_linger(self):
+        """Flush the batch being built once its first message waited `linger_sec`"""
+        self.__linger_timer = None
+        self.__linger_flushes += 1
+        self.__flush()
+
+    def __flush(self):
+        """Pass the batch being built to the handler"""
+        if self.__linger_timer is not None:
+            self.__linger_timer.cancel()
+            self.__linger_timer = None
+        if not self.__batch:
+            return
+        batch = self.__batch
+        received_at = self.__batch_received_at
+        self.__batch = []
+        self.__batch_received_at = []
+        self.__batch_bytes = 0
+        task = asyncio.get_running_loop().create_task(
+            self.__process(batch, received_at, self.__slots)
+        )
+        self.__tasks[task] = batch
+        task.add_done_callback(self.__forget)
+
+    def __forget(self, task: asyncio.Task):
+        """Stop tracking a completed batch task"""
+        self.__tasks.pop(task, None)
+
+    async def __process(
+        self,
+        batch: List[ReceivedMessage],
+        received_at: List[float],
+        slots: asyncio.Semaphore,
+    ):
+        """Run the handler for a batch, then ACK the messages which succeeded"""
+        try:
+            completed = await self.__run(batch, received_at)
+            results = await asyncio.gather(
+                *(
+                    self.data_client.send_ack_simple(message, self.context.copy())
+                    for message in completed
+                ),
+                return_exceptions=True,
+            )
+            for message, result in zip(completed, results):
+                if isinstance(result, Exception):
+                    self.__ack_failures += 1
+                    LOG.error(
+                        "Failed to ACK message %d of %s/%s: %s",
+                        message.stream_seq,
+                        message.stream,
+                        message.consumer,
+                        result,
+                    )
+        finally:
+            self.__inflight -= len(batch)
+            for _ in batch:
+                slots.release()
+
+    async def __run(
+        self, batch: List[ReceivedMessage], received_at: List[float]
+    ) -> List[ReceivedMessage]:
+        """Run the handler for a batch
+
+        :return: the messages the handler completed for
+        """
+        self.__batches += 1
+        self.__messages += len(batch)
+        start = time.perf_counter()
+        try:
+            failed = await self.handler(
+                ColumnarBatch.from_messages(batch, received_at)
+                if self.columnar
+                else batch
+            )
+        except Exception:  # pylint: disable=broad-except
+            self.__failed += len(batch)
+            LOG.exception(
+                "Handler failed for batch of %d messages of %s/%s",
+                len(batch),
+                batch[0].stream,
+                batch[0].consumer,
+            )
+            return []
+        finally:
+            self.__handler_time_sec += time.perf_counter() - start
+        failed = set(failed) if failed is not None else set()
+        completed = [msg for idx, msg in enumerate(batch) if idx not in failed]
+        self.__succeeded += len(completed)
+        self.__failed += len(batch) - len(completed)
+        if failed:
+            LOG.warning(
+                "Handler failed for %d of %d messages of %s/%s",
+                len(batch) - len(completed),
+                len(batch),
+                batch[0].stream,
+                batch[0].consumer,
+            )
+        return completed
@@ -0,0 +1,329 @@
+"""Splitting of messages larger than the stream max message size, and their reassembly
+
+A split message is only reassembled once all its chunks reach the same subscription
+connection, and chunks are ACKed only once their message is reassembled. So
+  * the `max_msg_inflight` of the subscription must be at least the chunk count of a
+    message, otherwise reassembly can never complete. Publishers can be held to it with
+    the `max_chunks` of `split_encoded`; a subscriber ACKs and drops messages with more
+    chunks than its `max_msg_inflight`.
+  * a consumer receiving chunked messages must not be shared by several connections
+    through a delivery group (i.e. `SubscriptionManager` instances, or
+    `ConsumerSupervisor` workers), as the chunks of one message would be spread across
+    them.
+"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=consider-using-with
+
+import binascii
+import hashlib
+import logging
+import struct
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from httpmq.envelope import MARKER_PREFIX
+from httpmq.payload import BufferLike, as_byte_view, b64encode_buffer
+
+LOG = logging.getLogger("httpmq-sdk.dataplane")
+
+# Marks one chunk of a split message
+CHUNK_MAGIC = MARKER_PREFIX + b"C"
+CHUNK_VERSION = 1
+
+# magic | version (u8) | message ID (16 bytes) | chunk index (u32) | chunk count (u32) |
+# offset of the chunk in the message (u64) | message size (u64) | padding
+_HEADER = struct.Struct(f"<{len(CHUNK_MAGIC)}sB16sIIQQx")
+# The header length is a multiple of 3, so the Base64 encoding of a chunk is the
+# concatenation of the encodings of its header and of its slice of the message
+HEADER_SIZE = _HEADER.size
+_B64_HEADER_SIZE = HEADER_SIZE // 3 * 4
+_B64_MAGIC = binascii.b2a_base64(CHUNK_MAGIC, newline=False)
+
+
+class ChunkHeader(NamedTuple):
+    """Header placed in front of each chunk of a split message"""
+
+    message_id: bytes
+    index: int
+    count: int
+    offset: int
+    total_size: int
+
+
+def decoded_size(encoded: BufferLike) -> int:
+    """Compute the size of a message from its Base64 encoded form
+
+    :param encoded: the Base64 encoded message
+    :return: the message size
+    """
+    view = as_byte_view(encoded)
+    size = len(view) // 4 * 3
+    if len(view) >= 2 and view[-2] == ord("="):
+        return size - 2
+    if len(view) >= 1 and view[-1] == ord("="):
+        return size - 1
+    return size
+
+
+def chunk_id(message_id: str) -> bytes:
+    """Derive the ID placed in the chunk headers of a message from its message ID
+
+    Publishing the same message again then produces the same chunks, which complete the
+    chunks already stored by an earlier attempt.
+
+    :param message_id: the client generated message ID
+    :return: the chunk ID
+    """
+    return hashlib.blake2b(message_id.encode("utf-8"), digest_size=16).digest()
+
+
+def split_encoded(
+    encoded: BufferLike,
+    max_msg_size: int,
+    message_id: Optional[bytes] = None,
+    max_chunks: Optional[int] = None,
+) -> List[bytes]:
+    """Split a Base64 encoded message into Base64 encoded chunks
+
+    The encoded message is cut at Base64 block boundaries, so it is not decoded again.
+
+    :param encoded: the Base64 encoded message
+    :param max_msg_size: max size of one chunk, including its header
+    :param message_id: the 16 bytes ID placed in the chunk headers (see `chunk_id`).
+        Random if not provided.
+    :param max_chunks: if set, max number of chunks; a larger message is rejected with
+        `ValueError`
+    :return: the Base64 encoded chunks
+    """
+    body_size = (max_msg_size - HEADER_SIZE) // 3 * 3
+    if body_size <= 0:
+        raise ValueError(f"Max message size {max_msg_size} is too small for chunking")
+    view = as_byte_view(encoded)
+    total_size = decoded_size(view)
+    step = body_size // 3 * 4
+    count = max(1, -(-len(view) // step))
+    if max_chunks is not None and count > max_chunks:
+        raise ValueError(
+            f"Message of {total_size} bytes needs {count} chunks, above the max of "
+            f"{max_chunks}"
+        )
+    if message_id is None:
+        message_id = uuid.uuid4().bytes
+    chunks = []
+    for index in range(count):
+        header = _HEADER.pack(
+            CHUNK_MAGIC,
+            CHUNK_VERSION,
+            message_id,
+            index,
+            count,
+            index * body_size,
+            total_size,
+        )
+        chunks.append(
+            b64encode_buffer(header) + view[index * step : (index + 1) * step]
+        )
+    return chunks
+
+
+def parse_header(data: BufferLike) -> Optional[ChunkHeader]:
+    """Parse the header in front of a chunk
+
+    :param data: the possibly chunked message
+    :return: the header, or None if the message is not a chunk
+    """
+    if len(data) < HEADER_SIZE or data[0] != CHUNK_MAGIC[0]:
+        return None
+    magic, version, message_id, index, count, offset, total_size = _HEADER.unpack_from(
+        data
+    )
+    if magic != CHUNK_MAGIC or version != CHUNK_VERSION or index >= count:
+        return None
+    return ChunkHeader(message_id, index, count, offset, total_size)
+
+
+def peek_header(b64_data: Union[str, BufferLike, None]) -> Optional[ChunkHeader]:
+    """Read the chunk header of a Base64 encoded message without decoding all of it
+
+    :param b64_data: the Base64 encoded, possibly chunked message
+    :return: the header, or None if the message is not a chunk
+    """
+    if b64_data is None:
+        return None
+    if isinstance(b64_data, str):
+        if not b64_data.startswith(_B64_MAGIC.decode("ascii")):
+            return None
+    else:
+        b64_data = as_byte_view(b64_data)
+        if b64_data[: len(_B64_MAGIC)] != _B64_MAGIC:
+            return None
+    try:
+        return parse_header(binascii.a2b_base64(b64_data[:_B64_HEADER_SIZE]))
+    except binascii.Error:
+        return None
+
+
+class Reassembler:
+    """
+    Reassembles split messages from their chunks
+
+    Each partially received message is held in a `tempfile.SpooledTemporaryFile`, which
+    moves to disk once it grows beyond the spool threshold, so the memory held by a large
+    message is bounded.
+
+    When more messages than allowed are partially received, the oldest is evicted. Its
+    chunks are not ACKed, so httpmq redelivers them, and the message is received again.
+
+    Messages partially received for longer than allowed are discarded. Their chunks are
+    returned by `take_abandoned`, for the caller to ACK; otherwise httpmq would redeliver
+    them forever, as a message missing chunks never completes.
+    """
+
+    class Partial:
+        """A partially received message"""
+
+        def __init__(self, header: ChunkHeader, spool_threshold: int):
+            """Constructor
+
+            :param header: header of the first chunk received
+            :param spool_threshold: max size held in memory
+            """
+            self.count = header.count
+            self.total_size = header.total_size
+            self.buffer = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+            self.started_at = time.monotonic()
+            # Chunk index -> (origin, tag) of the chunk
+            self.chunks: Dict[int, Tuple[object, object]] = {}
+            # Tags of duplicate copies of chunks, stored separately (i.e. by a retried
+            # publish), which are ACKed along with the message
+            self.superseded: List[object] = []
+
+        def tags(self) -> List[object]:
+            """Fetch the tags of all chunks received"""
+            return self.superseded + [tag for _, tag in self.chunks.values()]
+
+    def __init__(
+        self,
+        spool_threshold: int = 2**20,
+        max_partial_messages: int = 64,
+        max_partial_age_sec: Optional[float] = None,
+    ):
+        """Constructor
+
+        :param spool_threshold: max size of a partially received message held in memory
+        :param max_partial_messages: max number of partially received messages
+        :param max_partial_age_sec: if set, max time a message may stay partially
+            received
+        """
+        self.spool_threshold = spool_threshold
+        self.max_partial_messages = max_partial_messages
+        self.max_partial_age_sec = max_partial_age_sec
+        self.__partials: "OrderedDict[bytes, Reassembler.Partial]" = OrderedDict()
+        self.__abandoned: List[object] = []
+
+    @property
+    def pending_messages(self) -> int:
+        """Number of partially received messages"""
+        return len(self.__partials)
+
+    def add(
+        self, header: ChunkHeader, body: BufferLike, tag: object, origin: object = None
+    ) -> Optional[Tuple[bytes, List[object]]]:
+        """Add a received chunk
+
+        :param header: the chunk header
+        :param body: the chunk body, after the header
+        :param tag: caller object tied to the chunk (i.e. its sequence numbers)
+        :param origin: identity of the stored copy of the chunk (i.e. its stream
+            sequence number). A chunk received again from the same origin is a redelivery,
+            whose tag replaces the earlier one; from another origin, it is a duplicate,
+            whose tag is returned along with the message.
+        :return: once all chunks are received, the message and the tags of its chunks;
+            the tags of the chunks in order are last. None otherwise.
+        """
+        self.__expire()
+        partial = self.__partials.get(header.message_id)
+        if partial is None:
+            partial = Reassembler.Partial(header, self.spool_threshold)
+            self.__partials[header.message_id] = partial
+            if len(self.__partials) > self.max_partial_messages:
+                self.__evict(next(iter(self.__partials)))
+        if (
+            header.count != partial.count
+            or header.total_size != partial.total_size
+            or header.offset + len(body) > partial.total_size
+        ):
+            LOG.warning(
+                "Dropping inconsistent chunk %d of message %s",
+                header.index,
+                header.message_id.hex(),
+            )
+            return None
+        previous = partial.chunks.get(header.index)
+        if previous is not None and previous[0] != origin:
+            partial.superseded.append(previous[1])
+        # A redelivered chunk replaces the earlier delivery, which can no longer be ACKed
+        partial.chunks[header.index] = (origin, tag)
+        partial.buffer.seek(header.offset)
+        partial.buffer.write(body)
+        if len(partial.chunks) < partial.count:
+            return None
+        del self.__partials[header.message_id]
+        partial.buffer.seek(0)
+        message = partial.buffer.read()
+        partial.buffer.close()
+        return message, partial.superseded + [
+            partial.chunks[index][1] for index in range(partial.count)
+        ]
+
+    def take_abandoned(self) -> List[object]:
+        """Fetch, and forget, the tags of the chunks of discarded partial messages
+
+        :return: the tags
+        """
+        abandoned, self.__abandoned = self.__abandoned, []
+        return abandoned
+
+    def __expire(self):
+        """Discard the messages partially received for too long"""
+        if self.max_partial_age_sec is None:
+            return
+        deadline = time.monotonic() - self.max_partial_age_sec
+        while self.__partials:
+            message_id, partial = next(iter(self.__partials.items()))
+            if partial.started_at > deadline:
+                break
+            self.__discard(message_id, "partially received for too long")
+
+    def __evict(self, message_id: bytes):
+        """Drop a partial message, leaving its chunks to be redelivered"""
+        partial = self.__partials.pop(message_id)
+        LOG.warning(
+            "Evicting partial message %s with %d of %d chunks, too many partial messages",
+            message_id.hex(),
+            len(partial.chunks),
+            partial.count,
+        )
+        partial.buffer.close()
+
+    def __discard(self, message_id: bytes, reason: str):
+        """Discard a partial message, keeping the tags of its chunks to be ACKed"""
+        partial = self.__partials.pop(message_id)
+        LOG.error(
+            "Discarding partial message %s with %d of %d chunks, %s",
+            message_id.hex(),
+            len(partial.chunks),
+            partial.count,
+            reason,
+        )
+        partial.buffer.close()
+        self.__abandoned.extend(partial.tags())
+
+    def close(self):
+        """Discard all partially received messages"""
+        for partial in self.__partials.values():
+            partial.buffer.close()
+        self.__partials.clear()
@@ -7,17 +7,41 @@
 import asyncio
 from http import HTTPStatus
 import logging
+import socket
 import ssl
 import traceback
 from types import SimpleNamespace
-from typing import Optional
+from typing import AsyncIterable, Awaitable, Callable, Optional, Union
 import aiohttp
 from multidict import CIMultiDict, CIMultiDictProxy
 
-from httpmq.common import RequestContext
+from httpmq.common import HttpmqIdleTimeoutError, RequestContext
 
 LOG = logging.getLogger("httpmq-sdk.client")
 
+RequestBody = Union[bytes, bytearray, memoryview, AsyncIterable[bytes]]
+
+
+def _enable_tcp_keepalive(transport: Optional[asyncio.BaseTransport], idle_sec: float):
+    """Enable TCP keepalive probes on a connection, where the platform supports it
+
+    :param transport: the connection transport
+    :param idle_sec: time without traffic before the connection should be found dead
+    """
+    sock = transport.get_extra_info("socket") if transport is not None else None
+    if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # First probe once idle, then 3 probes spread over the same interval
+    probe_interval = max(1, int(idle_sec / 3))
+    for option, value in [
+        ("TCP_KEEPIDLE", max(1, int(idle_sec))),
+        ("TCP_KEEPINTVL", probe_interval),
+        ("TCP_KEEPCNT", 3),
+    ]:
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
 
 class APIClient:
     """Handles communication with httpmq"""
@@ -59,6 +83,36 @@ class APIClient:
         def __init__(self):
             """Constructor"""
 
+    class PreparedRequest:
+        """
+        Request state for an endpoint which is computed once, and reused for many requests
+
+        The header template holds every header except the request ID, which is added per
+        request.
+        """
+
+        def __init__(
+            self,
+            path: str,
+            headers: CIMultiDict,
+            params: dict,
+            timeout: aiohttp.ClientTimeout,
+            request_id_field: str,
+        ):
+            """Constructor
+
+            :param path: target path
+            :param headers: header template
+            :param params: URL parameters
+            :param timeout: request timeout settings
+            :param request_id_field: the HTTP field to send the request ID as
+            """
+            self.path = path
+            self.headers = headers
+            self.params = params
+            self.timeout = timeout
+            self.request_id_field = request_id_field
+
     @staticmethod
     async def on_request_start(
         session: aiohttp.ClientSession,
@@ -158,6 +212,8 @@ class APIClient:
         http_timeout: Optional[aiohttp.ClientTimeout] = None,
         trace_config: Optional[aiohttp.TraceConfig] = None,
         ssl_context: Optional[ssl.SSLContext] = None,
+        sse_timeout: Optional[aiohttp.ClientTimeout] = None,
+        max_connections: int = 100,
     ):
         """Constructor
 
@@ -166,6 +222,11 @@ class APIClient:
         :param http_timeout: common request timeout settings
         :param trace_config: request trace setting
         :param ssl_context: common request SSL context
+        :param sse_timeout: timeout settings for server-send-event requests, which last
+            as long as the subscription. Defaults to no total timeout, with the connect
+            timeout of `http_timeout`.
+        :param max_connections: max number of simultaneous connections; 0 for no limit.
+            Each open push subscription holds one connection for as long as it runs.
         """
         # Define request tracking hooks
         traces = []
@@ -178,7 +239,12 @@ class APIClient:
         traces.append(access_log)
 
         # Create new session
-        self.session = aiohttp.ClientSession(base_url=base_url, trace_configs=traces)
+        self.session = aiohttp.ClientSession(
+            base_url=base_url,
+            trace_configs=traces,
+            connector=aiohttp.TCPConnector(limit=max_connections),
+        )
+        self.max_connections = max_connections
 
         self.ssl = ssl_context
         self.base_headers = common_headers
@@ -187,6 +253,19 @@ class APIClient:
             if http_timeout is not None
             else aiohttp.ClientTimeout(total=60)
         )
+        self.sse_timeout = (
+            sse_timeout
+            if sse_timeout is not None
+            else aiohttp.ClientTimeout(
+                total=None,
+                connect=(
+                    self.base_timeout.connect
+                    if self.base_timeout.connect is not None
+                    else self.base_timeout.total
+                ),
+                sock_connect=self.base_timeout.sock_connect,
+            )
+        )
         LOG.debug("Defined aiohttp client connecting to '%s'", base_url)
 
     async def disconnect(self):
@@ -228,6 +307,9 @@ class APIClient:
         stop_loop: asyncio.Event,
         forward_data_cb,
         loop_interval_sec: float = 0.25,
+        connect_cb: Optional[Callable[[], None]] = None,
+        idle_timeout_sec: Optional[float] = None,
+        idle_check: Optional[Callable[[], Awaitable[bool]]] = None,
     ) -> Response:
         """HTTP GET wrapper supporting server-send-event endpoints
 
@@ -245,6 +327,13 @@ class APIClient:
         :param stop_loop: signal to indicate the loop should stop
         :param forward_data_cb: callback function used to forward data back to the caller
         :param loop_interval_sec: the sleep interval between non-blocking reads
+        :param connect_cb: optional function called once the server accepts the request
+        :param idle_timeout_sec: if set, the stream is treated as dead once no data arrived
+            for this long, and `HttpmqIdleTimeoutError` is raised. TCP keepalive probes are
+            enabled on the connection as well, so a half-open connection is detected even
+            when `idle_check` passes.
+        :param idle_check: optional liveness check run when the stream is idle. If it
+            returns True, the idle stream is considered healthy, and the wait restarts.
         :return: response
         """
         # Define the complete header map
@@ -261,35 +350,52 @@ class APIClient:
             timeout=(
                 context.request_timeout
                 if context.request_timeout is not None
-                else self.base_timeout
+                else self.sse_timeout
             ),
             trace_request_ctx=context,
         ) as resp:
             if resp.status != HTTPStatus.OK:
                 return APIClient.Response(resp, await resp.read())
+            if idle_timeout_sec is not None and resp.connection is not None:
+                _enable_tcp_keepalive(resp.connection.transport, idle_timeout_sec)
+            if connect_cb is not None:
+                connect_cb()
+            loop = asyncio.get_running_loop()
+            last_data = loop.time()
             # Start reading the event stream
             while not stop_loop.is_set() and not resp.content.at_eof():
                 data_segment = resp.content.read_nowait()
                 if data_segment:
+                    last_data = loop.time()
                     await forward_data_cb(
                         APIClient.StreamDataSegment(data=data_segment)
                     )
-                else:
-                    # Nothing, try again later
-                    await asyncio.sleep(loop_interval_sec)
+                    continue
+                if (
+                    idle_timeout_sec is not None
+                    and loop.time() - last_data >= idle_timeout_sec
+                ):
+                    if idle_check is None or not await idle_check():
+                        raise HttpmqIdleTimeoutError(
+                            request_id=context.request_id,
+                            idle_sec=loop.time() - last_data,
+                        )
+                    last_data = loop.time()
+                # Nothing, try again later
+                await asyncio.sleep(loop_interval_sec)
             # Indicate end-of-stream
             await forward_data_cb(APIClient.StreamDataEnd())
             # Convert the response object to a wrapper object
             return APIClient.Response(resp, None)
 
     async def post(
-        self, path: str, context: RequestContext, body: bytes = None
+        self, path: str, context: RequestContext, body: RequestBody = None
     ) -> Response:
         """HTTP POST wrapper
 
         :param path: POST target path
         :param context: request context
-        :param body: POST body
+        :param body: POST body. An async iterator of chunks is streamed to the server.
         :return: response
         """
         # Define the complete header map
@@ -314,14 +420,71 @@ class APIClient:
             # Convert the response object to a wrapper object
             return APIClient.Response(resp, await resp.read())
 
+    def prepare(
+        self, path: str, context: RequestContext
+    ) -> "APIClient.PreparedRequest":
+        """Compute the request state for repeated requests to one endpoint
+
+        The request ID of `context` is not part of the prepared state.
+
+        :param path: target path
+        :param context: request context used as the template for all requests
+        :return: the prepared request state
+        """
+        # Define the complete header map
+        final_headers = CIMultiDict()
+        if self.base_headers is not None:
+            final_headers.extend(CIMultiDictProxy(self.base_headers))
+        final_headers.extend(context.get_headers())
+        final_headers.popall(context.request_id_field, None)
+        return APIClient.PreparedRequest(
+            path=path,
+            headers=final_headers,
+            params=dict(context.additional_params),
+            timeout=(
+                context.request_timeout
+                if context.request_timeout is not None
+                else self.base_timeout
+            ),
+            request_id_field=context.request_id_field,
+        )
+
+    async def post_prepared(
+        self,
+        prepared: "APIClient.PreparedRequest",
+        request_id: str,
+        body: RequestBody = None,
+    ) -> Response:
+        """HTTP POST wrapper using prepared request state
+
+        :param prepared: the prepared request state
+        :param request_id: the request ID to use for the request
+        :param body: POST body. An async iterator of chunks is streamed to the server.
+        :return: response
+        """
+        headers = prepared.headers.copy()
+        headers[prepared.request_id_field] = request_id
+        # Make the request
+        async with self.session.post(
+            url=prepared.path,
+            ssl=self.ssl,
+            params=prepared.params,
+            headers=headers,
+            timeout=prepared.timeout,
+            trace_request_ctx=SimpleNamespace(request_id=request_id),
+            data=body,
+        ) as resp:
+            # Convert the response object to a wrapper object
+            return APIClient.Response(resp, await resp.read())
+
     async def put(
-        self, path: str, context: RequestContext, body: bytes = None
+        self, path: str, context: RequestContext, body: RequestBody = None
     ) -> Response:
         """HTTP PUT wrapper
 
         :param path: PUT target path
         :param context: request context
-        :param body: PUT body
+        :param body: PUT body. An async iterator of chunks is streamed to the server.
         :return: response
         """
         # Define the complete header map
@@ -0,0 +1,117 @@
+"""JSON codecs used for (de)serializing httpmq API payloads"""
+
+# pylint: disable=import-outside-toplevel
+
+import abc
+import json
+from typing import Optional, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class JSONCodec(abc.ABC):
+    """
+    Base class for a JSON codec.
+
+    A codec operates directly on bytes, so callers do not need to perform an additional
+    UTF-8 decode or encode copy. When the input is not valid JSON, `loads` must raise
+    `json.JSONDecodeError` (or a subclass of it).
+    """
+
+    name = "undefined"
+
+    @abc.abstractmethod
+    def loads(self, data: Union[BytesLike, str]) -> object:
+        """Parse a JSON document
+
+        :param data: the JSON document
+        :return: the parsed object
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def dumps(self, obj: object) -> bytes:
+        """Serialize an object into a UTF-8 encoded JSON document
+
+        :param obj: the object to serialize
+        :return: the JSON document
+        """
+        raise NotImplementedError()
+
+
+class StdlibJSONCodec(JSONCodec):
+    """JSON codec built around the standard library `json` module"""
+
+    name = "json"
+
+    def loads(self, data: Union[BytesLike, str]) -> object:
+        """Parse a JSON document
+
+        :param data: the JSON document
+        :return: the parsed object
+        """
+        try:
+            if not isinstance(data, str):
+                # Decoding directly skips the encoding detection `json.loads` does on bytes
+                data = str(data, "utf-8")
+            return json.loads(data)
+        except UnicodeDecodeError as err:
+            # Report truncated UTF-8 sequences the same way as truncated JSON
+            raise json.JSONDecodeError(str(err), "", err.start) from err
+
+    def dumps(self, obj: object) -> bytes:
+        """Serialize an object into a UTF-8 encoded JSON document
+
+        :param obj: the object to serialize
+        :return: the JSON document
+        """
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonCodec(JSONCodec):
+    """JSON codec built around `orjson`"""
+
+    name = "orjson"
+
+    def __init__(self):
+        """Constructor"""
+        import orjson
+
+        # pylint: disable=no-member
+        self.__loads = orjson.loads
+        self.__dumps = orjson.dumps
+
+    def loads(self, data: Union[BytesLike, str]) -> object:
+        """Parse a JSON document
+
+        :param data: the JSON document
+        :return: the parsed object
+        """
+        return self.__loads(data)
+
+    def dumps(self, obj: object) -> bytes:
+        """Serialize an object into a UTF-8 encoded JSON document
+
+        :param obj: the object to serialize
+        :return: the JSON document
+        """
+        return self.__dumps(obj)
+
+
+_DEFAULT_JSON_CODEC: Optional[JSONCodec] = None
+
+
+def default_json_codec() -> JSONCodec:
+    """Fetch the default JSON codec
+
+    `orjson` is used if it is installed, otherwise the standard library `json` module.
+
+    :return: the default codec
+    """
+    global _DEFAULT_JSON_CODEC  # pylint: disable=global-statement
+    if _DEFAULT_JSON_CODEC is None:
+        try:
+            _DEFAULT_JSON_CODEC = OrjsonCodec()
+        except ImportError:
+            _DEFAULT_JSON_CODEC = StdlibJSONCodec()
+    return _DEFAULT_JSON_CODEC
@@ -2,6 +2,7 @@
 
 # pylint: disable=too-many-arguments
 
+from http import HTTPStatus
 import logging
 import uuid
 import aiohttp
@@ -153,6 +154,23 @@ class RequestContext:
         self.request_timeout = timeout
         return self
 
+    def copy(self):
+        """Define a new context with the same settings, but a new request ID
+
+        The copy can be modified without affecting this context.
+
+        :return: the new context
+        """
+        duplicate = RequestContext(request_id_field=self.request_id_field)
+        duplicate.auth_param = {
+            "header": list(self.auth_param["header"]),
+            "param": list(self.auth_param["param"]),
+        }
+        duplicate.additional_headers = self.additional_headers.copy()
+        duplicate.additional_params = dict(self.additional_params)
+        duplicate.request_timeout = self.request_timeout
+        return duplicate
+
     def set_request_id(self, request_id: str):
         """Set the request ID
 
@@ -190,6 +208,14 @@ class HttpmqAPIError(HttpmqException):
             full_msg += f": {detail}"
         super().__init__(full_msg)
 
+    @property
+    def retriable(self) -> bool:
+        """Whether the request may succeed if it is sent again"""
+        return (
+            self.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            or self.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        )
+
     @staticmethod
     def from_rest_base_api_response(resp):
         """Define HttpmqAPIError from a models/{{ object }} which contain components of
@@ -205,6 +231,22 @@ class HttpmqAPIError(HttpmqException):
         )
 
 
+class HttpmqIdleTimeoutError(HttpmqException):
+    """A streaming response received no data for too long, and appears dead"""
+
+    def __init__(self, request_id: str, idle_sec: float):
+        """Constructor
+
+        :param request_id: the request ID to match against logs
+        :param idle_sec: time since data was last received
+        """
+        self.request_id = request_id
+        self.idle_sec = idle_sec
+        super().__init__(
+            f"Request '{request_id}' stream received no data for {idle_sec:.1f} sec"
+        )
+
+
 class HttpmqInternalError(HttpmqException):
     """Custom core error returned by httpmq-python"""
 
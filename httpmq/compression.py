@@ -0,0 +1,217 @@
+"""Transparent compression of message payloads"""
+
+# pylint: disable=import-outside-toplevel
+# pylint: disable=import-error
+
+import abc
+import zlib
+from typing import Dict, Optional, Type, Union
+from httpmq.envelope import MARKER_PREFIX
+from httpmq.payload import BufferLike, as_byte_view
+
+# Marks a compressed message; followed by the ID of the compressor used
+COMPRESSION_MAGIC = MARKER_PREFIX + b"Z"
+
+
+class Compressor(abc.ABC):
+    """
+    Base class for a message compressor.
+
+    Each compressor has a unique one byte `codec_id`, which is stored in front of the
+    compressed message so the receiving side can pick the matching decompressor.
+    """
+
+    name = "undefined"
+    codec_id = 0
+
+    @abc.abstractmethod
+    def compress(self, data: BufferLike) -> bytes:
+        """Compress a message
+
+        :param data: the message
+        :return: the compressed message
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def decompress(self, data: BufferLike) -> bytes:
+        """Decompress a message
+
+        :param data: the compressed message
+        :return: the message
+        """
+        raise NotImplementedError()
+
+
+class ZlibCompressor(Compressor):
+    """Compressor built around the standard library `zlib` module"""
+
+    name = "zlib"
+    codec_id = 1
+
+    def __init__(self, level: int = 6):
+        """Constructor
+
+        :param level: compression level, from 1 (fastest) to 9 (smallest)
+        """
+        self.level = level
+
+    def compress(self, data: BufferLike) -> bytes:
+        """Compress a message
+
+        :param data: the message
+        :return: the compressed message
+        """
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: BufferLike) -> bytes:
+        """Decompress a message
+
+        :param data: the compressed message
+        :return: the message
+        """
+        return zlib.decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    """Compressor built around `lz4`"""
+
+    name = "lz4"
+    codec_id = 2
+
+    def __init__(self, level: int = 0):
+        """Constructor
+
+        :param level: compression level; 0 is the fast default, up to 16
+        """
+        import lz4.frame
+
+        self.level = level
+        self.__frame = lz4.frame
+
+    def compress(self, data: BufferLike) -> bytes:
+        """Compress a message
+
+        :param data: the message
+        :return: the compressed message
+        """
+        return self.__frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data: BufferLike) -> bytes:
+        """Decompress a message
+
+        :param data: the compressed message
+        :return: the message
+        """
+        return self.__frame.decompress(data)
+
+
+class ZstdCompressor(Compressor):
+    """Compressor built around `zstandard`"""
+
+    name = "zstd"
+    codec_id = 3
+
+    def __init__(self, level: int = 3):
+        """Constructor
+
+        :param level: compression level, from 1 (fastest) to 22 (smallest)
+        """
+        import zstandard
+
+        self.level = level
+        self.__compressor = zstandard.ZstdCompressor(level=level)
+        self.__decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: BufferLike) -> bytes:
+        """Compress a message
+
+        :param data: the message
+        :return: the compressed message
+        """
+        return self.__compressor.compress(data)
+
+    def decompress(self, data: BufferLike) -> bytes:
+        """Decompress a message
+
+        The compressed frame records the message size, so the output is allocated once.
+
+        :param data: the compressed message
+        :return: the message
+        """
+        return self.__decompressor.decompress(data)
+
+
+_COMPRESSOR_TYPES: Dict[str, Type[Compressor]] = {
+    compressor.name: compressor
+    for compressor in [ZlibCompressor, Lz4Compressor, ZstdCompressor]
+}
+_DECOMPRESSORS: Dict[int, Compressor] = {}
+
+
+def get_compressor(compressor: Union[str, Compressor]) -> Compressor:
+    """Fetch a compressor by name
+
+    :param compressor: "zlib", "lz4", "zstd", or a compressor instance, which is returned
+        as is
+    :return: the compressor
+    """
+    if isinstance(compressor, Compressor):
+        return compressor
+    if compressor not in _COMPRESSOR_TYPES:
+        raise ValueError(f"Unknown compressor '{compressor}'")
+    return _COMPRESSOR_TYPES[compressor]()
+
+
+def available_compressors() -> Dict[str, Compressor]:
+    """Fetch all the compressors usable in this environment
+
+    :return: the compressors, by name
+    """
+    compressors = {}
+    for name, compressor_type in _COMPRESSOR_TYPES.items():
+        try:
+            compressors[name] = compressor_type()
+        except ImportError:
+            pass
+    return compressors
+
+
+def compress(data: BufferLike, compressor: Compressor) -> Optional[bytes]:
+    """Compress a message, marking it with the compressor used
+
+    :param data: the message
+    :param compressor: the compressor to use
+    :return: the marked compressed message, or None if compressing does not make the
+        message smaller
+    """
+    view = as_byte_view(data)
+    compressed = compressor.compress(view)
+    if len(COMPRESSION_MAGIC) + 1 + len(compressed) >= len(view):
+        return None
+    return b"".join([COMPRESSION_MAGIC, bytes([compressor.codec_id]), compressed])
+
+
+def decompress(data: BufferLike) -> BufferLike:
+    """Decompress a message marked by `compress`
+
+    Messages which are not compressed are returned as is.
+
+    :param data: the possibly compressed message
+    :return: the message
+    """
+    prefix_len = len(COMPRESSION_MAGIC)
+    if len(data) <= prefix_len or data[:prefix_len] != COMPRESSION_MAGIC:
+        return data
+    codec_id = data[prefix_len]
+    decompressor = _DECOMPRESSORS.get(codec_id)
+    if decompressor is None:
+        for compressor_type in _COMPRESSOR_TYPES.values():
+            if compressor_type.codec_id == codec_id:
+                # Raises ImportError if the library of the compressor is not installed
+                decompressor = compressor_type()
+                _DECOMPRESSORS[codec_id] = decompressor
+                break
+        else:
+            raise ValueError(f"Message compressed with unknown codec {codec_id}")
+    return decompressor.decompress(as_byte_view(data)[prefix_len + 1 :])
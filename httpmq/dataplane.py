@@ -3,15 +3,47 @@
 # pylint: disable=too-many-arguments
 # pylint: disable=too-few-public-methods
 # pylint: disable=too-many-locals
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-lines
 
 import asyncio
 import base64
+from collections import OrderedDict
+from concurrent.futures import Executor
+from contextlib import nullcontext
 from http import HTTPStatus
+import functools
+import itertools
 import json
 import logging
-from typing import Dict, List, Union
-from httpmq import client
+import random
+from typing import (
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+import uuid
+import aiohttp
+from httpmq import chunking, client, compression, envelope, serialization
+from httpmq.codec import JSONCodec, default_json_codec
 from httpmq.common import HttpmqInternalError, HttpmqAPIError, RequestContext
+from httpmq.monitor import LoopLagMonitor
+from httpmq.payload import (
+    ENCODE_CHUNK_SIZE,
+    BufferLike,
+    StreamSource,
+    as_byte_view,
+    b64decode_chunked,
+    b64encode_buffer,
+    b64encode_buffer_chunked,
+    b64encode_stream,
+    iter_stream_source,
+)
 from httpmq.models import (
     ApisAPIRestRespDataMessage,
     DataplaneAckSeqNum,
@@ -22,7 +54,41 @@ LOG = logging.getLogger("httpmq-sdk.dataplane")
 
 
 class ReceivedMessage:
-    """Container for a received message"""
+    """
+    Container for a received message
+
+    The message is delivered by httpmq in Base64 encoded form. The encoded form is kept, and
+    only decoded the first time `message` is accessed, so handlers which only look at the
+    subject or the sequence numbers never pay for the decode.
+
+    Messages published with headers arrive in an envelope (see `httpmq.envelope`), which
+    is unwrapped on decode. Messages without an envelope are passed through as is.
+
+    Messages published with `DataClient.publish_object` are deserialized into `value` on
+    first access, by the serializer matching their content type header.
+
+    Messages split into chunks by the publisher (see `DataClient`) are delivered once
+    reassembled, with `chunks` listing the sequence numbers of the chunks.
+    """
+
+    # Slots avoid a per-instance `__dict__`, as large numbers of messages may be buffered
+    __slots__ = (
+        "stream",
+        "stream_seq",
+        "consumer",
+        "consumer_seq",
+        "subject",
+        "request_id",
+        "_message",
+        "_b64_message",
+        "_headers",
+        "_serializer",
+        "_value",
+        "chunks",
+    )
+
+    # Marks headers which have not been read from the encoded message yet
+    __UNKNOWN = object()
 
     def __init__(
         self,
@@ -31,25 +97,164 @@ class ReceivedMessage:
         consumer: str,
         consumer_seq: int,
         subject: str,
-        message: bytes,
+        message: Optional[BufferLike],
         request_id: str,
+        b64_message: Optional[Union[str, BufferLike]] = None,
+        headers: Optional[envelope.Headers] = None,
+        serializer: Optional[serialization.Serializer] = None,
+        chunks: Optional[List[Tuple[int, int]]] = None,
     ):
         """Constructor
 
+        Either `message` or `b64_message` must be provided. If only `b64_message` is
+        provided, it may hold an enveloped message, which is unwrapped on decode.
+
         :param stream: name of the stream this message is from
         :param stream_seq: the message sequence number within this stream
         :param consumer: name of the consumer that received the message
         :param consumer_seq: the message sequence number for that consumer on this stream
         :param subject: the message subject
+        :param message: the message
         :param request_id: request ID
+        :param b64_message: the message in Base64 encoded form
+        :param headers: the message headers, if the message was enveloped
+        :param serializer: serializer for `value` if the message has no content type header
+        :param chunks: for a reassembled message, the (stream, consumer) sequence numbers
+            of its chunks
         """
         self.stream = stream
         self.stream_seq = stream_seq
         self.consumer = consumer
         self.consumer_seq = consumer_seq
         self.subject = subject
-        self.message = message
         self.request_id = request_id
+        self._message = message
+        self._b64_message = b64_message
+        self._headers = (
+            headers
+            if message is not None or headers is not None
+            else ReceivedMessage.__UNKNOWN
+        )
+        self._serializer = serializer
+        self._value = ReceivedMessage.__UNKNOWN
+        self.chunks = chunks
+
+    def __decode(self):
+        """Decode and unwrap the Base64 encoded form, if not done yet"""
+        if self._message is None and self._b64_message is not None:
+            self._headers, message = envelope.unwrap(
+                base64.b64decode(self._b64_message)
+            )
+            self._message = compression.decompress(message)
+
+    @property
+    def message(self) -> bytes:
+        """The message. Decoded from the Base64 encoded form on first access."""
+        self.__decode()
+        if self._message is not None and not isinstance(self._message, bytes):
+            self._message = bytes(self._message)
+        return self._message
+
+    @message.setter
+    def message(self, message: bytes):
+        """Replace the message"""
+        # Read the headers before the encoded form holding them is dropped
+        self._headers = self.headers or None
+        self._message = message
+        self._b64_message = None
+        self._value = ReceivedMessage.__UNKNOWN
+
+    @property
+    def size_hint(self) -> int:
+        """The size of the message, without decoding it
+
+        Exact once the message is decoded. Before that, estimated from the length of the
+        Base64 encoded form, so it includes the envelope of a message with headers, and is
+        the compressed size of a compressed message.
+        """
+        if self._message is not None:
+            return as_byte_view(self._message).nbytes
+        if self._b64_message is not None:
+            return len(self._b64_message) // 4 * 3
+        return 0
+
+    @property
+    def message_view(self) -> memoryview:
+        """A view of the message, decoded on first access
+
+        Unlike `message`, an enveloped message is not copied out of the decoded envelope.
+        """
+        self.__decode()
+        return as_byte_view(self._message) if self._message is not None else None
+
+    @property
+    def headers(self) -> envelope.Headers:
+        """The message headers. Empty if the message was not published with headers.
+
+        Read from the start of the Base64 encoded form, without decoding the message.
+        """
+        if self._headers is ReceivedMessage.__UNKNOWN:
+            self._headers = (
+                envelope.peek_headers(self._b64_message)
+                if self._b64_message is not None
+                else None
+            )
+        return self._headers if self._headers is not None else {}
+
+    @property
+    def message_id(self) -> Optional[str]:
+        """The client generated message ID, if published with `publish_idempotent`"""
+        return self.headers.get(envelope.MESSAGE_ID_HEADER)
+
+    @property
+    def content_type(self) -> Optional[str]:
+        """The content type, if published with `DataClient.publish_object`"""
+        return self.headers.get(serialization.CONTENT_TYPE_HEADER)
+
+    @property
+    def value(self) -> object:
+        """The message deserialized into an object. Deserialized on first access.
+
+        The serializer is picked by the content type header of the message, preferring the
+        serializer of the subscription when its content type matches. Messages without one
+        are deserialized with the serializer of the subscription, or returned as `bytes`
+        if there is none.
+        """
+        if self._value is ReceivedMessage.__UNKNOWN:
+            content_type = self.content_type
+            if (
+                content_type is not None
+                and self._serializer is not None
+                and self._serializer.content_type == content_type
+            ):
+                serializer = self._serializer
+            elif content_type is not None:
+                serializer = serialization.find_serializer(content_type)
+                if serializer is None:
+                    raise ValueError(f"No serializer for content type '{content_type}'")
+            elif self._serializer is not None:
+                serializer = self._serializer
+            else:
+                serializer = serialization.get_serializer("raw")
+            self.__decode()
+            self._value = serializer.deserialize(self._message)
+        return self._value
+
+    @property
+    def b64_message(self) -> Union[str, BufferLike]:
+        """The message in Base64 encoded form, as delivered by httpmq
+
+        A reassembled or replaced message is encoded again, in its envelope if it has
+        headers, so a republished copy keeps them.
+        """
+        if self._b64_message is None and self._message is not None:
+            encoded = b64encode_buffer(self._message)
+            headers = self.headers
+            if headers:
+                # The envelope length is a multiple of 3, so it is encoded on its own
+                encoded = b64encode_buffer(envelope.encode_headers(headers)) + encoded
+            self._b64_message = encoded
+        return self._b64_message
 
 
 class DataClient:
@@ -71,15 +276,92 @@ class DataClient:
         base_path = f"{DataClient.PATH_SUBSCRIBE_BASE}/{stream}/consumer/{consumer}"
         return {"base": base_path, "push_sub": base_path, "ack": f"{base_path}/ack"}
 
-    def __init__(self, api_client: client.APIClient):
+    def __init__(
+        self,
+        api_client: client.APIClient,
+        lag_monitor: Optional[LoopLagMonitor] = None,
+        json_codec: Optional[JSONCodec] = None,
+        offload_threshold: Optional[int] = None,
+        offload_executor: Optional[Executor] = None,
+        compressor: Optional[Union[str, compression.Compressor]] = None,
+        compress_threshold: int = 1024,
+        serializer: Union[str, serialization.Serializer] = "json",
+        max_msg_size: Optional[int] = None,
+        max_chunk_count: Optional[int] = None,
+        chunk_spool_threshold: int = 2**20,
+        chunk_max_age_sec: Optional[float] = None,
+        chunk_max_partial_messages: int = 64,
+    ):
         """Constructor
 
         :param api_client: base client object for interacting with httpmq
+        :param lag_monitor: optional event loop lag monitor. It is started on first use of
+            the client, and observes the push subscription message handlers.
+        :param json_codec: JSON codec for the API payloads. Defaults to `default_json_codec()`.
+        :param offload_threshold: if set, messages of at least this many bytes are encoded
+            and decoded in `offload_executor` instead of on the event loop. For received
+            messages, the size of the push subscription record is used.
+        :param offload_executor: executor for large message processing. Defaults to the
+            event loop's default executor.
+        :param compressor: if set, published messages of at least `compress_threshold`
+            bytes are compressed with this compressor: "zlib", "lz4" (if installed), "zstd"
+            (if installed), or a `httpmq.compression.Compressor`. Received messages are
+            always decompressed transparently.
+        :param compress_threshold: min size of a message to be compressed
+        :param serializer: default serializer for `publish_object`, and for the `value` of
+            received messages without a content type header: "json", "msgpack" (if
+            installed), "raw", the name of a registered serializer, or a
+            `httpmq.serialization.Serializer`.
+        :param max_msg_size: if set, published messages larger than this many bytes are
+            split into chunks of at most this size. Set it to the `max_msg_size` of the
+            stream. Chunks are reassembled by `push_subscribe`, so the `max_msg_inflight` of
+            the subscription must allow for all chunks of a message, and the consumer must
+            not be shared through a delivery group (see `httpmq.chunking`). Messages
+            published with `publish_stream` are not split. Messages with a message ID are
+            always split into the same chunks, so a retried publish completes the chunks
+            stored by an earlier attempt.
+        :param max_chunk_count: if set, max number of chunks a published message is split
+            into; publishing a larger message raises `ValueError`. Set it to at most the
+            `max_msg_inflight` of the subscriptions; a subscription drops (and ACKs)
+            messages with more chunks than its `max_msg_inflight`.
+        :param chunk_spool_threshold: max size of a partially received chunked message held
+            in memory; beyond it, the message is held in a temporary file
+        :param chunk_max_age_sec: if set, max time a chunked message may stay partially
+            received. Its chunks are then ACKed, and the message is lost, as it would
+            otherwise be redelivered forever.
+        :param chunk_max_partial_messages: max number of chunked messages partially
+            received by a subscription. Beyond it, the oldest is dropped without ACKing its
+            chunks, so httpmq redelivers them.
         """
         self.client = api_client
+        self.lag_monitor = lag_monitor
+        self.codec = json_codec if json_codec is not None else default_json_codec()
+        self.offload_threshold = offload_threshold
+        self.offload_executor = offload_executor
+        self.compressor = (
+            compression.get_compressor(compressor) if compressor is not None else None
+        )
+        self.compress_threshold = compress_threshold
+        # The JSON serializer of this client uses its JSON codec
+        self.__json_serializer = serialization.JSONSerializer(json_codec=self.codec)
+        self.serializer = self.__get_serializer(serializer)
+        self.max_msg_size = max_msg_size
+        self.max_chunk_count = max_chunk_count
+        self.chunk_spool_threshold = chunk_spool_threshold
+        self.chunk_max_age_sec = chunk_max_age_sec
+        self.chunk_max_partial_messages = chunk_max_partial_messages
+        # Called with (stream, consumer, stream seq, consumer seq, success) after each ACK
+        self.ack_observers: List[Callable[[str, str, int, int, bool], None]] = []
+
+    def __start_lag_monitor(self):
+        """Start the event loop lag monitor if one is provided"""
+        if self.lag_monitor is not None:
+            self.lag_monitor.start()
 
     async def disconnect(self):
         """Disconnect from the server"""
+        if self.lag_monitor is not None:
+            await self.lag_monitor.stop()
         await self.client.disconnect()
 
     async def ready(self, context: RequestContext):
@@ -87,6 +369,7 @@ class DataClient:
 
         :param context: the caller context
         """
+        self.__start_lag_monitor()
         resp = await self.client.get(path=DataClient.PATH_READY, context=context)
         if resp.status != HTTPStatus.OK:
             raise HttpmqAPIError(
@@ -95,27 +378,395 @@ class DataClient:
                 message="management API is not ready",
             )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
 
     async def publish(
-        self, subject: str, message: bytes, context: RequestContext
+        self,
+        subject: str,
+        message: BufferLike,
+        context: RequestContext,
+        preencoded: bool = False,
+        headers: Optional[envelope.Headers] = None,
     ) -> str:
         """Publishes a message under a subject
 
+        The message can be any buffer-protocol object (i.e. `bytes`, `bytearray`, or a
+        `memoryview` slice of a larger buffer); it is Base64 encoded without being copied
+        first.
+
+        If headers are provided, the message is placed in an envelope carrying them, which
+        `push_subscribe` unwraps on the receiving side (see `ReceivedMessage.headers`).
+
         :param subject: the subject to publish under
         :param message: the message to publish
         :param context: the caller context
+        :param preencoded: whether the message is already Base64 encoded
+        :param headers: optional message headers
         :return: request ID in the response
         """
-        # Base64 encode the message
-        encoded = base64.b64encode(message)
-        resp = await self.client.post(
-            path=DataClient.__publish_path(subject), context=context, body=encoded
+        encoded = await self.__encode_message(
+            message=message, preencoded=preencoded, headers=headers
         )
-        # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        return await self.__publish_encoded(
+            subject=subject,
+            encoded=encoded,
+            context=context,
+            message_id=headers.get(envelope.MESSAGE_ID_HEADER) if headers else None,
+        )
+
+    async def publish_object(
+        self,
+        subject: str,
+        obj: object,
+        context: RequestContext,
+        serializer: Optional[Union[str, serialization.Serializer]] = None,
+        headers: Optional[envelope.Headers] = None,
+    ) -> str:
+        """Serializes an object, and publishes it under a subject
+
+        The content type of the serializer is sent in the message headers, so the
+        receiving side deserializes the message with the matching serializer (see
+        `ReceivedMessage.value`).
+
+        :param subject: the subject to publish under
+        :param obj: the object to publish
+        :param context: the caller context
+        :param serializer: the serializer to use. Defaults to the client's serializer.
+        :param headers: optional additional message headers
+        :return: request ID in the response
+        """
+        message, headers = self.__serialize(
+            obj=obj, serializer=serializer, headers=headers
+        )
+        encoded = await self.__encode_message(message=message, headers=headers)
+        return await self.__publish_encoded(
+            subject=subject,
+            encoded=encoded,
+            context=context,
+            message_id=headers.get(envelope.MESSAGE_ID_HEADER),
+        )
+
+    async def publish_idempotent(
+        self,
+        subject: str,
+        message: BufferLike,
+        context: RequestContext,
+        message_id: Optional[str] = None,
+        max_retries: int = 3,
+        retry_interval_sec: float = 0.1,
+        headers: Optional[envelope.Headers] = None,
+    ) -> str:
+        """Publishes a message under a subject, with a client generated message ID
+
+        The message is placed in an envelope carrying the message ID, and the publish is
+        retried on failures which leave it unknown whether httpmq stored the message (i.e.
+        the connection breaking, or a timeout), as well as on retriable errors reported by
+        httpmq. A message stored more than once is delivered with the same message ID, so
+        subscriptions using a deduplication window (see `push_subscribe`) process it once.
+
+        :param subject: the subject to publish under
+        :param message: the message to publish
+        :param context: the caller context
+        :param message_id: the message ID. A random one is generated if not provided.
+        :param max_retries: max number of times to retry the publish
+        :param retry_interval_sec: the wait before the first retry. It doubles, with
+            jitter, on each retry.
+        :param headers: optional additional message headers
+        :return: request ID in the response
+        """
+        if message_id is None:
+            message_id = uuid.uuid4().hex
+        headers = dict(headers) if headers is not None else {}
+        headers[envelope.MESSAGE_ID_HEADER] = message_id
+        encoded = await self.__encode_message(message=message, headers=headers)
+        attempt = 0
+        while True:
+            try:
+                return await self.__publish_encoded(
+                    subject=subject,
+                    encoded=encoded,
+                    context=context,
+                    message_id=message_id,
+                )
+            except HttpmqAPIError as err:
+                if not err.retriable or attempt >= max_retries:
+                    raise
+                failure = err
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if attempt >= max_retries:
+                    raise
+                failure = err
+            delay = retry_interval_sec * 2**attempt * random.uniform(0.5, 1.5)
+            attempt += 1
+            LOG.warning(
+                "[%s] Publish of message '%s' failed, retry %d in %.2f sec: %s",
+                context.request_id,
+                message_id,
+                attempt,
+                delay,
+                failure,
+            )
+            await asyncio.sleep(delay)
+
+    def publisher(
+        self, subject: str, context: Optional[RequestContext] = None
+    ) -> "DataClient.Publisher":
+        """Define a publisher bound to one subject
+
+        The endpoint URL, headers, and timeout are computed once when the publisher is
+        defined, so publishing through the handle only encodes and sends the message.
+
+        :param subject: the subject to publish under
+        :param context: template for the context of every publish. The request ID is
+            generated per message.
+        :return: the publisher
+        """
+        if not subject or any(char.isspace() or char in "/?#" for char in subject):
+            raise ValueError(f"Invalid publish subject '{subject}'")
+        if context is None:
+            context = RequestContext()
+        return DataClient.Publisher(
+            subject=subject,
+            request=self.client.prepare(
+                path=DataClient.__publish_path(subject), context=context
+            ),
+            encode=self.__encode_message,
+            send=self.__publish_prepared,
+            serialize=self.__serialize,
+        )
+
+    async def publish_stream(
+        self,
+        subject: str,
+        source: StreamSource,
+        context: RequestContext,
+        chunk_size: int = 4 * ENCODE_CHUNK_SIZE,
+    ) -> str:
+        """Publishes a message read from a file or an async byte iterator under a subject
+
+        The message is Base64 encoded chunk by chunk while the request body is streamed to
+        httpmq, so only a few chunks of the message are held in memory at a time.
+
+        :param subject: the subject to publish under
+        :param source: a file path, a binary file object, or an async iterator of byte
+            chunks providing the message
+        :param context: the caller context
+        :param chunk_size: number of bytes to read from a file at a time
+        :return: request ID in the response
+        """
+        encoded = b64encode_stream(iter_stream_source(source, chunk_size=chunk_size))
+        return await self.__publish_encoded(
+            subject=subject, encoded=encoded, context=context
+        )
+
+    async def republish(
+        self, subject: str, original_msg: ReceivedMessage, context: RequestContext
+    ) -> str:
+        """Publishes a received message under a subject
+
+        The message is forwarded in the Base64 encoded form it was received in, so it is
+        neither decoded nor encoded again.
+
+        :param subject: the subject to publish under
+        :param original_msg: the received message to publish
+        :param context: the caller context
+        :return: request ID in the response
+        """
+        encoded = original_msg.b64_message
+        if isinstance(encoded, str):
+            encoded = encoded.encode("ascii")
+        return await self.__publish_encoded(
+            subject=subject, encoded=encoded, context=context
+        )
+
+    def __serialize(
+        self,
+        obj: object,
+        serializer: Optional[Union[str, serialization.Serializer]],
+        headers: Optional[envelope.Headers],
+    ) -> Tuple[BufferLike, envelope.Headers]:
+        """Serialize an object for publishing
+
+        :param obj: the object to publish
+        :param serializer: the serializer to use. Defaults to the client's serializer.
+        :param headers: optional additional message headers
+        :return: the message, and the message headers naming its content type
+        """
+        serializer = (
+            self.__get_serializer(serializer)
+            if serializer is not None
+            else self.serializer
+        )
+        headers = dict(headers) if headers is not None else {}
+        headers[serialization.CONTENT_TYPE_HEADER] = serializer.content_type
+        return serializer.serialize(obj), headers
+
+    def __get_serializer(
+        self, serializer: Union[str, serialization.Serializer]
+    ) -> serialization.Serializer:
+        """Fetch a serializer by name, with "json" using the JSON codec of the client
+
+        :param serializer: the serializer, or its name (see `serialization.get_serializer`)
+        :return: the serializer
+        """
+        if serializer == serialization.JSONSerializer.name:
+            return self.__json_serializer
+        return serialization.get_serializer(serializer)
+
+    async def __encode_message(
+        self,
+        message: BufferLike,
+        preencoded: bool = False,
+        headers: Optional[envelope.Headers] = None,
+    ) -> BufferLike:
+        """Base64 encode a message for publishing
+
+        Messages above `offload_threshold` are encoded, and placed in their envelope, in
+        the offload executor.
+
+        :param message: the message to publish
+        :param preencoded: whether the message is already Base64 encoded
+        :param headers: if provided, place the message in an envelope with these headers
+        :return: the Base64 encoded message
+        """
+        if preencoded and headers is None:
+            return message
+        if (
+            self.offload_threshold is not None
+            and memoryview(message).nbytes >= self.offload_threshold
+        ):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.offload_executor,
+                self.__encode_payload,
+                message,
+                preencoded,
+                headers,
+                True,
+            )
+        return self.__encode_payload(message, preencoded, headers)
+
+    def __encode_payload(
+        self,
+        message: BufferLike,
+        preencoded: bool = False,
+        headers: Optional[envelope.Headers] = None,
+        chunked: bool = False,
+    ) -> BufferLike:
+        """Compress, if enabled and worthwhile, and Base64 encode a message
+
+        :param message: the message to publish
+        :param preencoded: whether the message is already Base64 encoded
+        :param headers: if provided, place the message in an envelope with these headers
+        :param chunked: whether to Base64 encode in chunks, for use in a worker thread
+        :return: the Base64 encoded message
+        """
+        # The envelope length is a multiple of 3, so it is encoded separately, and
+        # joined with the encoded message in a single copy
+        prefix = (
+            b64encode_buffer(envelope.encode_headers(headers))
+            if headers is not None
+            else b""
+        )
+        if preencoded:
+            return b"".join((prefix, as_byte_view(message)))
+        if (
+            self.compressor is not None
+            and memoryview(message).nbytes >= self.compress_threshold
+        ):
+            compressed = compression.compress(message, self.compressor)
+            if compressed is not None:
+                message = compressed
+        if chunked:
+            return b64encode_buffer_chunked(message, prefix=prefix)
+        encoded = b64encode_buffer(message)
+        return b"".join((prefix, encoded)) if prefix else encoded
+
+    async def __publish_encoded(
+        self,
+        subject: str,
+        encoded: Union[BufferLike, AsyncIterable[bytes]],
+        context: RequestContext,
+        message_id: Optional[str] = None,
+    ) -> str:
+        """Publishes an already Base64 encoded message under a subject
+
+        :param subject: the subject to publish under
+        :param encoded: the Base64 encoded message to publish, or an async iterator
+            providing it in chunks
+        :param context: the caller context
+        :param message_id: the message ID, if the message has one
+        :return: request ID in the response
+        """
+        self.__start_lag_monitor()
+        path = DataClient.__publish_path(subject)
+        for body in self.__split_encoded(encoded, message_id):
+            resp = await self.client.post(path=path, context=context, body=body)
+            request_id = self.__process_publish_response(resp, context.request_id)
+        return request_id
+
+    async def __publish_prepared(
+        self,
+        request: client.APIClient.PreparedRequest,
+        encoded: BufferLike,
+        request_id: str,
+        message_id: Optional[str] = None,
+    ) -> str:
+        """Publishes an already Base64 encoded message using a prepared request
+
+        :param request: the prepared publish request state
+        :param encoded: the Base64 encoded message to publish
+        :param request_id: the request ID to use
+        :param message_id: the message ID, if the message has one
+        :return: request ID in the response
+        """
+        self.__start_lag_monitor()
+        for body in self.__split_encoded(encoded, message_id):
+            resp = await self.client.post_prepared(
+                prepared=request, request_id=request_id, body=body
+            )
+            resp_request_id = self.__process_publish_response(resp, request_id)
+        return resp_request_id
+
+    def __split_encoded(
+        self,
+        encoded: Union[BufferLike, AsyncIterable[bytes]],
+        message_id: Optional[str] = None,
+    ) -> List[Union[BufferLike, AsyncIterable[bytes]]]:
+        """Split an encoded message into chunks if it is larger than `max_msg_size`
+
+        :param encoded: the Base64 encoded message to publish, or an async iterator
+            providing it in chunks
+        :param message_id: the message ID, if the message has one. The chunk ID is derived
+            from it, so publishing the message again produces the same chunks.
+        :return: the Base64 encoded chunks to publish, in order
+        """
+        if (
+            self.max_msg_size is None
+            or not isinstance(encoded, (bytes, bytearray, memoryview))
+            or chunking.decoded_size(encoded) <= self.max_msg_size
+        ):
+            return [encoded]
+        return chunking.split_encoded(
+            encoded,
+            self.max_msg_size,
+            chunking.chunk_id(message_id) if message_id is not None else None,
+            max_chunks=self.max_chunk_count,
+        )
+
+    def __process_publish_response(
+        self, resp: client.APIClient.Response, request_id: str
+    ) -> str:
+        """Process the response body of a publish
+
+        :param resp: the response
+        :param request_id: the request ID of the publish
+        :return: request ID in the response
+        """
+        if resp.status != HTTPStatus.OK:
+            raise self.__error_response(resp, request_id)
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
@@ -151,33 +802,54 @@ class DataClient:
         :param context: the caller context
         :return: request ID in the response
         """
-        payload = json.dumps(
+        payload = self.codec.dumps(
             DataplaneAckSeqNum(consumer=consumer_seq, stream=stream_seq).to_dict()
-        ).encode("utf-8")
-        resp = await self.client.post(
-            path=(
-                DataClient.__subscribe_paths(stream=stream, consumer=consumer)["ack"]
-            ),
-            context=context,
-            body=payload,
         )
-        # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
-        if not parsed.success:
-            raise HttpmqAPIError.from_rest_base_api_response(parsed)
-        return parsed.request_id
+        success = False
+        try:
+            resp = await self.client.post(
+                path=(
+                    DataClient.__subscribe_paths(stream=stream, consumer=consumer)[
+                        "ack"
+                    ]
+                ),
+                context=context,
+                body=payload,
+            )
+            # Process the response body
+            parsed = GoutilsRestAPIBaseResponse.from_dict(
+                self.codec.loads(resp.content)
+            )
+            if not parsed.success:
+                raise HttpmqAPIError.from_rest_base_api_response(parsed)
+            success = True
+            return parsed.request_id
+        finally:
+            for observer in self.ack_observers:
+                observer(stream, consumer, stream_seq, consumer_seq, success)
 
     async def send_ack_simple(
         self, original_msg: ReceivedMessage, context: RequestContext
     ) -> str:
         """Send a message ACK for an associated JetStream message
 
-        This is a wrapper around `send_ack`.
+        This is a wrapper around `send_ack`. For a reassembled message, all its chunks are
+        ACKed.
 
         :param orignal_msg: the received JetStream message
         :param context: the caller context
         :return: request ID in the response
         """
+        if original_msg.chunks is not None:
+            for stream_seq, consumer_seq in original_msg.chunks:
+                request_id = await self.send_ack(
+                    stream=original_msg.stream,
+                    stream_seq=stream_seq,
+                    consumer=original_msg.consumer,
+                    consumer_seq=consumer_seq,
+                    context=context,
+                )
+            return request_id
         return await self.send_ack(
             stream=original_msg.stream,
             stream_seq=original_msg.stream_seq,
@@ -197,6 +869,10 @@ class DataClient:
         max_msg_inflight: int = None,
         delivery_group: str = None,
         loop_interval_sec: float = 0.25,
+        dedup_window: Optional[int] = None,
+        state: Optional["DataClient.SubscriptionState"] = None,
+        connect_cb: Optional[Callable[[], None]] = None,
+        idle_timeout_sec: Optional[float] = None,
     ) -> str:
         """Start a push subscription for a consumer on a stream
 
@@ -218,9 +894,27 @@ class DataClient:
         :param max_msg_inflight: the max number of inflight messages if provided
         :param delivery_group: the delivery group the consumer belongs to if the consumer uses one
         :param loop_interval_sec: the sleep interval between non-blocking reads
+        :param dedup_window: if set, the number of most recent message IDs remembered for
+            dropping duplicate copies of messages published with `publish_idempotent`.
+            Duplicates are ACKed without being forwarded; redeliveries of the same stream
+            message are still forwarded.
+        :param state: subscription state carried over from an earlier connection of this
+            subscription (see `subscription_state`). `dedup_window` is ignored if provided.
+        :param connect_cb: optional function called once the server accepts the
+            subscription
+        :param idle_timeout_sec: if set, once no data arrived for this long the dataplane
+            readiness is checked. If it is not ready, the connection is treated as dead and
+            `HttpmqIdleTimeoutError` is raised. TCP keepalive probes are enabled as well, so
+            a half-open connection fails within about twice this time.
         :return: request ID in the response
         """
-        # Update request context with additional query parameters
+        self.__start_lag_monitor()
+        owns_state = state is None
+        if state is None:
+            state = self.subscription_state(dedup_window=dedup_window)
+        ack_context = context.copy()
+        # Add the query parameters to a copy, so the caller context can be reused
+        context = context.copy().set_request_id(context.request_id)
         context.add_param(param_name="subject_name", param_value=subject_filter)
         if max_msg_inflight is not None:
             context.add_param(
@@ -235,7 +929,19 @@ class DataClient:
         ]
 
         # Callback for processing the byte string
-        assemble_buffer = DataClient.RxMessageSplitter()
+        assemble_buffer = DataClient.RxMessageSplitter(
+            json_codec=self.codec,
+            record_parser=state.decoder,
+            defer_threshold=self.offload_threshold,
+        )
+        loop = asyncio.get_running_loop()
+
+        # Attribute time spent in the message handler to this subscription
+        handler_label = f"{stream}/{consumer}"
+        if self.lag_monitor is not None:
+            track_handler = self.lag_monitor.track_handler
+        else:
+            track_handler = nullcontext
 
         async def process_stream_segment(
             msg: Union[
@@ -249,32 +955,34 @@ class DataClient:
             if isinstance(msg, client.APIClient.StreamDataSegment):
                 # Process the message byte
                 messages = assemble_buffer.process_new_segment(msg.data)
-                for one_msg in messages:
-                    # Decode each message
-                    parsed = ApisAPIRestRespDataMessage.from_dict(one_msg)
-                    if not parsed.success:
-                        error = HttpmqAPIError.from_rest_base_api_response(parsed)
-                        await forward_data_cb(error)
-                        raise error
+                for message in messages:
+                    if isinstance(message, DataClient.RxMessageSplitter.RawRecord):
+                        # Large record; parse and decode it off the event loop
+                        message = await loop.run_in_executor(
+                            self.offload_executor,
+                            state.decoder.decode_eagerly,
+                            message.data,
+                        )
+                    if isinstance(message, HttpmqAPIError):
+                        with track_handler(handler_label):
+                            await forward_data_cb(message)
+                        raise message
                     LOG.debug(
                         "[%s] Push-subscribe received message [S:%d, C:%d]",
-                        parsed.request_id,
-                        parsed.sequence.stream,
-                        parsed.sequence.consumer,
+                        message.request_id,
+                        message.stream_seq,
+                        message.consumer_seq,
                     )
-                    # Perform Base64 decode
-                    decoded = base64.b64decode(parsed.b64_msg)
-                    # Repackage the message
-                    message = ReceivedMessage(
-                        stream=parsed.stream,
-                        stream_seq=parsed.sequence.stream,
-                        consumer=parsed.consumer,
-                        consumer_seq=parsed.sequence.consumer,
-                        subject=parsed.subject,
-                        request_id=parsed.request_id,
-                        message=decoded,
+                    message = await self.__reassemble(
+                        state.reassembler, message, ack_context, max_msg_inflight
                     )
-                    await forward_data_cb(message)
+                    if message is None:
+                        continue
+                    if state.dedup is not None and state.dedup.is_duplicate(message):
+                        await self.__drop_duplicate(message, ack_context)
+                        continue
+                    with track_handler(handler_label):
+                        await forward_data_cb(message)
                 return
             raise HttpmqInternalError(
                 request_id=context.request_id,
@@ -283,60 +991,583 @@ class DataClient:
                 ),
             )
 
-        resp = await self.client.get_sse(
-            path=target_path,
-            context=context,
-            stop_loop=stop_loop,
-            forward_data_cb=process_stream_segment,
-            loop_interval_sec=loop_interval_sec,
-        )
-        if resp.status != HTTPStatus.OK:
-            raise HttpmqAPIError.from_rest_base_api_response(
-                GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        try:
+            resp = await self.client.get_sse(
+                path=target_path,
+                context=context,
+                stop_loop=stop_loop,
+                forward_data_cb=process_stream_segment,
+                loop_interval_sec=loop_interval_sec,
+                connect_cb=connect_cb,
+                idle_timeout_sec=idle_timeout_sec,
+                idle_check=functools.partial(
+                    self.__check_ready,
+                    context=ack_context,
+                    timeout_sec=idle_timeout_sec,
+                ),
             )
+        finally:
+            if owns_state:
+                state.close()
+        if resp.status != HTTPStatus.OK:
+            raise self.__error_response(resp, context.request_id)
 
         LOG.debug("[%s] Leaving push-subscribe runner", context.request_id)
         return context.request_id
 
+    def __error_response(
+        self, resp: client.APIClient.Response, request_id: str
+    ) -> HttpmqAPIError:
+        """Define the error of a failed request from its response
+
+        An error response not sent by httpmq (i.e. the HTML page of a proxy in front of it)
+        has no JSON body; the error then carries the response status only, so
+        `HttpmqAPIError.retriable` still applies.
+
+        :param resp: the error response
+        :param request_id: the request ID of the failed request
+        :return: the error
+        """
+        try:
+            return HttpmqAPIError.from_rest_base_api_response(
+                GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
+            )
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return HttpmqAPIError(
+                request_id=request_id,
+                status_code=resp.status,
+                message="response body is not an httpmq error",
+            )
+
+    async def __check_ready(self, context: RequestContext, timeout_sec: float) -> bool:
+        """Liveness check of an idle push subscription
+
+        :param context: the subscription context, without the subscription parameters
+        :param timeout_sec: timeout of the readiness check
+        :return: whether the dataplane is ready
+        """
+        probe_context = context.copy().set_request_timeout(
+            aiohttp.ClientTimeout(total=timeout_sec)
+        )
+        try:
+            await self.ready(context=probe_context)
+        except (HttpmqAPIError, aiohttp.ClientError, asyncio.TimeoutError) as err:
+            LOG.warning(
+                "[%s] Push-subscribe idle, and dataplane is not ready: %s",
+                context.request_id,
+                err,
+            )
+            return False
+        return True
+
+    def subscription_state(
+        self, dedup_window: Optional[int] = None
+    ) -> "DataClient.SubscriptionState":
+        """Define the state of a push subscription, for reuse across its connections
+
+        :param dedup_window: if set, the number of most recent message IDs remembered for
+            dropping duplicate copies of messages (see `push_subscribe`)
+        :return: the subscription state
+        """
+        return DataClient.SubscriptionState(
+            decoder=DataClient.RxMessageDecoder(
+                json_codec=self.codec, serializer=self.serializer
+            ),
+            reassembler=chunking.Reassembler(
+                spool_threshold=self.chunk_spool_threshold,
+                max_partial_messages=self.chunk_max_partial_messages,
+                max_partial_age_sec=self.chunk_max_age_sec,
+            ),
+            dedup=DataClient.DedupWindow(dedup_window) if dedup_window else None,
+        )
+
+    async def __drop_duplicate(self, message: ReceivedMessage, context: RequestContext):
+        """ACK a duplicate message instead of forwarding it
+
+        A failed ACK is only logged; httpmq redelivers the duplicate, which is dropped
+        again.
+
+        :param message: the duplicate message
+        :param context: the request context of the subscription ACKs
+        """
+        LOG.debug(
+            "[%s] Dropping duplicate of message '%s' [S:%d]",
+            message.request_id,
+            message.message_id,
+            message.stream_seq,
+        )
+        try:
+            await self.send_ack_simple(message, context.copy())
+        except Exception:  # pylint: disable=broad-except
+            LOG.exception(
+                "[%s] Failed to ACK duplicate of message '%s' [S:%d]",
+                message.request_id,
+                message.message_id,
+                message.stream_seq,
+            )
+
+    async def __reassemble(
+        self,
+        reassembler: chunking.Reassembler,
+        message: ReceivedMessage,
+        context: RequestContext,
+        max_msg_inflight: Optional[int],
+    ) -> Optional[ReceivedMessage]:
+        """Pass a received message through the chunk reassembler
+
+        The chunks of partial messages the reassembler discards are ACKed. So are the
+        chunks of a message with more chunks than `max_msg_inflight`, which can never be
+        reassembled; the message is dropped.
+
+        :param reassembler: the reassembler of the subscription
+        :param message: the received message
+        :param context: the request context of the subscription ACKs
+        :param max_msg_inflight: the max number of inflight messages of the subscription
+        :return: the message if it is not a chunk; the reassembled message once its last
+            chunk is received; otherwise None
+        """
+        header = chunking.peek_header(message.b64_message)
+        if header is None:
+            return message
+        if max_msg_inflight is not None and header.count > int(max_msg_inflight):
+            LOG.error(
+                "[%s] Dropping chunk %d of message %s [S:%d]: %d chunks can not be "
+                "reassembled with max_msg_inflight %s",
+                message.request_id,
+                header.index,
+                header.message_id.hex(),
+                message.stream_seq,
+                header.count,
+                max_msg_inflight,
+            )
+            await self.__ack_chunks(
+                message, [(message.stream_seq, message.consumer_seq)], context
+            )
+            return None
+        # Only the sequence numbers of the chunk are kept, not the chunk itself
+        assembled = reassembler.add(
+            header,
+            message.message_view[chunking.HEADER_SIZE :],
+            (message.stream_seq, message.consumer_seq),
+            origin=message.stream_seq,
+        )
+        await self.__ack_chunks(message, reassembler.take_abandoned(), context)
+        if assembled is None:
+            return None
+        data, chunks = assembled
+        headers, data = envelope.unwrap(data)
+        return ReceivedMessage(
+            stream=message.stream,
+            stream_seq=message.stream_seq,
+            consumer=message.consumer,
+            consumer_seq=message.consumer_seq,
+            subject=message.subject,
+            message=compression.decompress(data),
+            request_id=message.request_id,
+            headers=headers,
+            serializer=self.serializer,
+            chunks=chunks,
+        )
+
+    async def __ack_chunks(
+        self,
+        message: ReceivedMessage,
+        chunks: List[Tuple[int, int]],
+        context: RequestContext,
+    ):
+        """ACK chunks dropped without being reassembled
+
+        A failed ACK is only logged; httpmq then redelivers the chunk.
+
+        :param message: the received chunk which led to dropping the chunks
+        :param chunks: the (stream, consumer) sequence numbers of the chunks
+        :param context: the request context of the subscription ACKs
+        """
+        for stream_seq, consumer_seq in chunks:
+            try:
+                await self.send_ack(
+                    stream=message.stream,
+                    stream_seq=stream_seq,
+                    consumer=message.consumer,
+                    consumer_seq=consumer_seq,
+                    context=context.copy(),
+                )
+            except Exception:  # pylint: disable=broad-except
+                LOG.exception(
+                    "[%s] Failed to ACK discarded chunk [S:%d, C:%d]",
+                    message.request_id,
+                    stream_seq,
+                    consumer_seq,
+                )
+
+    class SubscriptionState:
+        """
+        State of a push subscription which outlives one connection
+
+        Created through `DataClient.subscription_state`. Passing the same state to each
+        `push_subscribe` call of a subscription keeps the message ID deduplication window,
+        and the partially received chunked messages, across reconnects. Messages which
+        were delivered but not ACKed before the connection dropped are redelivered by
+        httpmq.
+        """
+
+        def __init__(
+            self,
+            decoder: "DataClient.RxMessageDecoder",
+            reassembler: chunking.Reassembler,
+            dedup: Optional["DataClient.DedupWindow"],
+        ):
+            """Constructor
+
+            :param decoder: decoder of the push subscription records
+            :param reassembler: reassembler of chunked messages
+            :param dedup: message ID deduplication window, if used
+            """
+            self.decoder = decoder
+            self.reassembler = reassembler
+            self.dedup = dedup
+
+        def close(self):
+            """Discard the partially received chunked messages"""
+            self.reassembler.close()
+
+    class Publisher:
+        """
+        Publisher bound to one subject
+
+        Created through `DataClient.publisher`.
+        """
+
+        def __init__(
+            self,
+            subject: str,
+            request: client.APIClient.PreparedRequest,
+            encode: Callable[
+                [BufferLike, bool, Optional[envelope.Headers]], Awaitable[BufferLike]
+            ],
+            send: Callable[
+                [client.APIClient.PreparedRequest, BufferLike, str, Optional[str]],
+                Awaitable[str],
+            ],
+            serialize: Callable[
+                [
+                    object,
+                    Optional[Union[str, serialization.Serializer]],
+                    Optional[envelope.Headers],
+                ],
+                Tuple[BufferLike, envelope.Headers],
+            ],
+        ):
+            """Constructor
+
+            :param subject: the subject to publish under
+            :param request: the prepared publish request state
+            :param encode: function for Base64 encoding a message
+            :param send: function for sending an encoded message
+            :param serialize: function for serializing an object into a message
+            """
+            self.subject = subject
+            self.request = request
+            self.__encode = encode
+            self.__send = send
+            self.__serialize = serialize
+            # Request IDs are a per-publisher UUID followed by a message counter
+            self.__request_id_prefix = f"{uuid.uuid4()}-"
+            self.__request_count = itertools.count()
+
+        async def publish(
+            self,
+            message: BufferLike,
+            preencoded: bool = False,
+            request_id: Optional[str] = None,
+            headers: Optional[envelope.Headers] = None,
+        ) -> str:
+            """Publishes a message under the subject
+
+            :param message: the message to publish
+            :param preencoded: whether the message is already Base64 encoded
+            :param request_id: the request ID to use. Generated if not provided.
+            :param headers: optional message headers
+            :return: request ID in the response
+            """
+            if request_id is None:
+                request_id = f"{self.__request_id_prefix}{next(self.__request_count)}"
+            encoded = await self.__encode(message, preencoded, headers)
+            return await self.__send(
+                self.request,
+                encoded,
+                request_id,
+                headers.get(envelope.MESSAGE_ID_HEADER) if headers else None,
+            )
+
+        async def publish_object(
+            self,
+            obj: object,
+            serializer: Optional[Union[str, serialization.Serializer]] = None,
+            request_id: Optional[str] = None,
+            headers: Optional[envelope.Headers] = None,
+        ) -> str:
+            """Serializes an object, and publishes it under the subject
+
+            :param obj: the object to publish
+            :param serializer: the serializer to use. Defaults to the client's serializer.
+            :param request_id: the request ID to use. Generated if not provided.
+            :param headers: optional additional message headers
+            :return: request ID in the response
+            """
+            message, headers = self.__serialize(obj, serializer, headers)
+            return await self.publish(
+                message=message, request_id=request_id, headers=headers
+            )
+
+    class DedupWindow:
+        """
+        Support class for detecting duplicate copies of messages with the same message ID
+
+        Remembers the stream sequence number of the most recent message IDs. A message is a
+        duplicate if its ID was seen on a different stream message; redeliveries of the
+        same stream message are not duplicates.
+        """
+
+        def __init__(self, max_size: int):
+            """Constructor
+
+            :param max_size: max number of message IDs remembered
+            """
+            self.max_size = max_size
+            self.__seen: "OrderedDict[str, int]" = OrderedDict()
+
+        def is_duplicate(self, message: ReceivedMessage) -> bool:
+            """Check whether a message is a duplicate, and remember its ID if not
+
+            :param message: the received message
+            :return: whether the message is a duplicate
+            """
+            message_id = message.message_id
+            if message_id is None:
+                return False
+            stream_seq = self.__seen.get(message_id)
+            if stream_seq is not None:
+                self.__seen.move_to_end(message_id)
+                return stream_seq != message.stream_seq
+            self.__seen[message_id] = message.stream_seq
+            if len(self.__seen) > self.max_size:
+                self.__seen.popitem(last=False)
+            return False
+
+    class RxMessageDecoder:
+        """
+        Support class for decoding one push subscription record directly into a
+        ReceivedMessage, without building the intermediate data models.
+
+        The stream, consumer, subject, and request ID strings repeat across the records of
+        one subscription, so the decoder reuses one instance of each instead of keeping the
+        fresh copy produced by JSON parsing.
+        """
+
+        def __init__(
+            self,
+            json_codec: Optional[JSONCodec] = None,
+            max_cached_names: int = 1024,
+            serializer: Optional[serialization.Serializer] = None,
+        ):
+            """Constructor
+
+            :param json_codec: JSON codec for parsing the records
+            :param max_cached_names: max number of distinct name strings to reuse
+            :param serializer: serializer for messages without a content type header
+            """
+            self.codec = json_codec if json_codec is not None else default_json_codec()
+            self.serializer = serializer
+            self.max_cached_names = max_cached_names
+            self.__names: Dict[str, str] = {}
+
+        def __reuse_name(self, name: str) -> str:
+            """Return the previously seen instance of a name string if there is one"""
+            cached = self.__names.get(name)
+            if cached is not None:
+                return cached
+            if len(self.__names) < self.max_cached_names:
+                self.__names[name] = name
+            return name
+
+        def __call__(self, record: bytes) -> Union[ReceivedMessage, HttpmqAPIError]:
+            """Decode one record
+
+            :param record: the raw NDJSON record
+            :return: the received message, or the error reported by the server
+            """
+            parsed = self.codec.loads(record)
+            return self.__from_parsed(parsed, b64_message=parsed.get("b64_msg"))
+
+        def __from_parsed(
+            self,
+            parsed: Dict[str, object],
+            b64_message: Union[str, memoryview, None],
+            message: Optional[bytes] = None,
+            headers: Optional[envelope.Headers] = None,
+        ) -> Union[ReceivedMessage, HttpmqAPIError]:
+            """Build the received message from a parsed record"""
+            if not parsed.get("success"):
+                # Only build the full model for errors
+                return HttpmqAPIError.from_rest_base_api_response(
+                    ApisAPIRestRespDataMessage.from_dict(parsed)
+                )
+            sequence = parsed["sequence"]
+            reuse_name = self.__reuse_name
+            return ReceivedMessage(
+                stream=reuse_name(parsed["stream"]),
+                stream_seq=sequence["stream"],
+                consumer=reuse_name(parsed["consumer"]),
+                consumer_seq=sequence["consumer"],
+                subject=reuse_name(parsed["subject"]),
+                request_id=reuse_name(parsed["request_id"]),
+                message=message,
+                b64_message=b64_message,
+                headers=headers,
+                serializer=self.serializer,
+            )
+
+        def decode_eagerly(
+            self, record: Union[bytes, bytearray]
+        ) -> Union[ReceivedMessage, HttpmqAPIError]:
+            """Decode one large record, including the Base64 decode of the message
+
+            Intended for use in a worker thread. The Base64 encoded message is cut out of
+            the record instead of being parsed as part of the JSON document, and is decoded
+            in chunks, so the GIL is periodically released for the event loop thread.
+
+            Messages with a content type header are deserialized here as well.
+
+            :param record: the raw NDJSON record
+            :return: the received message, or the error reported by the server
+            """
+            field = b'"b64_msg":"'
+            value_start = record.find(field)
+            value_end = (
+                record.find(b'"', value_start + len(field)) if value_start >= 0 else -1
+            )
+            if value_end < 0:
+                parsed = self.codec.loads(record)
+                b64_message = parsed.get("b64_msg")
+            else:
+                value_start += len(field)
+                view = memoryview(record)
+                # Parse the record with an empty message
+                parsed = self.codec.loads(
+                    bytes(view[:value_start]) + bytes(view[value_end:])
+                )
+                b64_message = view[value_start:value_end]
+            if not parsed.get("success") or b64_message is None:
+                return self.__from_parsed(parsed, b64_message=b64_message)
+            headers, message = envelope.unwrap(b64decode_chunked(b64_message))
+            message = compression.decompress(message)
+            received = self.__from_parsed(
+                parsed,
+                b64_message=b64_message,
+                message=message,
+                headers=headers,
+            )
+            if received.content_type is not None:
+                try:
+                    _ = received.value
+                except ValueError:
+                    # Left for the handler to run into when accessing the value
+                    pass
+            return received
+
     class RxMessageSplitter:
         """
         Support class for taking the text stream from the push subscription endpoint, and
         separate that out into individual messages
         """
 
-        def __init__(self):
-            """Constructor"""
+        class RawRecord:
+            """A complete record which was not parsed because of its size"""
+
+            def __init__(self, data: Union[bytes, bytearray]):
+                """Constructor
+
+                :param data: the raw record
+                """
+                self.data = data
+
+        def __init__(
+            self,
+            json_codec: Optional[JSONCodec] = None,
+            record_parser: Optional[Callable[[bytes], object]] = None,
+            defer_threshold: Optional[int] = None,
+        ):
+            """Constructor
+
+            :param json_codec: JSON codec for parsing the messages
+            :param record_parser: function converting one raw record into its parsed form.
+                It must raise `json.JSONDecodeError` if the record is incomplete. Defaults
+                to parsing the record into a DICT with `json_codec`.
+            :param defer_threshold: if set, records of at least this many bytes are not
+                parsed. They are returned as `RawRecord` once their terminating NL arrives,
+                so the caller can parse them elsewhere.
+            """
             self.left_over = None
+            self.codec = json_codec if json_codec is not None else default_json_codec()
+            self.parse_record = (
+                record_parser if record_parser is not None else self.codec.loads
+            )
+            self.defer_threshold = defer_threshold
 
-        def process_new_segment(self, stream_chunk: bytes) -> List[Dict[str, object]]:
-            """Given a new stream chunk, process a list of parsed DICT
+        @staticmethod
+        def __as_buffer(data: Union[bytes, bytearray]) -> bytearray:
+            """Convert a partial record into an extendable buffer, copying only if needed"""
+            return data if isinstance(data, bytearray) else bytearray(data)
+
+        def __is_deferred(self, record: Union[bytes, bytearray]) -> bool:
+            """Whether a record is too large to parse here"""
+            return (
+                self.defer_threshold is not None and len(record) >= self.defer_threshold
+            )
+
+        def process_new_segment(self, stream_chunk: bytes) -> List[object]:
+            """Given a new stream chunk, process a list of parsed records
 
             :param stream_chunk: new message chunk
-            :return: list of parsed DICTs
+            :return: list of parsed records; DICTs unless a `record_parser` is provided
             """
             if not stream_chunk:
                 return []
 
-            # Split the chunk by NL
-            lines = stream_chunk.decode("utf-8").split("\n")
+            # Split the chunk by NL. The NL byte never appears within a multi-byte UTF-8
+            # sequence, so the chunk can be split without decoding it first.
+            lines = stream_chunk.split(b"\n")
             if len(lines) == 0:
                 return []
 
             parsed_lines = []
+            last_line = len(lines) - 1
             # Process each line
-            for one_line in lines:
+            for line_idx, one_line in enumerate(lines):
                 to_process = one_line
-                # If there were leftovers, combine the current one with leftover
+                # If there were leftovers, combine the current one with leftover. The
+                # leftover is extended in place, as a large record arrives over many chunks.
                 if self.left_over is not None:
-                    to_process = self.left_over + one_line
+                    self.left_over += one_line
+                    to_process = self.left_over
                     self.left_over = None
                 if not to_process:
                     continue
+                if self.__is_deferred(to_process):
+                    if line_idx < last_line:
+                        parsed_lines.append(
+                            DataClient.RxMessageSplitter.RawRecord(to_process)
+                        )
+                    else:
+                        # Wait for the NL instead of attempting to parse a large record
+                        self.left_over = self.__as_buffer(to_process)
+                    continue
                 try:
-                    parsed = json.loads(to_process)
+                    parsed = self.parse_record(to_process)
                     parsed_lines.append(parsed)
                 except json.decoder.JSONDecodeError:
                     # Parse failure, assume incomplete
-                    self.left_over = to_process
+                    self.left_over = self.__as_buffer(to_process)
 
             return parsed_lines
@@ -0,0 +1,572 @@
+"""Dispatch of received messages to handlers running in process or thread pools"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=import-outside-toplevel
+
+import abc
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+from httpmq import envelope
+from httpmq.common import RequestContext
+from httpmq.dataplane import DataClient, ReceivedMessage
+from httpmq.drain import DrainReport, finish_tasks
+
+LOG = logging.getLogger("httpmq-sdk.dataplane")
+
+
+class DispatchedMessage:
+    """A received message, as presented to a handler running in a worker process"""
+
+    __slots__ = (
+        "stream",
+        "stream_seq",
+        "consumer",
+        "consumer_seq",
+        "subject",
+        "headers",
+        "payload",
+    )
+
+    def __init__(
+        self,
+        stream: str,
+        stream_seq: int,
+        consumer: str,
+        consumer_seq: int,
+        subject: str,
+        headers: envelope.Headers,
+        payload: memoryview,
+    ):
+        """Constructor
+
+        :param stream: name of the stream this message is from
+        :param stream_seq: the message sequence number within this stream
+        :param consumer: name of the consumer that received the message
+        :param consumer_seq: the message sequence number for that consumer on this stream
+        :param subject: the message subject
+        :param headers: the message headers
+        :param payload: the message. It may be a view of shared memory, which is only valid
+            while the handler runs; copy it (i.e. `bytes(payload)`) to keep it.
+        """
+        self.stream = stream
+        self.stream_seq = stream_seq
+        self.consumer = consumer
+        self.consumer_seq = consumer_seq
+        self.subject = subject
+        self.headers = headers
+        self.payload = payload
+
+
+DispatchHandler = Callable[[DispatchedMessage], None]
+
+# Fields of a ReceivedMessage passed to the worker process next to the payload
+_Metadata = Tuple[str, int, str, int, str, envelope.Headers]
+
+
+def _run_handler(
+    handler: DispatchHandler,
+    metadata: _Metadata,
+    payload: Optional[bytes],
+    shm_name: Optional[str],
+    size: int,
+):
+    """Run the handler for one message in a worker process
+
+    The payload is either passed in `payload`, or placed in the shared memory block
+    `shm_name` by the dispatcher.
+    """
+    if shm_name is None:
+        handler(DispatchedMessage(*metadata, payload=memoryview(payload)))
+        return
+    from multiprocessing import shared_memory
+
+    block = shared_memory.SharedMemory(name=shm_name)
+    view = block.buf[:size]
+    try:
+        handler(DispatchedMessage(*metadata, payload=view))
+    finally:
+        view.release()
+        block.close()
+
+
+class DispatchStats:
+    """Snapshot of the state of a Dispatcher"""
+
+    def __init__(
+        self,
+        inflight: int,
+        max_msg_inflight: int,
+        dispatched: int,
+        succeeded: int,
+        failed: int,
+        ack_failures: int,
+        processing_time_sec: float,
+    ):
+        """Constructor
+
+        :param inflight: number of messages being processed
+        :param max_msg_inflight: max number of messages processed at once
+        :param dispatched: number of messages passed to the workers
+        :param succeeded: number of messages the handler completed for
+        :param failed: number of messages the handler raised an exception for
+        :param ack_failures: number of messages which could not be ACKed after the handler
+            completed
+        :param processing_time_sec: total time from dispatch to handler completion
+        """
+        self.inflight = inflight
+        self.max_msg_inflight = max_msg_inflight
+        self.dispatched = dispatched
+        self.succeeded = succeeded
+        self.failed = failed
+        self.ack_failures = ack_failures
+        self.processing_time_sec = processing_time_sec
+
+
+class ProcessPoolStats(DispatchStats):
+    """Snapshot of the state of a ProcessPoolDispatcher"""
+
+    def __init__(self, shared_memory: int, **kwargs):
+        """Constructor
+
+        :param shared_memory: number of messages handed over through shared memory
+        :param kwargs: the `DispatchStats` fields
+        """
+        super().__init__(**kwargs)
+        self.shared_memory = shared_memory
+
+
+class ThreadPoolStats(DispatchStats):
+    """Snapshot of the state of a ThreadPoolDispatcher"""
+
+    def __init__(
+        self,
+        workers: int,
+        queued: int,
+        busy: int,
+        busy_time_sec: float,
+        utilization: float,
+        **kwargs,
+    ):
+        """Constructor
+
+        :param workers: number of threads in the pool
+        :param queued: number of messages waiting for a free thread
+        :param busy: number of threads running the handler
+        :param busy_time_sec: total time spent in the handler, over all threads
+        :param utilization: fraction of the thread time spent in the handler since start
+        :param kwargs: the `DispatchStats` fields
+        """
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.queued = queued
+        self.busy = busy
+        self.busy_time_sec = busy_time_sec
+        self.utilization = utilization
+
+
+class Dispatcher(abc.ABC):
+    """
+    Base of the dispatchers, which run message handlers outside the event loop, and ACK
+    the messages they complete
+
+    A dispatcher is the `forward_data_cb` of a subscription (or the handler of a
+    `SubscriptionManager` subscription). The call returns as soon as the message is
+    dispatched, so the subscription keeps reading and ACKing while handlers run. At most
+    `max_msg_inflight` messages are processed at once; beyond that, the call waits for a
+    message to complete, which holds back the subscription loop. Use the same
+    `max_msg_inflight` as the subscription.
+
+    A message is ACKed once the handler returns. If it raises, the message is not ACKed,
+    so httpmq redelivers it.
+    """
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        max_msg_inflight: int = 16,
+        context: Optional[RequestContext] = None,
+    ):
+        """Constructor
+
+        :param data_client: client used to ACK the messages
+        :param max_msg_inflight: max number of messages processed at once
+        :param context: template for the context of the ACK requests
+        """
+        self.data_client = data_client
+        self.max_msg_inflight = max_msg_inflight
+        self.context = context if context is not None else RequestContext()
+        self.__slots: Optional[asyncio.Semaphore] = None
+        self.__tasks: Dict[asyncio.Task, List[ReceivedMessage]] = {}
+        self.__inflight = 0
+        self.__dispatched = 0
+        self.__succeeded = 0
+        self.__failed = 0
+        self.__ack_failures = 0
+        self.__processing_time_sec = 0.0
+
+    def start(self):
+        """Start the workers"""
+        if self.__slots is not None:
+            return
+        self.__slots = asyncio.Semaphore(self.max_msg_inflight)
+        self._open()
+
+    async def stop(self):
+        """Wait for the messages being processed, then stop the workers"""
+        if self.__slots is None:
+            return
+        if self.__tasks:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__slots = None
+        await self._close(wait=True)
+
+    async def drain(self, timeout_sec: float) -> DrainReport:
+        """Finish processing the dispatched messages within a deadline, then stop the workers
+
+        Messages still being processed at the deadline are abandoned: they are no longer
+        awaited, and not ACKed.
+
+        :param timeout_sec: time the messages are given to finish
+        :return: the drain report
+        """
+        start = time.monotonic()
+        handled = self.__succeeded + self.__failed
+        abandoned = []
+        if self.__slots is not None:
+            abandoned = await finish_tasks(self.__tasks, timeout_sec)
+            self.__slots = None
+            await self._close(wait=not abandoned)
+        return DrainReport(
+            completed=not abandoned,
+            elapsed_sec=time.monotonic() - start,
+            handled=self.__succeeded + self.__failed - handled,
+            published=0,
+            dropped=0,
+            abandoned=abandoned,
+            pending_publishes=0,
+        )
+
+    async def __call__(self, message: ReceivedMessage):
+        """Dispatch a message to the workers
+
+        Returns once the message is dispatched, not once it is processed.
+
+        :param message: the received message
+        """
+        if self.__slots is None:
+            raise RuntimeError("Dispatcher is not started")
+        slots = self.__slots
+        await slots.acquire()
+        self.__inflight += 1
+        task = asyncio.get_running_loop().create_task(self.__process(message, slots))
+        self.__tasks[task] = [message]
+        task.add_done_callback(self.__forget)
+
+    def get_stats(self) -> DispatchStats:
+        """Fetch the current state of the dispatcher
+
+        :return: the dispatcher statistics
+        """
+        return DispatchStats(**self._common_stats())
+
+    def _common_stats(self) -> Dict[str, object]:
+        """The `DispatchStats` fields, for the statistics of derived classes"""
+        return {
+            "inflight": self.__inflight,
+            "max_msg_inflight": self.max_msg_inflight,
+            "dispatched": self.__dispatched,
+            "succeeded": self.__succeeded,
+            "failed": self.__failed,
+            "ack_failures": self.__ack_failures,
+            "processing_time_sec": self.__processing_time_sec,
+        }
+
+    @abc.abstractmethod
+    def _open(self):
+        """Start the workers; implemented by derived classes"""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def _close(self, wait: bool):
+        """Stop the workers; implemented by derived classes
+
+        :param wait: whether to wait for the workers to finish their current work
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def _execute(self, message: ReceivedMessage):
+        """Run the handler for a message in a worker; implemented by derived classes
+
+        Exceptions raised by the handler are propagated.
+        """
+        raise NotImplementedError()
+
+    def __forget(self, task: asyncio.Task):
+        """Stop tracking a completed message task"""
+        self.__tasks.pop(task, None)
+
+    async def __process(self, message: ReceivedMessage, slots: asyncio.Semaphore):
+        """Run the handler for a message, then ACK the message"""
+        try:
+            if await self.__run(message):
+                try:
+                    await self.data_client.send_ack_simple(message, self.context.copy())
+                except Exception:  # pylint: disable=broad-except
+                    self.__ack_failures += 1
+                    LOG.exception(
+                        "Failed to ACK message %d of %s/%s",
+                        message.stream_seq,
+                        message.stream,
+                        message.consumer,
+                    )
+        finally:
+            self.__inflight -= 1
+            slots.release()
+
+    async def __run(self, message: ReceivedMessage) -> bool:
+        """Run the handler for a message
+
+        :return: whether the handler completed
+        """
+        start = time.perf_counter()
+        self.__dispatched += 1
+        try:
+            await self._execute(message)
+            self.__succeeded += 1
+            return True
+        except Exception:  # pylint: disable=broad-except
+            self.__failed += 1
+            LOG.exception(
+                "Handler failed for message %d of %s/%s",
+                message.stream_seq,
+                message.stream,
+                message.consumer,
+            )
+            return False
+        finally:
+            self.__processing_time_sec += time.perf_counter() - start
+
+
+class ProcessPoolDispatcher(Dispatcher):
+    """
+    Runs a message handler in a pool of worker processes, and ACKs messages it completes
+
+    The subscription loop stays in the calling process, while CPU-bound handlers run in a
+    `ProcessPoolExecutor`. See `Dispatcher`.
+
+    Payloads of at least `shm_threshold` bytes are copied once into a
+    `multiprocessing.shared_memory` block, which the worker process maps, instead of being
+    pickled through the pool's pipe. `shared_memory` requires Python 3.8; on older versions,
+    all payloads are pickled.
+
+    The handler is called with a `DispatchedMessage`, and must be picklable (i.e. a module
+    level function).
+    """
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        handler: DispatchHandler,
+        max_msg_inflight: int = 16,
+        workers: Optional[int] = None,
+        shm_threshold: int = 2**16,
+        mp_context=None,
+        context: Optional[RequestContext] = None,
+    ):
+        """Constructor
+
+        :param data_client: client used to ACK the messages
+        :param handler: the message handler, run in the worker processes
+        :param max_msg_inflight: max number of messages processed at once
+        :param workers: number of worker processes; defaults to the number of CPUs
+        :param shm_threshold: min payload size handed over through shared memory
+        :param mp_context: multiprocessing context of the worker processes
+        :param context: template for the context of the ACK requests
+        """
+        super().__init__(
+            data_client=data_client, max_msg_inflight=max_msg_inflight, context=context
+        )
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            shared_memory = None
+        self.handler = handler
+        self.workers = workers
+        self.shm_threshold = shm_threshold if shared_memory is not None else None
+        self.mp_context = mp_context
+        self.__shared_memory = shared_memory
+        self.__pool: Optional[ProcessPoolExecutor] = None
+        self.__shm_messages = 0
+
+    def get_stats(self) -> ProcessPoolStats:
+        """Fetch the current state of the dispatcher
+
+        :return: the dispatcher statistics
+        """
+        return ProcessPoolStats(
+            shared_memory=self.__shm_messages, **self._common_stats()
+        )
+
+    def _open(self):
+        """Start the worker processes"""
+        self.__pool = self.__new_pool()
+
+    async def _close(self, wait: bool):
+        """Stop the worker processes"""
+        pool = self.__pool
+        self.__pool = None
+        if wait:
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+        else:
+            pool.shutdown(wait=False)
+
+    def __new_pool(self) -> ProcessPoolExecutor:
+        """Create the worker process pool"""
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=self.mp_context)
+
+    async def _execute(self, message: ReceivedMessage):
+        """Run the handler for a message in a worker process"""
+        metadata = (
+            message.stream,
+            message.stream_seq,
+            message.consumer,
+            message.consumer_seq,
+            message.subject,
+            message.headers,
+        )
+        payload = message.message_view
+        size = len(payload) if payload is not None else 0
+        block = None
+        pool = self.__pool
+        try:
+            if self.shm_threshold is not None and size >= self.shm_threshold:
+                block = self.__shared_memory.SharedMemory(create=True, size=size)
+                block.buf[:size] = payload
+                self.__shm_messages += 1
+                args = (self.handler, metadata, None, block.name, size)
+            else:
+                args = (self.handler, metadata, bytes(payload or b""), None, size)
+            await asyncio.get_running_loop().run_in_executor(pool, _run_handler, *args)
+        except BrokenProcessPool:
+            LOG.error("Worker process pool broke, replacing it")
+            if self.__pool is pool:
+                self.__pool = self.__new_pool()
+            raise
+        finally:
+            if block is not None:
+                block.close()
+                block.unlink()
+
+
+class ThreadPoolDispatcher(Dispatcher):
+    """
+    Runs a blocking message handler in a bounded thread pool, and ACKs messages it
+    completes
+
+    For handlers calling blocking libraries (i.e. database drivers), which would freeze the
+    event loop if called on it. The handler is called with the `ReceivedMessage` in a
+    worker thread; its result or exception is passed back to the event loop, where the
+    message is ACKed. See `Dispatcher`.
+
+    The statistics report the number of messages waiting for a free thread, and the share
+    of the pool's thread time spent in the handler.
+    """
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        handler: Callable[[ReceivedMessage], object],
+        max_msg_inflight: int = 16,
+        workers: Optional[int] = None,
+        context: Optional[RequestContext] = None,
+    ):
+        """Constructor
+
+        :param data_client: client used to ACK the messages
+        :param handler: the blocking message handler, run in the worker threads
+        :param max_msg_inflight: max number of messages processed at once
+        :param workers: number of worker threads; defaults to the number of CPUs plus 4,
+            at most 32
+        :param context: template for the context of the ACK requests
+        """
+        super().__init__(
+            data_client=data_client, max_msg_inflight=max_msg_inflight, context=context
+        )
+        self.handler = handler
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.__pool: Optional[ThreadPoolExecutor] = None
+        # Updated from the worker threads
+        self.__lock = threading.Lock()
+        self.__queued = 0
+        self.__busy = 0
+        self.__busy_time_sec = 0.0
+        self.__started_at = 0.0
+
+    def get_stats(self) -> ThreadPoolStats:
+        """Fetch the current state of the dispatcher
+
+        :return: the dispatcher statistics
+        """
+        with self.__lock:
+            queued = self.__queued
+            busy = self.__busy
+            busy_time_sec = self.__busy_time_sec
+        elapsed = time.perf_counter() - self.__started_at
+        return ThreadPoolStats(
+            workers=self.workers,
+            queued=queued,
+            busy=busy,
+            busy_time_sec=busy_time_sec,
+            utilization=(
+                min(1.0, busy_time_sec / (elapsed * self.workers))
+                if self.__started_at and elapsed > 0
+                else 0.0
+            ),
+            **self._common_stats(),
+        )
+
+    def _open(self):
+        """Start the worker threads"""
+        self.__pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="httpmq-handler"
+        )
+        self.__started_at = time.perf_counter()
+
+    async def _close(self, wait: bool):
+        """Stop the worker threads"""
+        pool = self.__pool
+        self.__pool = None
+        if wait:
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+        else:
+            pool.shutdown(wait=False)
+
+    async def _execute(self, message: ReceivedMessage):
+        """Run the handler for a message in a worker thread"""
+        with self.__lock:
+            self.__queued += 1
+        await asyncio.get_running_loop().run_in_executor(
+            self.__pool, self.__call_handler, message
+        )
+
+    def __call_handler(self, message: ReceivedMessage):
+        """Run the handler in the worker thread, tracking the thread time it takes"""
+        with self.__lock:
+            self.__queued -= 1
+            self.__busy += 1
+        start = time.perf_counter()
+        try:
+            return self.handler(message)
+        finally:
+            with self.__lock:
+                self.__busy -= 1
+                self.__busy_time_sec += time.perf_counter() - start
@@ -0,0 +1,118 @@
+"""Graceful drain of subscriptions, message handlers, and publishers"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Tuple
+from httpmq.dataplane import ReceivedMessage
+
+LOG = logging.getLogger("httpmq-sdk.general")
+
+# (stream, consumer, stream sequence number) of a message
+MessageRef = Tuple[str, str, int]
+
+
+class DrainReport:
+    """Outcome of draining a component"""
+
+    def __init__(
+        self,
+        completed: bool,
+        elapsed_sec: float,
+        handled: int,
+        published: int,
+        dropped: int,
+        abandoned: List[MessageRef],
+        pending_publishes: int,
+    ):
+        """Constructor
+
+        :param completed: whether all work finished within the deadline
+        :param elapsed_sec: time the drain took
+        :param handled: number of received messages which finished processing during the
+            drain, whether they succeeded or not
+        :param published: number of queued messages published during the drain
+        :param dropped: number of queued messages dropped during the drain, as httpmq
+            rejected them
+        :param abandoned: received messages whose processing was cancelled at the
+            deadline. They may not be ACKed, in which case httpmq redelivers them.
+        :param pending_publishes: number of messages left queued for publishing
+        """
+        self.completed = completed
+        self.elapsed_sec = elapsed_sec
+        self.handled = handled
+        self.published = published
+        self.dropped = dropped
+        self.abandoned = abandoned
+        self.pending_publishes = pending_publishes
+
+
+def message_ref(message: ReceivedMessage) -> MessageRef:
+    """Identify a received message in a drain report
+
+    :param message: the message
+    :return: its stream, consumer, and stream sequence number
+    """
+    return (message.stream, message.consumer, message.stream_seq)
+
+
+async def finish_tasks(
+    tasks: Dict[asyncio.Task, List[ReceivedMessage]], timeout_sec: float
+) -> List[MessageRef]:
+    """Wait for tasks processing messages, cancelling those still running at the deadline
+
+    :param tasks: the tasks, each with the messages it processes
+    :param timeout_sec: time the tasks are given to finish
+    :return: the messages of the cancelled tasks
+    """
+    if not tasks:
+        return []
+    tasks = dict(tasks)
+    _, pending = await asyncio.wait(list(tasks), timeout=max(0.0, timeout_sec))
+    # Read the messages before cancelling, as the tasks may update their lists on exit
+    abandoned = [message_ref(message) for task in pending for message in tasks[task]]
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return abandoned
+
+
+async def drain_all(components: Iterable[object], timeout_sec: float) -> DrainReport:
+    """Drain components one after the other, within one deadline
+
+    Each component provides `async drain(timeout_sec) -> DrainReport`. List the components
+    in the order messages flow through them, the sources first: i.e. the
+    `SubscriptionManager` (which stops reading), then the dispatchers or batchers its
+    handlers feed, then the `Outbox` they publish through. Each component is given the
+    time left until the deadline.
+
+    :param components: the components to drain, in order
+    :param timeout_sec: time the whole drain is given
+    :return: the combined report
+    """
+    start = time.monotonic()
+    deadline = start + timeout_sec
+    reports = []
+    for component in components:
+        reports.append(await component.drain(max(0.0, deadline - time.monotonic())))
+    report = DrainReport(
+        completed=all(one.completed for one in reports),
+        elapsed_sec=time.monotonic() - start,
+        handled=sum(one.handled for one in reports),
+        published=sum(one.published for one in reports),
+        dropped=sum(one.dropped for one in reports),
+        abandoned=[ref for one in reports for ref in one.abandoned],
+        pending_publishes=sum(one.pending_publishes for one in reports),
+    )
+    if not report.completed:
+        LOG.warning(
+            "Drain incomplete after %.2f sec: %d messages abandoned, %d publishes pending",
+            report.elapsed_sec,
+            len(report.abandoned),
+            report.pending_publishes,
+        )
+    return report
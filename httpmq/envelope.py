@@ -0,0 +1,137 @@
+"""Message envelope carrying client-side headers along with a message"""
+
+import binascii
+import struct
+from typing import Dict, Optional, Tuple, Union
+from httpmq.payload import BufferLike, as_byte_view
+
+# Start of every marker the SDK places in front of a message: the envelope, a chunk, or
+# a compressed message, told apart by the byte which follows. 0xC1 never occurs in UTF-8
+# text, so plain text and JSON messages are never mistaken for a marked one.
+MARKER_PREFIX = b"\xc1H"
+
+# Marks an enveloped message
+ENVELOPE_MAGIC = MARKER_PREFIX + b"Q"
+ENVELOPE_VERSION = 1
+
+# Header holding the client generated message ID
+MESSAGE_ID_HEADER = "message-id"
+
+# magic | version (u8) | header block length (u16)
+_PREFIX = struct.Struct(f"<{len(ENVELOPE_MAGIC)}sBH")
+# One header entry: key length (u8) | key | value length (u16) | value
+_KEY_LEN = struct.Struct("<B")
+_VALUE_LEN = struct.Struct("<H")
+
+MAX_HEADER_BLOCK_LEN = 2**16 - 1
+
+Headers = Dict[str, str]
+
+
+def encode_headers(headers: Headers) -> bytes:
+    """Build the envelope placed in front of a message
+
+    The header block is zero-padded so the envelope length is a multiple of 3. The Base64
+    encoding of an enveloped message is then the concatenation of the encodings of the
+    envelope and of the message, so the two can be encoded separately.
+
+    :param headers: the message headers
+    :return: the envelope
+    """
+    block = bytearray()
+    for key, value in headers.items():
+        encoded_key = key.encode("utf-8")
+        encoded_value = value.encode("utf-8")
+        if not encoded_key or len(encoded_key) > 255 or len(encoded_value) >= 2**16:
+            raise ValueError(f"Unsupported message header '{key}'")
+        block += _KEY_LEN.pack(len(encoded_key))
+        block += encoded_key
+        block += _VALUE_LEN.pack(len(encoded_value))
+        block += encoded_value
+    # A zero key length marks the end of the headers
+    block += bytes(-(_PREFIX.size + len(block)) % 3 or 3)
+    if len(block) > MAX_HEADER_BLOCK_LEN:
+        raise ValueError("Message headers are too large")
+    return _PREFIX.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, len(block)) + block
+
+
+def wrap(message: BufferLike, headers: Headers) -> bytes:
+    """Place a message in an envelope
+
+    :param message: the message
+    :param headers: the message headers
+    :return: the enveloped message
+    """
+    return encode_headers(headers) + as_byte_view(message)
+
+
+def _parse_headers(data: BufferLike) -> Tuple[Optional[Headers], int]:
+    """Parse the envelope in front of a message
+
+    :return: the headers, and the offset of the message. (None, 0) if not enveloped.
+    """
+    view = data if isinstance(data, (bytes, bytearray)) else as_byte_view(data)
+    if len(view) < _PREFIX.size or view[0] != ENVELOPE_MAGIC[0]:
+        return None, 0
+    magic, version, block_len = _PREFIX.unpack_from(view)
+    body_start = _PREFIX.size + block_len
+    if magic != ENVELOPE_MAGIC or version != ENVELOPE_VERSION or len(view) < body_start:
+        return None, 0
+    headers = {}
+    offset = _PREFIX.size
+    try:
+        while True:
+            if offset >= body_start:
+                return None, 0
+            key_len = view[offset]
+            if key_len == 0:
+                break
+            key = str(view[offset + 1 : offset + 1 + key_len], "utf-8")
+            offset += 1 + key_len
+            (value_len,) = _VALUE_LEN.unpack_from(view, offset)
+            offset += _VALUE_LEN.size
+            if offset + value_len > body_start:
+                return None, 0
+            headers[key] = str(view[offset : offset + value_len], "utf-8")
+            offset += value_len
+    except (IndexError, struct.error, UnicodeDecodeError):
+        return None, 0
+    return headers, body_start
+
+
+def unwrap(data: bytes) -> Tuple[Optional[Headers], Union[bytes, memoryview]]:
+    """Take a message out of its envelope
+
+    Messages which are not enveloped are returned as is. For enveloped messages, a view of
+    the message within `data` is returned, so the message is not copied.
+
+    :param data: the possibly enveloped message
+    :return: the headers (None if not enveloped), and the message
+    """
+    headers, body_start = _parse_headers(data)
+    if headers is None:
+        return None, data
+    return headers, memoryview(data)[body_start:]
+
+
+def peek_headers(b64_data: Union[str, BufferLike]) -> Optional[Headers]:
+    """Read the headers of a Base64 encoded message without decoding all of it
+
+    :param b64_data: the Base64 encoded, possibly enveloped message
+    :return: the headers, or None if the message is not enveloped
+    """
+    if not isinstance(b64_data, str):
+        b64_data = as_byte_view(b64_data)
+    try:
+        prefix = binascii.a2b_base64(b64_data[: -(-_PREFIX.size // 3) * 4])
+        if len(prefix) < _PREFIX.size:
+            return None
+        magic, _, block_len = _PREFIX.unpack_from(prefix)
+        if magic != ENVELOPE_MAGIC:
+            return None
+        # The envelope length is a multiple of 3, so it decodes from whole Base64 blocks
+        envelope_len = _PREFIX.size + block_len
+        prefix = binascii.a2b_base64(b64_data[: envelope_len // 3 * 4])
+    except binascii.Error:
+        return None
+    return _parse_headers(prefix)[0]
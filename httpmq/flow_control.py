@@ -0,0 +1,303 @@
+"""Adaptive flow control of the inflight messages of push subscriptions"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+
+import asyncio
+from collections import OrderedDict, deque
+import logging
+import math
+import time
+from typing import Deque, List, Optional, Tuple
+from httpmq.dataplane import ReceivedMessage
+
+LOG = logging.getLogger("httpmq-sdk.dataplane")
+
+
+class FlowControlStats:
+    """Snapshot of the state of an AdaptiveInflight controller"""
+
+    def __init__(
+        self,
+        window: int,
+        inflight: int,
+        connection_window: Optional[int],
+        increases: int,
+        decreases: int,
+        ack_failures: int,
+        timeouts: int,
+        redeliveries: int,
+        latency_sec: float,
+        throttled_sec: float,
+        history: List[Tuple[float, int]],
+    ):
+        """Constructor
+
+        :param window: the current window, the max number of messages being handled
+        :param inflight: number of messages forwarded and not yet ACKed
+        :param connection_window: the `max_msg_inflight` requested for the current
+            connection, if connected
+        :param increases: number of window increases
+        :param decreases: number of window decreases
+        :param ack_failures: number of failed ACKs
+        :param timeouts: number of messages not ACKed within `ack_wait_sec`
+        :param redeliveries: number of messages delivered again before they were ACKed
+        :param latency_sec: moving average of the time from forwarding to ACK
+        :param throttled_sec: total time the subscription waited for the window to open
+        :param history: (UNIX timestamp, window) of the recent window changes
+        """
+        self.window = window
+        self.inflight = inflight
+        self.connection_window = connection_window
+        self.increases = increases
+        self.decreases = decreases
+        self.ack_failures = ack_failures
+        self.timeouts = timeouts
+        self.redeliveries = redeliveries
+        self.latency_sec = latency_sec
+        self.throttled_sec = throttled_sec
+        self.history = history
+
+
+class AdaptiveInflight:
+    """
+    AIMD controller of the number of messages a push subscription has inflight
+
+    The controller is given to a `ResilientSubscription`, which waits for the window to
+    open before forwarding each message, and reports back every ACK sent through its
+    `DataClient`. The time from forwarding to ACK is the message latency.
+
+    Each ACK within `target_latency_sec` widens the window by `increase / window`, so the
+    window grows by about `increase` per window's worth of ACKs. A slow or failed ACK, a
+    message not ACKed within `ack_wait_sec`, or a message redelivered before it was ACKed,
+    shrinks the window by `decrease_factor`; at most once per window's worth of messages,
+    since they all observed the same congestion.
+
+    The window throttles the subscription locally. httpmq keeps delivering up to the
+    `max_msg_inflight` of the connection, and messages held back locally still age
+    towards the consumer `ack_wait`; so when the window drifts too far from the
+    `max_msg_inflight` of the connection (see `connection_window`), the subscription
+    reconnects with a new one, at most every `min_reconnect_interval_sec`.
+
+    The `max_msg_inflight` of a connection counts the chunks of chunked messages, which
+    are reassembled only once all their chunks are inflight (see `httpmq.chunking`). So
+    it never goes below `min_connection_window`, which should be set to the largest chunk
+    count of the received messages (i.e. the `max_chunk_count` of the publishers).
+    """
+
+    def __init__(
+        self,
+        min_window: int = 1,
+        max_window: int = 256,
+        initial_window: int = 16,
+        target_latency_sec: float = 1.0,
+        ack_wait_sec: float = 30.0,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        headroom: float = 1.5,
+        min_reconnect_interval_sec: float = 30.0,
+        history_size: int = 256,
+        min_connection_window: int = 1,
+    ):
+        """Constructor
+
+        :param min_window: the min window
+        :param max_window: the max window
+        :param initial_window: the window to start from
+        :param target_latency_sec: the max latency of a message considered healthy
+        :param ack_wait_sec: the `ack_wait` of the consumer. Messages not ACKed by then
+            count as failed, as httpmq redelivers them.
+        :param increase: the window growth per window's worth of healthy ACKs
+        :param decrease_factor: the factor applied to the window on congestion
+        :param headroom: ratio of the connection `max_msg_inflight` over the window, so the
+            window can grow before a reconnect is needed
+        :param min_reconnect_interval_sec: min time between reconnects changing the
+            connection `max_msg_inflight`
+        :param history_size: number of window changes kept in the statistics
+        :param min_connection_window: the min connection `max_msg_inflight`, whatever the
+            window
+        """
+        if not 1 <= min_window <= initial_window <= max_window:
+            raise ValueError("Expected 1 <= min_window <= initial_window <= max_window")
+        if min_connection_window < 1:
+            raise ValueError("Expected 1 <= min_connection_window")
+        self.min_window = min_window
+        self.max_window = max_window
+        self.target_latency_sec = target_latency_sec
+        self.ack_wait_sec = ack_wait_sec
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.headroom = headroom
+        self.min_reconnect_interval_sec = min_reconnect_interval_sec
+        self.min_connection_window = min_connection_window
+        self.__window = float(initial_window)
+        # (stream seq, consumer seq) of the ACK completing a message -> forward time
+        self.__pending: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+        self.__pending_streams = set()
+        self.__opened: Optional[asyncio.Event] = None
+        self.__since_decrease = max_window
+        self.__connection_window: Optional[int] = None
+        self.__connected_at = 0.0
+        self.__increases = 0
+        self.__decreases = 0
+        self.__ack_failures = 0
+        self.__timeouts = 0
+        self.__redeliveries = 0
+        self.__latency_sec = 0.0
+        self.__throttled_sec = 0.0
+        self.__history: Deque[Tuple[float, int]] = deque(
+            [(time.time(), initial_window)], maxlen=history_size
+        )
+
+    @property
+    def window(self) -> int:
+        """The current window"""
+        return int(self.__window)
+
+    def get_stats(self) -> FlowControlStats:
+        """Fetch the current state of the controller
+
+        :return: the controller statistics
+        """
+        return FlowControlStats(
+            window=self.window,
+            inflight=len(self.__pending),
+            connection_window=self.__connection_window,
+            increases=self.__increases,
+            decreases=self.__decreases,
+            ack_failures=self.__ack_failures,
+            timeouts=self.__timeouts,
+            redeliveries=self.__redeliveries,
+            latency_sec=self.__latency_sec,
+            throttled_sec=self.__throttled_sec,
+            history=list(self.__history),
+        )
+
+    def connection_window(self) -> int:
+        """The `max_msg_inflight` to request for a new connection"""
+        return max(
+            self.min_connection_window,
+            min(self.max_window, math.ceil(self.window * self.headroom)),
+        )
+
+    def on_connect(self, connection_window: int):
+        """Record a new connection
+
+        :param connection_window: the `max_msg_inflight` of the connection
+        """
+        self.__connection_window = connection_window
+        self.__connected_at = time.monotonic()
+
+    def on_disconnect(self):
+        """Record the connection ending
+
+        Messages not ACKed yet may still be ACKed, so they remain inflight.
+        """
+        self.__connection_window = None
+
+    def needs_reconnect(self) -> bool:
+        """Whether the connection `max_msg_inflight` is too far from the window
+
+        :return: whether to reconnect with `connection_window()`
+        """
+        if self.__connection_window is None:
+            return False
+        if time.monotonic() - self.__connected_at < self.min_reconnect_interval_sec:
+            return False
+        wanted = self.connection_window()
+        return (
+            wanted > self.__connection_window or wanted * 2 <= self.__connection_window
+        )
+
+    async def acquire(self, message: ReceivedMessage):
+        """Wait for the window to open, then track a message until it is ACKed
+
+        :param message: the message about to be forwarded
+        """
+        if self.__opened is None:
+            self.__opened = asyncio.Event()
+        self.__expire()
+        if message.stream_seq in self.__pending_streams:
+            # httpmq gave up waiting for the ACK of the earlier delivery
+            self.__redeliveries += 1
+            self.__on_congestion("redelivery")
+            for key in [key for key in self.__pending if key[0] == message.stream_seq]:
+                del self.__pending[key]
+        if len(self.__pending) >= self.window:
+            start = time.monotonic()
+            while len(self.__pending) >= self.window:
+                self.__opened.clear()
+                try:
+                    await asyncio.wait_for(self.__opened.wait(), self.ack_wait_sec)
+                except asyncio.TimeoutError:
+                    self.__expire()
+            self.__throttled_sec += time.monotonic() - start
+        key = (
+            message.chunks[-1]
+            if message.chunks
+            else (message.stream_seq, message.consumer_seq)
+        )
+        self.__pending[key] = time.monotonic()
+        self.__pending_streams.add(message.stream_seq)
+
+    def on_ack(self, stream_seq: int, consumer_seq: int, success: bool):
+        """Record an ACK sent for a message
+
+        Meant as an observer of `DataClient.send_ack`; ACKs of untracked messages are
+        ignored.
+
+        :param stream_seq: the message sequence number within the stream
+        :param consumer_seq: the message sequence number for the consumer
+        :param success: whether the ACK succeeded
+        """
+        forwarded_at = self.__pending.pop((stream_seq, consumer_seq), None)
+        if forwarded_at is None:
+            return
+        self.__pending_streams.discard(stream_seq)
+        latency_sec = time.monotonic() - forwarded_at
+        self.__latency_sec += (latency_sec - self.__latency_sec) * 0.1
+        self.__since_decrease += 1
+        if not success:
+            self.__ack_failures += 1
+            self.__on_congestion("failed ACK")
+        elif latency_sec > self.target_latency_sec:
+            self.__on_congestion(f"latency {latency_sec:.3f} sec")
+        elif self.__window < self.max_window:
+            self.__set_window(
+                min(self.max_window, self.__window + self.increase / self.__window)
+            )
+            self.__increases += 1
+        if self.__opened is not None and len(self.__pending) < self.window:
+            self.__opened.set()
+
+    def __expire(self):
+        """Drop the messages httpmq considers unACKed by now"""
+        deadline = time.monotonic() - self.ack_wait_sec
+        expired = False
+        while self.__pending:
+            key, forwarded_at = next(iter(self.__pending.items()))
+            if forwarded_at > deadline:
+                break
+            del self.__pending[key]
+            self.__pending_streams.discard(key[0])
+            self.__timeouts += 1
+            expired = True
+        if expired:
+            self.__on_congestion("ACK wait exceeded")
+
+    def __on_congestion(self, reason: str):
+        """Shrink the window, unless it shrank within the last window's worth of messages"""
+        if self.__since_decrease < self.window:
+            return
+        self.__since_decrease = 0
+        self.__decreases += 1
+        self.__set_window(max(self.min_window, self.__window * self.decrease_factor))
+        LOG.debug("Inflight window reduced to %d: %s", self.window, reason)
+
+    def __set_window(self, window: float):
+        """Change the window, recording changes of its integer value"""
+        changed = int(window) != self.window
+        self.__window = window
+        if changed:
+            self.__history.append((time.time(), self.window))
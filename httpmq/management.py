@@ -1,11 +1,11 @@
 """Wrapper object for operating the httpmq management API"""
 
 from http import HTTPStatus
-import json
 import logging
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from httpmq import client
+from httpmq.codec import JSONCodec, default_json_codec
 from httpmq.common import HttpmqAPIError, RequestContext
 from httpmq.models import (
     ApisAPIRestReqStreamSubjects,
@@ -53,12 +53,16 @@ class ManagementClient:
         base = ManagementClient.__consumer_base_path(stream_name)
         return f"{base}/{consumer_name}"
 
-    def __init__(self, api_client: client.APIClient):
+    def __init__(
+        self, api_client: client.APIClient, json_codec: Optional[JSONCodec] = None
+    ):
         """Constructor
 
         :param api_client: base client object for interacting with httpmq
+        :param json_codec: JSON codec for the API payloads. Defaults to `default_json_codec()`.
         """
         self.client = api_client
+        self.codec = json_codec if json_codec is not None else default_json_codec()
 
     async def disconnect(self):
         """Disconnect from the server"""
@@ -77,7 +81,7 @@ class ManagementClient:
                 message="management API is not ready",
             )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
 
@@ -94,12 +98,12 @@ class ManagementClient:
         :return: request ID in the response
         """
         # Serialize the request payload
-        payload = json.dumps(params.to_dict()).encode("utf-8")
+        payload = self.codec.dumps(params.to_dict())
         resp = await self.client.post(
             path=ManagementClient.PATH_STREAM, context=context, body=payload
         )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
@@ -114,7 +118,7 @@ class ManagementClient:
         """
         resp = await self.client.get(path=ManagementClient.PATH_STREAM, context=context)
         # Process the response body
-        parsed = ApisAPIRestRespAllJetStreams.from_dict(json.loads(resp.content))
+        parsed = ApisAPIRestRespAllJetStreams.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.streams, parsed.request_id
@@ -133,7 +137,7 @@ class ManagementClient:
             context=context,
         )
         # Process the response body
-        parsed = ApisAPIRestRespOneJetStream.from_dict(json.loads(resp.content))
+        parsed = ApisAPIRestRespOneJetStream.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.stream, parsed.request_id
@@ -148,14 +152,14 @@ class ManagementClient:
         :return: request ID in the response
         """
         request = ApisAPIRestReqStreamSubjects(subjects=new_subjects)
-        payload = json.dumps(request.to_dict()).encode("utf-8")
+        payload = self.codec.dumps(request.to_dict())
         resp = await self.client.put(
             path=ManagementClient.__one_stream_related_paths(stream)["subject"],
             context=context,
             body=payload,
         )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
@@ -170,14 +174,14 @@ class ManagementClient:
         :param context: the caller context
         :return: request ID in the response
         """
-        payload = json.dumps(limits.to_dict()).encode("utf-8")
+        payload = self.codec.dumps(limits.to_dict())
         resp = await self.client.put(
             path=ManagementClient.__one_stream_related_paths(stream)["limit"],
             context=context,
             body=payload,
         )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
@@ -194,7 +198,7 @@ class ManagementClient:
             context=context,
         )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
@@ -215,14 +219,14 @@ class ManagementClient:
         :param context: the caller context
         :return: request ID in the response
         """
-        payload = json.dumps(params.to_dict()).encode("utf-8")
+        payload = self.codec.dumps(params.to_dict())
         resp = await self.client.post(
             path=ManagementClient.__consumer_base_path(stream),
             context=context,
             body=payload,
         )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
@@ -243,7 +247,7 @@ class ManagementClient:
         )
         # Process the response body
         parsed = ApisAPIRestRespAllJetStreamConsumers.from_dict(
-            json.loads(resp.content)
+            self.codec.loads(resp.content)
         )
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
@@ -266,7 +270,9 @@ class ManagementClient:
             context=context,
         )
         # Process the response body
-        parsed = ApisAPIRestRespOneJetStreamConsumer.from_dict(json.loads(resp.content))
+        parsed = ApisAPIRestRespOneJetStreamConsumer.from_dict(
+            self.codec.loads(resp.content)
+        )
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.consumer, parsed.request_id
@@ -288,7 +294,7 @@ class ManagementClient:
             context=context,
         )
         # Process the response body
-        parsed = GoutilsRestAPIBaseResponse.from_dict(json.loads(resp.content))
+        parsed = GoutilsRestAPIBaseResponse.from_dict(self.codec.loads(resp.content))
         if not parsed.success:
             raise HttpmqAPIError.from_rest_base_api_response(parsed)
         return parsed.request_id
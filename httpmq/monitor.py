@@ -0,0 +1,170 @@
+"""Event loop responsiveness monitoring"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+import logging
+from typing import Dict, Optional
+
+LOG = logging.getLogger("httpmq-sdk.general")
+
+
+class LoopLagStats:
+    """Snapshot of the event loop scheduling lag measured by a LoopLagMonitor"""
+
+    def __init__(
+        self,
+        samples: int,
+        p50_sec: float,
+        p90_sec: float,
+        p99_sec: float,
+        max_sec: float,
+        spikes: int,
+        spikes_by_handler: Dict[str, int],
+    ):
+        """Constructor
+
+        :param samples: number of lag samples the percentiles are computed from
+        :param p50_sec: median scheduling lag in seconds
+        :param p90_sec: 90th percentile scheduling lag in seconds
+        :param p99_sec: 99th percentile scheduling lag in seconds
+        :param max_sec: max scheduling lag in seconds within the sample window
+        :param spikes: total number of lag spikes observed since the monitor started
+        :param spikes_by_handler: number of lag spikes attributed to each handler label
+        """
+        self.samples = samples
+        self.p50_sec = p50_sec
+        self.p90_sec = p90_sec
+        self.p99_sec = p99_sec
+        self.max_sec = max_sec
+        self.spikes = spikes
+        self.spikes_by_handler = spikes_by_handler
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop schedules a periodic wake-up.
+
+    A task sleeps for `interval_sec` at a time; the difference between the actual and the
+    expected wake-up time is the scheduling lag. Anything running on the loop without
+    yielding (i.e. a CPU-heavy message handler) shows up as lag.
+
+    Code running message handlers wraps them with `track_handler`, so when a lag spike is
+    observed the monitor can report which handlers ran during the stalled interval.
+    """
+
+    def __init__(
+        self,
+        interval_sec: float = 0.1,
+        spike_threshold_sec: float = 0.1,
+        window_size: int = 1024,
+        log_spikes: bool = True,
+    ):
+        """Constructor
+
+        :param interval_sec: the interval between loop lag measurements
+        :param spike_threshold_sec: lag above this value is treated as a spike
+        :param window_size: number of most recent samples used to compute percentiles
+        :param log_spikes: whether to log a warning naming the suspect handlers on a spike
+        """
+        self.interval_sec = interval_sec
+        self.spike_threshold_sec = spike_threshold_sec
+        self.log_spikes = log_spikes
+        self.__samples = deque(maxlen=window_size)
+        self.__spikes = 0
+        self.__spikes_by_handler: Dict[str, int] = {}
+        # Handlers which are currently executing
+        self.__active_handlers: Dict[str, int] = {}
+        # Handlers which started since the last measurement
+        self.__recent_handlers = set()
+        self.__runner: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the monitor is currently measuring"""
+        return self.__runner is not None and not self.__runner.done()
+
+    def start(self):
+        """Start measuring on the currently running event loop. No-op if already running."""
+        if self.running:
+            return
+        self.__runner = asyncio.get_running_loop().create_task(self.__measure_loop())
+
+    async def stop(self):
+        """Stop measuring"""
+        if self.__runner is None:
+            return
+        self.__runner.cancel()
+        try:
+            await self.__runner
+        except asyncio.CancelledError:
+            pass
+        self.__runner = None
+
+    @contextmanager
+    def track_handler(self, label: str):
+        """Context manager marking that the handler `label` is running
+
+        :param label: name of the handler, i.e. the subscription it serves
+        """
+        self.__active_handlers[label] = self.__active_handlers.get(label, 0) + 1
+        self.__recent_handlers.add(label)
+        try:
+            yield
+        finally:
+            remaining = self.__active_handlers[label] - 1
+            if remaining > 0:
+                self.__active_handlers[label] = remaining
+            else:
+                del self.__active_handlers[label]
+
+    def get_stats(self) -> LoopLagStats:
+        """Compute statistics over the current sample window
+
+        :return: the lag statistics
+        """
+        ordered = sorted(self.__samples)
+
+        def percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+        return LoopLagStats(
+            samples=len(ordered),
+            p50_sec=percentile(0.5),
+            p90_sec=percentile(0.9),
+            p99_sec=percentile(0.99),
+            max_sec=ordered[-1] if ordered else 0.0,
+            spikes=self.__spikes,
+            spikes_by_handler=dict(self.__spikes_by_handler),
+        )
+
+    def __record_sample(self, lag: float):
+        """Record one lag measurement, and attribute it to handlers if it is a spike"""
+        self.__samples.append(lag)
+        suspects = self.__recent_handlers.union(self.__active_handlers)
+        self.__recent_handlers = set()
+        if lag < self.spike_threshold_sec:
+            return
+        self.__spikes += 1
+        for label in suspects:
+            self.__spikes_by_handler[label] = self.__spikes_by_handler.get(label, 0) + 1
+        if self.log_spikes:
+            LOG.warning(
+                "Event loop lagged %.1f ms; handlers running during the interval: %s",
+                lag * 1e3,
+                ", ".join(sorted(suspects)) if suspects else "<none>",
+            )
+
+    async def __measure_loop(self):
+        """Measurement loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_sec
+            await asyncio.sleep(self.interval_sec)
+            self.__record_sample(max(0.0, loop.time() - expected))
@@ -0,0 +1,629 @@
+"""Durable store-and-forward outbox for publishing through dataplane outages"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+import aiohttp
+from httpmq.common import HttpmqAPIError
+from httpmq.dataplane import DataClient
+from httpmq.drain import DrainReport
+from httpmq.payload import BufferLike, as_byte_view
+
+LOG = logging.getLogger("httpmq-sdk.general")
+
+FSYNC_ALWAYS = "always"
+FSYNC_INTERVAL = "interval"
+FSYNC_NEVER = "never"
+
+
+class LogRecord:
+    """One message read back from a SegmentedLog"""
+
+    __slots__ = ("subject", "message", "enqueued_at", "position")
+
+    def __init__(
+        self,
+        subject: str,
+        message: bytes,
+        enqueued_at: float,
+        position: Tuple[int, int],
+    ):
+        """Constructor
+
+        :param subject: the subject to publish under
+        :param message: the message
+        :param enqueued_at: UNIX timestamp of when the message was appended
+        :param position: log position directly after this record
+        """
+        self.subject = subject
+        self.message = message
+        self.enqueued_at = enqueued_at
+        self.position = position
+
+
+class SegmentedLog:
+    """
+    Append-only message log stored as a sequence of memory-mapped segment files
+
+    Each record is framed as
+
+        body length (u32) | CRC32 of body (u32) | enqueue time (f64) | subject length (u16)
+        | subject | message
+
+    Segment files are preallocated to `segment_size` bytes, and a new segment is started
+    when a record does not fit the current one. A small cursor file records how far the
+    log has been consumed; segments are deleted once fully consumed.
+
+    On open, the log is scanned from the cursor. The scan stops at the first zero-length
+    or corrupted record of a segment, so a record torn by a crash is discarded.
+
+    The log is not thread-safe, except that `flush` may run in a worker thread. Once
+    closed, the log cannot be appended to.
+    """
+
+    HEADER = struct.Struct("<IIdH")
+    CURSOR = struct.Struct("<QQ")
+    SEGMENT_SUFFIX = ".seg"
+
+    class Segment:
+        """One memory-mapped segment file"""
+
+        def __init__(self, path: str, index: int, size: Optional[int] = None):
+            """Constructor
+
+            :param path: path of the segment file
+            :param index: position of the segment within the log
+            :param size: if set, create the segment file with this size. The file must
+                not already exist.
+            """
+            self.path = path
+            self.index = index
+            if size is not None:
+                with open(path, "xb") as file_obj:
+                    file_obj.truncate(size)
+            self.size = os.path.getsize(path)
+            with open(path, "r+b") as file_obj:
+                self.mmap = mmap.mmap(file_obj.fileno(), self.size)
+            # End of the valid records within the segment
+            self.write_offset = 0
+
+        def close(self):
+            """Close the memory mapping"""
+            self.mmap.close()
+
+    def __init__(self, directory: str, segment_size: int = 64 * 2**20):
+        """Constructor
+
+        :param directory: directory holding the log files. Created if missing.
+        :param segment_size: size of each segment file in bytes
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        os.makedirs(directory, exist_ok=True)
+        self.__segments: Dict[int, SegmentedLog.Segment] = {}
+        self.__read_pos = (0, 0)
+        self.__pending_records = 0
+        self.__pending_bytes = 0
+        # Segment index -> start of the range written since the last flush
+        self.__dirty: Dict[int, int] = {}
+        self.__cursor_dirty = False
+        self.__closed = False
+        # Protects the dirty ranges and the write offsets, as `flush` reads them in
+        # another thread
+        self.__lock = threading.Lock()
+        # Protects the memory mappings while they are flushed in another thread
+        self.__mapping_lock = threading.Lock()
+        cursor_path = os.path.join(directory, "cursor")
+        if not os.path.exists(cursor_path):
+            with open(cursor_path, "wb") as file_obj:
+                file_obj.write(SegmentedLog.CURSOR.pack(0, 0))
+        self.__cursor_fd = os.open(cursor_path, os.O_RDWR)
+        self.__recover()
+
+    def __segment_path(self, index: int) -> str:
+        """Compute the path of a segment file"""
+        return os.path.join(
+            self.directory, f"{index:016d}{SegmentedLog.SEGMENT_SUFFIX}"
+        )
+
+    def __recover(self):
+        """Open the existing segments and find the pending records"""
+        self.__read_pos = SegmentedLog.CURSOR.unpack(
+            os.pread(self.__cursor_fd, SegmentedLog.CURSOR.size, 0)
+        )
+        indexes = sorted(
+            int(name[: -len(SegmentedLog.SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SegmentedLog.SEGMENT_SUFFIX)
+        )
+        for index in indexes:
+            if index < self.__read_pos[0]:
+                # Already consumed
+                os.unlink(self.__segment_path(index))
+                continue
+            segment = SegmentedLog.Segment(path=self.__segment_path(index), index=index)
+            self.__segments[index] = segment
+            offset = self.__read_pos[1] if index == self.__read_pos[0] else 0
+            while True:
+                record = self.__parse(segment, offset)
+                if record is None:
+                    break
+                self.__pending_records += 1
+                self.__pending_bytes += len(record.message)
+                offset = record.position[1]
+            segment.write_offset = offset
+            if offset < segment.size and any(
+                segment.mmap[offset : offset + SegmentedLog.HEADER.size]
+            ):
+                LOG.warning(
+                    "Discarding corrupted outbox records in %s from offset %d",
+                    segment.path,
+                    offset,
+                )
+        if self.__segments:
+            first = min(self.__segments)
+            if first != self.__read_pos[0]:
+                self.__read_pos = (first, 0)
+        else:
+            self.__read_pos = (self.__read_pos[0], 0)
+
+    def __parse(self, segment: Segment, offset: int) -> Optional[LogRecord]:
+        """Parse the record at an offset of a segment
+
+        :return: the record, or None if there is no valid record at the offset
+        """
+        if offset + SegmentedLog.HEADER.size > segment.size:
+            return None
+        body_len, crc, enqueued_at, subject_len = SegmentedLog.HEADER.unpack_from(
+            segment.mmap, offset
+        )
+        start = offset + SegmentedLog.HEADER.size
+        end = start + body_len
+        if body_len == 0 or subject_len > body_len or end > segment.size:
+            return None
+        subject = segment.mmap[start : start + subject_len]
+        message = segment.mmap[start + subject_len : end]
+        if zlib.crc32(message, zlib.crc32(subject)) != crc:
+            return None
+        return LogRecord(
+            subject=subject.decode("utf-8"),
+            message=message,
+            enqueued_at=enqueued_at,
+            position=(segment.index, end),
+        )
+
+    @property
+    def depth(self) -> int:
+        """Number of records not yet consumed"""
+        return self.__pending_records
+
+    @property
+    def pending_bytes(self) -> int:
+        """Total size of the messages not yet consumed"""
+        return self.__pending_bytes
+
+    @property
+    def segment_count(self) -> int:
+        """Number of segment files in use"""
+        return len(self.__segments)
+
+    def append(
+        self, subject: str, message: BufferLike, enqueued_at: Optional[float] = None
+    ):
+        """Append a record to the log
+
+        :param subject: the subject to publish under
+        :param message: the message
+        :param enqueued_at: UNIX timestamp of the append. Defaults to now.
+        """
+        if self.__closed:
+            raise RuntimeError("Log is closed")
+        subject_bytes = subject.encode("utf-8")
+        message = as_byte_view(message)
+        body_len = len(subject_bytes) + len(message)
+        record_len = SegmentedLog.HEADER.size + body_len
+        segment = self.__segments.get(max(self.__segments, default=-1))
+        if segment is None or segment.write_offset + record_len > segment.size:
+            segment = self.__new_segment(
+                index=segment.index + 1 if segment is not None else self.__read_pos[0],
+                size=max(self.segment_size, record_len),
+            )
+        start = segment.write_offset + SegmentedLog.HEADER.size
+        segment.mmap[start : start + len(subject_bytes)] = subject_bytes
+        segment.mmap[start + len(subject_bytes) : start + body_len] = message
+        SegmentedLog.HEADER.pack_into(
+            segment.mmap,
+            segment.write_offset,
+            body_len,
+            zlib.crc32(segment.mmap[start : start + body_len]),
+            enqueued_at if enqueued_at is not None else time.time(),
+            len(subject_bytes),
+        )
+        with self.__lock:
+            self.__dirty.setdefault(segment.index, segment.write_offset)
+            segment.write_offset += record_len
+        self.__pending_records += 1
+        self.__pending_bytes += len(message)
+
+    def __new_segment(self, index: int, size: int) -> Segment:
+        """Start a new segment"""
+        segment = SegmentedLog.Segment(
+            path=self.__segment_path(index), index=index, size=size
+        )
+        self.__segments[index] = segment
+        return segment
+
+    def read(self, max_records: int) -> List[LogRecord]:
+        """Read the oldest unconsumed records, without consuming them
+
+        :param max_records: max number of records to read
+        :return: the records, oldest first
+        """
+        records = []
+        index, offset = self.__read_pos
+        while len(records) < max_records and index in self.__segments:
+            segment = self.__segments[index]
+            if offset >= segment.write_offset:
+                index, offset = index + 1, 0
+                continue
+            record = self.__parse(segment, offset)
+            records.append(record)
+            offset = record.position[1]
+        return records
+
+    def oldest_enqueued_at(self) -> Optional[float]:
+        """Fetch the enqueue time of the oldest unconsumed record
+
+        Only the header of the record is read.
+
+        :return: the UNIX timestamp, or None if every record is consumed
+        """
+        index, offset = self.__read_pos
+        while index in self.__segments:
+            segment = self.__segments[index]
+            if offset < segment.write_offset:
+                _, _, enqueued_at, _ = SegmentedLog.HEADER.unpack_from(
+                    segment.mmap, offset
+                )
+                return enqueued_at
+            index, offset = index + 1, 0
+        return None
+
+    def commit(self, records: List[LogRecord]):
+        """Mark records returned by `read` as consumed
+
+        :param records: the consumed records, oldest first
+        """
+        if not records:
+            return
+        self.__pending_records -= len(records)
+        self.__pending_bytes -= sum(len(record.message) for record in records)
+        self.__read_pos = records[-1].position
+        # Delete the fully consumed segments, except the one being written
+        index, offset = self.__read_pos
+        while min(self.__segments) != max(self.__segments):
+            segment = self.__segments[min(self.__segments)]
+            if segment.index == index and offset < segment.write_offset:
+                break
+            with self.__mapping_lock, self.__lock:
+                segment.close()
+                self.__dirty.pop(segment.index, None)
+                del self.__segments[segment.index]
+            os.unlink(segment.path)
+            if segment.index == index:
+                index, offset = index + 1, 0
+        self.__read_pos = (index, offset)
+        os.pwrite(self.__cursor_fd, SegmentedLog.CURSOR.pack(*self.__read_pos), 0)
+        with self.__lock:
+            self.__cursor_dirty = True
+
+    def flush(self):
+        """Write the appended records and the cursor to disk
+
+        May be called from a worker thread.
+        """
+        with self.__mapping_lock:
+            # Records appended from here on are left to the next flush
+            with self.__lock:
+                ranges = [
+                    (self.__segments[index], start, self.__segments[index].write_offset)
+                    for index, start in self.__dirty.items()
+                ]
+                self.__dirty.clear()
+                cursor_dirty = self.__cursor_dirty
+                self.__cursor_dirty = False
+            for segment, start, end in ranges:
+                # The flushed range must start on a page boundary
+                start -= start % mmap.PAGESIZE
+                segment.mmap.flush(start, end - start)
+            if cursor_dirty:
+                os.fsync(self.__cursor_fd)
+
+    def close(self):
+        """Flush and close the log"""
+        if self.__closed:
+            return
+        self.__closed = True
+        self.flush()
+        with self.__mapping_lock, self.__lock:
+            for segment in self.__segments.values():
+                segment.close()
+            self.__segments = {}
+        os.close(self.__cursor_fd)
+
+
+class OutboxStats:
+    """Snapshot of the state of an Outbox"""
+
+    def __init__(
+        self,
+        depth: int,
+        pending_bytes: int,
+        oldest_age_sec: float,
+        segments: int,
+        enqueued: int,
+        delivered: int,
+        dropped: int,
+        failed_attempts: int,
+    ):
+        """Constructor
+
+        :param depth: number of messages waiting to be delivered
+        :param pending_bytes: total size of the messages waiting to be delivered
+        :param oldest_age_sec: time the oldest waiting message has been waiting for
+        :param segments: number of log segment files in use
+        :param enqueued: number of messages enqueued since the outbox was opened
+        :param delivered: number of messages delivered since the outbox was opened
+        :param dropped: number of messages dropped because httpmq rejected them
+        :param failed_attempts: number of failed delivery attempts
+        """
+        self.depth = depth
+        self.pending_bytes = pending_bytes
+        self.oldest_age_sec = oldest_age_sec
+        self.segments = segments
+        self.enqueued = enqueued
+        self.delivered = delivered
+        self.dropped = dropped
+        self.failed_attempts = failed_attempts
+
+
+class Outbox:
+    """
+    Durable store-and-forward outbox for publishing messages
+
+    `publish` appends the message to a local SegmentedLog and returns. A background task
+    reads the log in order, in batches of up to `batch_size` records, and publishes them
+    through the DataClient. While httpmq is unreachable or unavailable, delivery is retried
+    with exponential backoff, and messages keep accumulating on disk.
+
+    Durability of the log is controlled by `fsync_policy`
+      * "always": every publish waits for the message to be flushed to disk
+      * "interval": the log is flushed every `fsync_interval_sec`
+      * "never": flushing is left to the operating system
+
+    Delivery is at-least-once: a message published right before a crash may be delivered
+    again once the outbox is reopened.
+
+    `stop` and `drain` close the log; the outbox can then no longer be published to, and
+    its remaining messages are delivered by a new Outbox opened on the same directory.
+    """
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        directory: str,
+        segment_size: int = 64 * 2**20,
+        fsync_policy: str = FSYNC_INTERVAL,
+        fsync_interval_sec: float = 1.0,
+        batch_size: int = 64,
+        retry_interval_sec: float = 0.5,
+        max_retry_interval_sec: float = 30.0,
+    ):
+        """Constructor
+
+        :param data_client: client used to deliver the messages
+        :param directory: directory holding the log files
+        :param segment_size: size of each log segment file in bytes
+        :param fsync_policy: one of "always", "interval", or "never"
+        :param fsync_interval_sec: flush interval when `fsync_policy` is "interval"
+        :param batch_size: max number of records read from the log at a time. The log
+            position is persisted once per batch.
+        :param retry_interval_sec: initial wait before retrying a failed delivery
+        :param max_retry_interval_sec: max wait before retrying a failed delivery
+        """
+        if fsync_policy not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy '{fsync_policy}'")
+        self.data_client = data_client
+        self.fsync_policy = fsync_policy
+        self.fsync_interval_sec = fsync_interval_sec
+        self.batch_size = batch_size
+        self.retry_interval_sec = retry_interval_sec
+        self.max_retry_interval_sec = max_retry_interval_sec
+        self.__log = SegmentedLog(directory=directory, segment_size=segment_size)
+        self.__publishers: Dict[str, DataClient.Publisher] = {}
+        self.__new_data: Optional[asyncio.Event] = None
+        self.__drained: Optional[asyncio.Event] = None
+        self.__tasks: List[asyncio.Task] = []
+        self.__closed = False
+        self.__enqueued = 0
+        self.__delivered = 0
+        self.__dropped = 0
+        self.__failed_attempts = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the outbox is currently delivering messages"""
+        return bool(self.__tasks)
+
+    def start(self):
+        """Start delivering messages on the currently running event loop"""
+        if self.__closed:
+            raise RuntimeError("Outbox is closed")
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        self.__new_data = asyncio.Event()
+        self.__drained = asyncio.Event()
+        self.__update_drained()
+        self.__tasks.append(loop.create_task(self.__drain_loop()))
+        if self.fsync_policy == FSYNC_INTERVAL:
+            self.__tasks.append(loop.create_task(self.__flush_loop()))
+
+    async def stop(self):
+        """Stop delivering messages, and close the log
+
+        Messages not yet delivered remain in the log. The outbox can no longer be used.
+        """
+        self.__closed = True
+        for task in self.__tasks:
+            task.cancel()
+        for task in self.__tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.__tasks = []
+        await asyncio.get_running_loop().run_in_executor(None, self.__log.close)
+
+    async def drain(self, timeout_sec: float) -> DrainReport:
+        """Deliver the enqueued messages within a deadline, then stop
+
+        Messages not delivered by the deadline remain in the log, and are delivered once
+        the outbox is reopened.
+
+        :param timeout_sec: time the delivery is given
+        :return: the drain report
+        """
+        start = time.monotonic()
+        delivered = self.__delivered
+        dropped = self.__dropped
+        if self.running:
+            try:
+                await asyncio.wait_for(self.wait_drained(), timeout=timeout_sec)
+            except asyncio.TimeoutError:
+                pass
+        await self.stop()
+        return DrainReport(
+            completed=self.__log.depth == 0,
+            elapsed_sec=time.monotonic() - start,
+            handled=0,
+            published=self.__delivered - delivered,
+            dropped=self.__dropped - dropped,
+            abandoned=[],
+            pending_publishes=self.__log.depth,
+        )
+
+    async def publish(self, subject: str, message: BufferLike):
+        """Enqueue a message for delivery under a subject
+
+        :param subject: the subject to publish under
+        :param message: the message to publish
+        """
+        if self.__closed:
+            raise RuntimeError("Outbox is closed")
+        self.__log.append(subject=subject, message=message)
+        self.__enqueued += 1
+        if self.__new_data is not None:
+            self.__new_data.set()
+            self.__drained.clear()
+        if self.fsync_policy == FSYNC_ALWAYS:
+            await asyncio.get_running_loop().run_in_executor(None, self.__log.flush)
+
+    async def wait_drained(self):
+        """Wait until every enqueued message has been delivered"""
+        await self.__drained.wait()
+
+    def get_stats(self) -> OutboxStats:
+        """Fetch the current state of the outbox
+
+        :return: the outbox statistics
+        """
+        oldest = self.__log.oldest_enqueued_at()
+        return OutboxStats(
+            depth=self.__log.depth,
+            pending_bytes=self.__log.pending_bytes,
+            oldest_age_sec=max(0.0, time.time() - oldest) if oldest else 0.0,
+            segments=self.__log.segment_count,
+            enqueued=self.__enqueued,
+            delivered=self.__delivered,
+            dropped=self.__dropped,
+            failed_attempts=self.__failed_attempts,
+        )
+
+    def __update_drained(self):
+        """Signal waiters once every message is delivered"""
+        if self.__log.depth == 0:
+            self.__drained.set()
+
+    def __publisher(self, subject: str) -> DataClient.Publisher:
+        """Fetch the publisher for a subject"""
+        publisher = self.__publishers.get(subject)
+        if publisher is None:
+            publisher = self.data_client.publisher(subject)
+            self.__publishers[subject] = publisher
+        return publisher
+
+    async def __flush_loop(self):
+        """Periodically flush the log to disk"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.fsync_interval_sec)
+            await loop.run_in_executor(None, self.__log.flush)
+
+    async def __drain_loop(self):
+        """Deliver the logged messages in order"""
+        while True:
+            records = self.__log.read(self.batch_size)
+            if not records:
+                self.__new_data.clear()
+                await self.__new_data.wait()
+                continue
+            delivered = []
+            try:
+                for record in records:
+                    await self.__deliver(record)
+                    delivered.append(record)
+            finally:
+                # Persist the progress, even if stopped part way through a batch
+                self.__log.commit(delivered)
+                self.__update_drained()
+
+    async def __deliver(self, record: LogRecord):
+        """Deliver one message, retrying until httpmq accepts or rejects it"""
+        retry_interval = self.retry_interval_sec
+        while True:
+            try:
+                await self.__publisher(record.subject).publish(record.message)
+                self.__delivered += 1
+                return
+            except HttpmqAPIError as err:
+                if not err.retriable:
+                    LOG.error("Outbox dropping message rejected by httpmq: %s", err)
+                    self.__dropped += 1
+                    return
+                failure = err
+            except (
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+                json.JSONDecodeError,
+            ) as err:
+                failure = err
+            self.__failed_attempts += 1
+            LOG.warning(
+                "Outbox delivery failed, retrying in %.2f sec: %s",
+                retry_interval,
+                failure,
+            )
+            await asyncio.sleep(retry_interval)
+            retry_interval = min(retry_interval * 2, self.max_retry_interval_sec)
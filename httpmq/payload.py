@@ -0,0 +1,142 @@
+"""Support functions for encoding message payloads"""
+
+import asyncio
+import binascii
+import itertools
+import os
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Union
+
+BufferLike = Union[bytes, bytearray, memoryview]
+StreamSource = Union[str, os.PathLike, BinaryIO, AsyncIterable[BufferLike]]
+
+# Chunk sizes used when encoding or decoding off the event loop. `binascii` holds the GIL
+# for the duration of a call, so large payloads are processed in chunks to let the event
+# loop thread run in between. The sizes are multiples of the Base64 block sizes.
+ENCODE_CHUNK_SIZE = 3 * 2**16
+DECODE_CHUNK_SIZE = 4 * 2**16
+
+
+def as_byte_view(data: BufferLike) -> memoryview:
+    """Present any buffer-protocol object as a flat, contiguous byte view
+
+    Only non-contiguous buffers are copied.
+
+    :param data: the buffer
+    :return: byte view of the buffer
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    if view.ndim != 1 or view.format != "B":
+        view = view.cast("B")
+    return view
+
+
+def b64encode_buffer(data: BufferLike) -> bytes:
+    """Base64 encode a buffer without first copying it into a `bytes` object
+
+    :param data: the buffer to encode
+    :return: the Base64 encoded buffer
+    """
+    return binascii.b2a_base64(as_byte_view(data), newline=False)
+
+
+def b64encode_buffer_chunked(
+    data: BufferLike, chunk_size: int = ENCODE_CHUNK_SIZE, prefix: bytes = b""
+) -> bytes:
+    """Base64 encode a large buffer in chunks, releasing the GIL between chunks
+
+    Intended for use in a worker thread.
+
+    :param data: the buffer to encode
+    :param chunk_size: number of bytes to encode at a time; must be a multiple of 3
+    :param prefix: already encoded bytes to place before the encoded buffer
+    :return: the Base64 encoded buffer
+    """
+    view = as_byte_view(data)
+    chunks = (
+        binascii.b2a_base64(view[offset : offset + chunk_size], newline=False)
+        for offset in range(0, len(view), chunk_size)
+    )
+    return b"".join(itertools.chain((prefix,), chunks))
+
+
+def b64decode_chunked(
+    encoded: Union[BufferLike, str], chunk_size: int = DECODE_CHUNK_SIZE
+) -> bytes:
+    """Base64 decode a large payload in chunks, releasing the GIL between chunks
+
+    Intended for use in a worker thread. The payload must not contain whitespace.
+
+    :param encoded: the Base64 encoded payload
+    :param chunk_size: number of encoded bytes to decode at a time; must be a multiple of 4
+    :return: the decoded payload
+    """
+    if not isinstance(encoded, str):
+        encoded = as_byte_view(encoded)
+    return b"".join(
+        binascii.a2b_base64(encoded[offset : offset + chunk_size])
+        for offset in range(0, len(encoded), chunk_size)
+    )
+
+
+async def iter_stream_source(
+    source: StreamSource, chunk_size: int = 4 * ENCODE_CHUNK_SIZE
+) -> AsyncIterator[BufferLike]:
+    """Read a payload source as a sequence of chunks
+
+    Files are read in the event loop's default executor.
+
+    :param source: a file path, a binary file object, or an async iterator of byte chunks
+    :param chunk_size: number of bytes to read from a file at a time
+    :return: iterator over the payload chunks
+    """
+    if isinstance(source, (str, os.PathLike)):
+        loop = asyncio.get_running_loop()
+        file_obj = await loop.run_in_executor(None, open, source, "rb")
+        try:
+            async for chunk in iter_stream_source(file_obj, chunk_size=chunk_size):
+                yield chunk
+        finally:
+            await loop.run_in_executor(None, file_obj.close)
+    elif hasattr(source, "read"):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await loop.run_in_executor(None, source.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+async def b64encode_stream(
+    chunks: AsyncIterable[BufferLike],
+) -> AsyncIterator[bytes]:
+    """Base64 encode a sequence of byte chunks
+
+    Only the 0 to 2 bytes which do not fill a complete Base64 block are carried over from
+    one chunk to the next; the concatenation of the outputs is the encoding of the
+    concatenated inputs.
+
+    :param chunks: the chunks to encode
+    :return: iterator over the encoded chunks
+    """
+    carry = b""
+    async for chunk in chunks:
+        view = as_byte_view(chunk)
+        if carry:
+            needed = min(3 - len(carry), len(view))
+            carry += view[:needed].tobytes()
+            view = view[needed:]
+            if len(carry) < 3:
+                continue
+            yield binascii.b2a_base64(carry, newline=False)
+            carry = b""
+        usable = len(view) - len(view) % 3
+        if usable:
+            yield binascii.b2a_base64(view[:usable], newline=False)
+        carry = view[usable:].tobytes()
+    if carry:
+        yield binascii.b2a_base64(carry, newline=False)
@@ -0,0 +1,200 @@
+"""Serializers converting application objects to and from message payloads"""
+
+# pylint: disable=import-outside-toplevel
+# pylint: disable=import-error
+
+import abc
+from typing import Dict, Optional, Union
+from httpmq.codec import JSONCodec, default_json_codec
+from httpmq.payload import BufferLike, as_byte_view
+
+# Message header naming the content type of a serialized message
+CONTENT_TYPE_HEADER = "content-type"
+
+
+class Serializer(abc.ABC):
+    """
+    Base class for a message serializer.
+
+    Each serializer has a unique `name`, used to select it, and a unique `content_type`,
+    which is sent in the message headers so the receiving side can pick the matching
+    serializer. When the payload is not valid, `deserialize` must raise `ValueError` (or a
+    subclass of it).
+    """
+
+    name = "undefined"
+    content_type = "application/x-undefined"
+
+    @abc.abstractmethod
+    def serialize(self, obj: object) -> BufferLike:
+        """Serialize an object into a message
+
+        :param obj: the object
+        :return: the message
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def deserialize(self, data: BufferLike) -> object:
+        """Deserialize a message into an object
+
+        :param data: the message
+        :return: the object
+        """
+        raise NotImplementedError()
+
+
+class RawSerializer(Serializer):
+    """Serializer passing byte messages through as is"""
+
+    name = "raw"
+    content_type = "application/octet-stream"
+
+    def serialize(self, obj: object) -> BufferLike:
+        """Serialize an object into a message
+
+        :param obj: any buffer-protocol object. It is not copied.
+        :return: the message
+        """
+        return as_byte_view(obj)
+
+    def deserialize(self, data: BufferLike) -> object:
+        """Deserialize a message into an object
+
+        :param data: the message
+        :return: the message as `bytes`
+        """
+        return data if isinstance(data, bytes) else bytes(data)
+
+
+class JSONSerializer(Serializer):
+    """Serializer producing UTF-8 encoded JSON documents"""
+
+    name = "json"
+    content_type = "application/json"
+
+    def __init__(self, json_codec: Optional[JSONCodec] = None):
+        """Constructor
+
+        :param json_codec: the JSON codec to use. Defaults to `default_json_codec()`.
+        """
+        self.codec = json_codec if json_codec is not None else default_json_codec()
+
+    def serialize(self, obj: object) -> BufferLike:
+        """Serialize an object into a message
+
+        :param obj: the object
+        :return: the message
+        """
+        return self.codec.dumps(obj)
+
+    def deserialize(self, data: BufferLike) -> object:
+        """Deserialize a message into an object
+
+        :param data: the message
+        :return: the object
+        """
+        return self.codec.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """Serializer built around `msgpack`"""
+
+    name = "msgpack"
+    content_type = "application/msgpack"
+
+    def __init__(self):
+        """Constructor"""
+        import msgpack
+
+        self.__packb = msgpack.packb
+        self.__unpackb = msgpack.unpackb
+
+    def serialize(self, obj: object) -> BufferLike:
+        """Serialize an object into a message
+
+        :param obj: the object
+        :return: the message
+        """
+        return self.__packb(obj, use_bin_type=True)
+
+    def deserialize(self, data: BufferLike) -> object:
+        """Deserialize a message into an object
+
+        :param data: the message
+        :return: the object
+        """
+        return self.__unpackb(data, raw=False)
+
+
+# Registered serializer types, by name and by content type. Instances are created on first
+# use, as the optional serialization libraries may not be installed.
+_SERIALIZER_TYPES = {
+    serializer.name: serializer
+    for serializer in [RawSerializer, JSONSerializer, MsgpackSerializer]
+}
+_SERIALIZERS: Dict[str, Serializer] = {}
+_BY_CONTENT_TYPE: Dict[str, Serializer] = {}
+
+
+def register_serializer(serializer: Serializer):
+    """Register a custom serializer
+
+    Registered serializers can be selected by name, and are used for received messages
+    carrying their content type. A serializer registered under an existing name or content
+    type replaces the previous one.
+
+    :param serializer: the serializer
+    """
+    _SERIALIZERS[serializer.name] = serializer
+    _BY_CONTENT_TYPE[serializer.content_type] = serializer
+
+
+def get_serializer(serializer: Union[str, Serializer]) -> Serializer:
+    """Fetch a serializer by name
+
+    :param serializer: "raw", "json", "msgpack" (if installed), the name of a registered
+        serializer, or a serializer instance, which is returned as is
+    :return: the serializer
+    """
+    if isinstance(serializer, Serializer):
+        return serializer
+    found = _SERIALIZERS.get(serializer)
+    if found is None:
+        if serializer not in _SERIALIZER_TYPES:
+            raise ValueError(f"Unknown serializer '{serializer}'")
+        # Raises ImportError if the library of the serializer is not installed
+        found = _SERIALIZER_TYPES[serializer]()
+        register_serializer(found)
+    return found
+
+
+def find_serializer(content_type: str) -> Optional[Serializer]:
+    """Fetch the serializer for a content type
+
+    :param content_type: the content type from the message headers
+    :return: the serializer, or None if no usable serializer handles the content type
+    """
+    found = _BY_CONTENT_TYPE.get(content_type)
+    if found is None:
+        for name, serializer_type in _SERIALIZER_TYPES.items():
+            if serializer_type.content_type == content_type:
+                try:
+                    found = get_serializer(name)
+                except ImportError:
+                    return None
+                break
+    return found
+
+
+def available_serializers() -> Dict[str, Serializer]:
+    """Fetch all the serializers usable in this environment
+
+    :return: the serializers, by name
+    """
+    for name in _SERIALIZER_TYPES:
+        try:
+            get_serializer(name)
+        except ImportError:
+            pass
+    return dict(_SERIALIZERS)
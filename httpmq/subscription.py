@@ -0,0 +1,878 @@
+"""Push subscriptions which survive connection failures"""
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-locals
+
+import asyncio
+from collections import OrderedDict, deque
+import functools
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+import aiohttp
+from httpmq.common import HttpmqAPIError, HttpmqIdleTimeoutError, RequestContext
+from httpmq.dataplane import DataClient, ReceivedMessage
+from httpmq.drain import DrainReport, finish_tasks
+from httpmq.flow_control import AdaptiveInflight, FlowControlStats
+
+LOG = logging.getLogger("httpmq-sdk.dataplane")
+
+
+async def _set_on_first(events: List[asyncio.Event], target: asyncio.Event):
+    """Set an event once any of several events is set"""
+    waits = [asyncio.ensure_future(event.wait()) for event in events]
+    try:
+        await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        target.set()
+    finally:
+        for wait in waits:
+            wait.cancel()
+
+
+class SubscriptionStats:
+    """Snapshot of the state of a ResilientSubscription"""
+
+    def __init__(
+        self,
+        connected: bool,
+        connects: int,
+        reconnects: int,
+        failed_attempts: int,
+        downtime_sec: float,
+        messages: int,
+        last_error: Optional[str],
+        idle_timeouts: int,
+        window_reconnects: int,
+        flow_control: Optional[FlowControlStats],
+    ):
+        """Constructor
+
+        :param connected: whether the subscription is currently connected
+        :param connects: number of times the subscription connected
+        :param reconnects: number of connection attempts after the connection was lost
+        :param failed_attempts: number of connection attempts which failed
+        :param downtime_sec: total time spent not connected while running, including the
+            ongoing outage
+        :param messages: number of messages forwarded to the callback
+        :param last_error: description of the last connection failure
+        :param idle_timeouts: number of connections dropped for being idle while the
+            dataplane was not ready
+        :param window_reconnects: number of reconnects to change `max_msg_inflight`
+        :param flow_control: state of the adaptive flow control, if used
+        """
+        self.connected = connected
+        self.connects = connects
+        self.reconnects = reconnects
+        self.failed_attempts = failed_attempts
+        self.downtime_sec = downtime_sec
+        self.messages = messages
+        self.last_error = last_error
+        self.idle_timeouts = idle_timeouts
+        self.window_reconnects = window_reconnects
+        self.flow_control = flow_control
+
+
+class ResilientSubscription:
+    """
+    Push subscription which reconnects whenever its connection ends
+
+    Runs `DataClient.push_subscribe` in a loop. When the connection fails, or the server
+    closes it, the subscription reconnects after an exponential backoff with jitter; the
+    backoff restarts from `initial_backoff_sec` once a connection is established. Errors
+    httpmq reports as not retriable (i.e. unknown stream or consumer) end the subscription.
+
+    The subscription state (see `DataClient.SubscriptionState`) is kept across connections,
+    and the caller context is never modified, so each connection starts from the same
+    settings.
+
+    With `flow_control`, the number of inflight messages adapts to the handler latency and
+    ACK outcomes (see `AdaptiveInflight`), instead of the fixed `max_msg_inflight`.
+    """
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        stream: str,
+        consumer: str,
+        subject_filter: str,
+        forward_data_cb: Callable[[ReceivedMessage], Awaitable[None]],
+        context: Optional[RequestContext] = None,
+        max_msg_inflight: Optional[int] = None,
+        delivery_group: Optional[str] = None,
+        dedup_window: Optional[int] = None,
+        loop_interval_sec: float = 0.25,
+        initial_backoff_sec: float = 0.5,
+        max_backoff_sec: float = 30.0,
+        max_failed_attempts: Optional[int] = None,
+        idle_timeout_sec: Optional[float] = 30.0,
+        flow_control: Optional[AdaptiveInflight] = None,
+    ):
+        """Constructor
+
+        :param data_client: the dataplane client
+        :param stream: target stream
+        :param consumer: consumer name
+        :param subject_filter: subscribe for message which subject matches the filter
+        :param forward_data_cb: callback function receiving the messages
+        :param context: template for the context of each connection
+        :param max_msg_inflight: the max number of inflight messages if provided
+        :param delivery_group: the delivery group the consumer belongs to if it uses one
+        :param dedup_window: if set, the number of most recent message IDs remembered for
+            dropping duplicate copies of messages (see `DataClient.push_subscribe`)
+        :param loop_interval_sec: the sleep interval between non-blocking reads
+        :param initial_backoff_sec: the wait before the first reconnect attempt
+        :param max_backoff_sec: the max wait between reconnect attempts
+        :param max_failed_attempts: if set, the subscription ends with the last error after
+            this many consecutive failed connection attempts
+        :param idle_timeout_sec: if set, an idle connection is checked for liveness after
+            this long, and replaced if found dead (see `DataClient.push_subscribe`)
+        :param flow_control: if set, controls the inflight messages in place of
+            `max_msg_inflight`. The messages must be ACKed through `data_client`.
+        """
+        self.data_client = data_client
+        self.stream = stream
+        self.consumer = consumer
+        self.subject_filter = subject_filter
+        self.forward_data_cb = forward_data_cb
+        self.context = context if context is not None else RequestContext()
+        self.max_msg_inflight = max_msg_inflight
+        self.delivery_group = delivery_group
+        self.loop_interval_sec = loop_interval_sec
+        self.initial_backoff_sec = initial_backoff_sec
+        self.max_backoff_sec = max_backoff_sec
+        self.max_failed_attempts = max_failed_attempts
+        self.idle_timeout_sec = idle_timeout_sec
+        self.flow_control = flow_control
+        self.__state = data_client.subscription_state(dedup_window=dedup_window)
+        self.__connected = False
+        self.__connects = 0
+        self.__reconnects = 0
+        self.__failed_attempts = 0
+        self.__messages = 0
+        self.__downtime_sec = 0.0
+        self.__down_since: Optional[float] = None
+        self.__last_error: Optional[str] = None
+        self.__idle_timeouts = 0
+        self.__window_reconnects = 0
+        self.__resize: Optional[asyncio.Event] = None
+
+    def get_stats(self) -> SubscriptionStats:
+        """Fetch the current state of the subscription
+
+        :return: the subscription statistics
+        """
+        downtime_sec = self.__downtime_sec
+        if self.__down_since is not None:
+            downtime_sec += time.monotonic() - self.__down_since
+        return SubscriptionStats(
+            connected=self.__connected,
+            connects=self.__connects,
+            reconnects=self.__reconnects,
+            failed_attempts=self.__failed_attempts,
+            downtime_sec=downtime_sec,
+            messages=self.__messages,
+            last_error=self.__last_error,
+            idle_timeouts=self.__idle_timeouts,
+            window_reconnects=self.__window_reconnects,
+            flow_control=(
+                self.flow_control.get_stats() if self.flow_control is not None else None
+            ),
+        )
+
+    def __on_connect(self):
+        """Record the subscription connecting"""
+        self.__connected = True
+        self.__connects += 1
+        if self.__down_since is not None:
+            self.__downtime_sec += time.monotonic() - self.__down_since
+            self.__down_since = None
+
+    def __on_disconnect(self):
+        """Record the subscription losing its connection"""
+        if self.__connected:
+            self.__connected = False
+            self.__down_since = time.monotonic()
+
+    async def __forward(self, message: ReceivedMessage):
+        """Count and forward one message"""
+        if isinstance(message, ReceivedMessage):
+            self.__messages += 1
+            if self.flow_control is not None:
+                await self.flow_control.acquire(message)
+                if self.flow_control.needs_reconnect():
+                    self.__resize.set()
+        await self.forward_data_cb(message)
+
+    def __on_ack(
+        self,
+        stream: str,
+        consumer: str,
+        stream_seq: int,
+        consumer_seq: int,
+        success: bool,
+    ):
+        """Report the ACKs of this subscription's messages to the flow control"""
+        if stream == self.stream and consumer == self.consumer:
+            self.flow_control.on_ack(stream_seq, consumer_seq, success)
+
+    async def __subscribe(self, stop_loop: asyncio.Event):
+        """Run one connection of the subscription
+
+        With flow control, the connection also ends once its `max_msg_inflight` needs to
+        change.
+        """
+        max_msg_inflight = self.max_msg_inflight
+        connection_stop = stop_loop
+        connect_cb = self.__on_connect
+        if self.flow_control is not None:
+            max_msg_inflight = self.flow_control.connection_window()
+            connect_cb = functools.partial(
+                self.__on_flow_controlled_connect, max_msg_inflight
+            )
+            self.__resize = asyncio.Event()
+            connection_stop = asyncio.Event()
+            relay = asyncio.get_running_loop().create_task(
+                _set_on_first([stop_loop, self.__resize], connection_stop)
+            )
+        try:
+            await self.data_client.push_subscribe(
+                stream=self.stream,
+                consumer=self.consumer,
+                subject_filter=self.subject_filter,
+                forward_data_cb=self.__forward,
+                context=self.context.copy(),
+                stop_loop=connection_stop,
+                max_msg_inflight=max_msg_inflight,
+                delivery_group=self.delivery_group,
+                loop_interval_sec=self.loop_interval_sec,
+                state=self.__state,
+                connect_cb=connect_cb,
+                idle_timeout_sec=self.idle_timeout_sec,
+            )
+        finally:
+            if self.flow_control is not None:
+                relay.cancel()
+                self.flow_control.on_disconnect()
+
+    def __resized(self) -> bool:
+        """Whether the connection ended to change its `max_msg_inflight`"""
+        if self.__resize is None or not self.__resize.is_set():
+            return False
+        self.__window_reconnects += 1
+        LOG.info(
+            "Push subscription %s/%s reconnecting with max_msg_inflight %d",
+            self.stream,
+            self.consumer,
+            self.flow_control.connection_window(),
+        )
+        return True
+
+    def __on_flow_controlled_connect(self, max_msg_inflight: int):
+        """Record the subscription connecting with a flow controlled window"""
+        self.__on_connect()
+        self.flow_control.on_connect(max_msg_inflight)
+
+    async def __run_connection(self, stop_loop: asyncio.Event) -> Optional[Exception]:
+        """Run one connection of the subscription, returning the failure which ended it
+
+        Failures which are not worth retrying are raised.
+        """
+        try:
+            await self.__subscribe(stop_loop)
+        except HttpmqAPIError as err:
+            if not err.retriable:
+                raise
+            return err
+        except HttpmqIdleTimeoutError as err:
+            self.__idle_timeouts += 1
+            return err
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            return err
+        return None
+
+    async def run(self, stop_loop: asyncio.Event):
+        """Run the subscription until the caller requests it to stop
+
+        :param stop_loop: signal to indicate the subscription should stop
+        """
+        attempt = 0
+        self.__down_since = time.monotonic()
+        if self.flow_control is not None:
+            self.data_client.ack_observers.append(self.__on_ack)
+        try:
+            while not stop_loop.is_set():
+                connects = self.__connects
+                failure = await self.__run_connection(stop_loop)
+                self.__on_disconnect()
+                if stop_loop.is_set():
+                    break
+                if failure is None and self.__resized():
+                    continue
+                if self.__connects > connects:
+                    # The connection was established, so this is a fresh outage
+                    attempt = 0
+                if failure is not None:
+                    self.__last_error = repr(failure)
+                    if self.__connects == connects:
+                        self.__failed_attempts += 1
+                        if (
+                            self.max_failed_attempts is not None
+                            and attempt + 1 >= self.max_failed_attempts
+                        ):
+                            raise failure
+                delay = min(
+                    self.max_backoff_sec, self.initial_backoff_sec * 2**attempt
+                ) * random.uniform(0.5, 1.5)
+                attempt += 1
+                self.__reconnects += 1
+                LOG.warning(
+                    "Push subscription %s/%s disconnected, reconnect %d in %.2f sec: %s",
+                    self.stream,
+                    self.consumer,
+                    self.__reconnects,
+                    delay,
+                    failure if failure is not None else "closed by server",
+                )
+                try:
+                    await asyncio.wait_for(stop_loop.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.flow_control is not None:
+                self.data_client.ack_observers.remove(self.__on_ack)
+            self.__on_disconnect()
+            self.__downtime_sec += time.monotonic() - self.__down_since
+            self.__down_since = None
+            self.__state.close()
+
+
+class ManagedSubscriptionStats:
+    """Snapshot of the state of one subscription of a SubscriptionManager"""
+
+    def __init__(
+        self,
+        stream: str,
+        consumer: str,
+        instances: int,
+        connected: int,
+        messages: int,
+        handler_errors: int,
+        handler_time_sec: float,
+        restarts: int,
+        reconnects: int,
+        downtime_sec: float,
+        last_error: Optional[str],
+    ):
+        """Constructor
+
+        :param stream: target stream
+        :param consumer: consumer name
+        :param instances: number of push subscription connections run for the consumer
+        :param connected: number of those connections currently connected
+        :param messages: number of messages handled
+        :param handler_errors: number of messages the handler raised an exception for
+        :param handler_time_sec: total time spent in the handler
+        :param restarts: number of times a connection was restarted after it failed
+        :param reconnects: number of reconnect attempts over all connections
+        :param downtime_sec: total time not connected, summed over all connections
+        :param last_error: description of the last failure
+        """
+        self.stream = stream
+        self.consumer = consumer
+        self.instances = instances
+        self.connected = connected
+        self.messages = messages
+        self.handler_errors = handler_errors
+        self.handler_time_sec = handler_time_sec
+        self.restarts = restarts
+        self.reconnects = reconnects
+        self.downtime_sec = downtime_sec
+        self.last_error = last_error
+
+
+class SubscriptionManagerStats:
+    """Snapshot of the state of a SubscriptionManager"""
+
+    def __init__(
+        self,
+        subscriptions: int,
+        instances: int,
+        connected: int,
+        messages: int,
+        handler_errors: int,
+        restarts: int,
+        reconnects: int,
+        active_handlers: int,
+        waiting_handlers: int,
+        per_subscription: Dict[str, ManagedSubscriptionStats],
+    ):
+        """Constructor
+
+        :param subscriptions: number of managed subscriptions
+        :param instances: number of push subscription connections run
+        :param connected: number of those connections currently connected
+        :param messages: number of messages handled
+        :param handler_errors: number of messages a handler raised an exception for
+        :param restarts: number of times a connection was restarted after it failed
+        :param reconnects: number of reconnect attempts over all connections
+        :param active_handlers: number of handlers currently running
+        :param waiting_handlers: number of messages waiting for a handler slot
+        :param per_subscription: statistics of each subscription, by key
+        """
+        self.subscriptions = subscriptions
+        self.instances = instances
+        self.connected = connected
+        self.messages = messages
+        self.handler_errors = handler_errors
+        self.restarts = restarts
+        self.reconnects = reconnects
+        self.active_handlers = active_handlers
+        self.waiting_handlers = waiting_handlers
+        self.per_subscription = per_subscription
+
+
+class SubscriptionManager:
+    """
+    Runs many push subscriptions over the shared session of one DataClient
+
+    Each subscription is identified by its "<stream>/<consumer>" key, and is run by one or
+    more `ResilientSubscription` connections; running several connections of a consumer
+    requires a delivery group. httpmq then spreads the chunks of a chunked message across
+    the connections, which can not reassemble it (see `httpmq.chunking`), so consumers
+    receiving chunked messages must be run with a single connection. A connection which
+    ends with an error, including errors not retriable by `ResilientSubscription`, is
+    restarted after a backoff.
+
+    Handlers run on the event loop, one message at a time per connection. An exception
+    raised by a handler is logged and counted; the message is not ACKed, so httpmq
+    redelivers it. With `max_concurrent_handlers`, handler slots are handed out round-robin
+    across subscriptions, so a busy subscription, or one with many connections, cannot
+    starve the others.
+
+    Every connection holds one connection of the `APIClient` pool for as long as it runs,
+    so `APIClient.max_connections` must exceed the number of connections, leaving room for
+    ACKs and publishes.
+    """
+
+    class FairScheduler:
+        """Limits the number of running handlers, serving subscriptions round-robin"""
+
+        def __init__(self, max_active: Optional[int]):
+            """Constructor
+
+            :param max_active: max number of running handlers; None for no limit
+            """
+            self.max_active = max_active
+            self.active = 0
+            self.__waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+        @property
+        def waiting(self) -> int:
+            """Number of handlers waiting for a slot"""
+            return sum(len(waiters) for waiters in self.__waiting.values())
+
+        async def acquire(self, key: str):
+            """Wait for a handler slot
+
+            :param key: the subscription the handler belongs to
+            """
+            if self.max_active is None or (
+                self.active < self.max_active and not self.__waiting
+            ):
+                self.active += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self.__waiting.setdefault(key, deque()).append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was already handed over
+                    self.release()
+                else:
+                    self.__discard(key, waiter)
+                raise
+
+        def release(self):
+            """Release a handler slot, handing it to the next subscription in turn"""
+            self.active -= 1
+            while self.__waiting and (
+                self.max_active is None or self.active < self.max_active
+            ):
+                key, waiters = self.__waiting.popitem(last=False)
+                waiter = waiters.popleft()
+                if waiters:
+                    # Move the subscription to the back of the line
+                    self.__waiting[key] = waiters
+                if not waiter.done():
+                    self.active += 1
+                    waiter.set_result(None)
+
+        def __discard(self, key: str, waiter: asyncio.Future):
+            """Remove a cancelled waiter"""
+            waiters = self.__waiting.get(key)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self.__waiting[key]
+
+    class Instance:
+        """One push subscription connection of a managed subscription"""
+
+        def __init__(
+            self, subscription: ResilientSubscription, handling: List[ReceivedMessage]
+        ):
+            """Constructor
+
+            :param subscription: the subscription connection
+            :param handling: the messages forwarded to the handler and not yet handled
+            """
+            self.subscription = subscription
+            self.handling = handling
+            self.stop = asyncio.Event()
+            self.task: Optional[asyncio.Task] = None
+
+    class Entry:
+        """A managed subscription"""
+
+        def __init__(
+            self,
+            stream: str,
+            consumer: str,
+            subject_filter: str,
+            handler: Callable[[ReceivedMessage], Awaitable[None]],
+            context: Optional[RequestContext],
+            options: Dict[str, object],
+        ):
+            """Constructor
+
+            :param stream: target stream
+            :param consumer: consumer name
+            :param subject_filter: subscribe for message which subject matches the filter
+            :param handler: the message handler
+            :param context: template for the context of each connection
+            :param options: additional `ResilientSubscription` parameters
+            """
+            self.stream = stream
+            self.consumer = consumer
+            self.subject_filter = subject_filter
+            self.handler = handler
+            self.context = context
+            self.options = options
+            self.instances: List[SubscriptionManager.Instance] = []
+            self.messages = 0
+            self.handler_errors = 0
+            self.handler_time_sec = 0.0
+            self.restarts = 0
+            # Counters of connections removed by scaling down
+            self.retired_reconnects = 0
+            self.retired_downtime_sec = 0.0
+            self.last_error: Optional[str] = None
+
+    def __init__(
+        self,
+        data_client: DataClient,
+        max_concurrent_handlers: Optional[int] = None,
+        restart_backoff_sec: float = 1.0,
+        max_restart_backoff_sec: float = 60.0,
+    ):
+        """Constructor
+
+        :param data_client: the dataplane client shared by all subscriptions
+        :param max_concurrent_handlers: if set, the max number of handlers running at a
+            time, over all subscriptions
+        :param restart_backoff_sec: the wait before restarting a failed connection. It
+            doubles on each consecutive failure of the connection, and is reset once the
+            connection connects, or runs for longer than the backoff.
+        :param max_restart_backoff_sec: the max wait before restarting a failed connection
+        """
+        self.data_client = data_client
+        self.restart_backoff_sec = restart_backoff_sec
+        self.max_restart_backoff_sec = max_restart_backoff_sec
+        self.running = False
+        self.__scheduler = SubscriptionManager.FairScheduler(max_concurrent_handlers)
+        self.__entries: Dict[str, SubscriptionManager.Entry] = {}
+
+    @property
+    def subscriptions(self) -> List[str]:
+        """Keys of the managed subscriptions"""
+        return list(self.__entries)
+
+    def add(
+        self,
+        stream: str,
+        consumer: str,
+        subject_filter: str,
+        handler: Callable[[ReceivedMessage], Awaitable[None]],
+        instances: int = 1,
+        context: Optional[RequestContext] = None,
+        **options,
+    ) -> str:
+        """Add a subscription. It starts right away if the manager is running.
+
+        :param stream: target stream
+        :param consumer: consumer name
+        :param subject_filter: subscribe for message which subject matches the filter
+        :param handler: the message handler
+        :param instances: number of push subscription connections to run
+        :param context: template for the context of each connection
+        :param options: additional `ResilientSubscription` parameters (i.e.
+            `max_msg_inflight`, `delivery_group`, `dedup_window`, `idle_timeout_sec`)
+        :return: the subscription key
+        """
+        key = f"{stream}/{consumer}"
+        if key in self.__entries:
+            raise ValueError(f"Subscription '{key}' already exists")
+        if instances > 1 and options.get("delivery_group") is None:
+            raise ValueError("Running several connections requires a delivery group")
+        entry = SubscriptionManager.Entry(
+            stream=stream,
+            consumer=consumer,
+            subject_filter=subject_filter,
+            handler=handler,
+            context=context,
+            options=options,
+        )
+        self.__entries[key] = entry
+        for _ in range(instances):
+            self.__add_instance(key, entry)
+        return key
+
+    def start(self):
+        """Start all subscriptions on the currently running event loop"""
+        if self.running:
+            return
+        self.running = True
+        for key, entry in self.__entries.items():
+            for instance in entry.instances:
+                self.__start_instance(key, entry, instance)
+
+    async def scale(self, key: str, instances: int):
+        """Change the number of push subscription connections of a subscription
+
+        :param key: the subscription key
+        :param instances: the new number of connections
+        """
+        entry = self.__entries[key]
+        if instances > 1 and entry.options.get("delivery_group") is None:
+            raise ValueError("Running several connections requires a delivery group")
+        while len(entry.instances) < instances:
+            self.__add_instance(key, entry)
+        retired = entry.instances[instances:]
+        del entry.instances[instances:]
+        await self.__stop_instances(entry, retired)
+
+    async def remove(self, key: str):
+        """Stop and remove a subscription
+
+        :param key: the subscription key
+        """
+        entry = self.__entries.pop(key)
+        await self.__stop_instances(entry, entry.instances)
+
+    async def stop(self):
+        """Stop all subscriptions. They can be started again with `start`."""
+        self.running = False
+        for entry in self.__entries.values():
+            await self.__stop_instances(entry, entry.instances, retire=False)
+
+    async def drain(self, timeout_sec: float) -> DrainReport:
+        """Stop reading, and let the handlers finish within a deadline
+
+        Every connection stops reading, and handles the messages it already received.
+        Connections still running at the deadline are cancelled; the messages in their
+        handlers are abandoned. The subscriptions can be started again with `start`.
+
+        :param timeout_sec: time the handlers are given to finish
+        :return: the drain report
+        """
+        start = time.monotonic()
+        handled = sum(entry.messages for entry in self.__entries.values())
+        self.running = False
+        tasks = {}
+        for entry in self.__entries.values():
+            for instance in entry.instances:
+                instance.stop.set()
+                if instance.task is not None:
+                    tasks[instance.task] = instance.handling
+                    instance.task = None
+        abandoned = await finish_tasks(tasks, timeout_sec)
+        return DrainReport(
+            completed=not abandoned,
+            elapsed_sec=time.monotonic() - start,
+            handled=sum(entry.messages for entry in self.__entries.values()) - handled,
+            published=0,
+            dropped=0,
+            abandoned=abandoned,
+            pending_publishes=0,
+        )
+
+    def get_stats(self) -> SubscriptionManagerStats:
+        """Fetch the current state of the subscriptions
+
+        :return: the manager statistics
+        """
+        per_subscription = {}
+        for key, entry in self.__entries.items():
+            connection_stats = [
+                instance.subscription.get_stats() for instance in entry.instances
+            ]
+            per_subscription[key] = ManagedSubscriptionStats(
+                stream=entry.stream,
+                consumer=entry.consumer,
+                instances=len(entry.instances),
+                connected=sum(stats.connected for stats in connection_stats),
+                messages=entry.messages,
+                handler_errors=entry.handler_errors,
+                handler_time_sec=entry.handler_time_sec,
+                restarts=entry.restarts,
+                reconnects=entry.retired_reconnects
+                + sum(stats.reconnects for stats in connection_stats),
+                downtime_sec=entry.retired_downtime_sec
+                + sum(stats.downtime_sec for stats in connection_stats),
+                last_error=entry.last_error,
+            )
+        subscriptions = per_subscription.values()
+        return SubscriptionManagerStats(
+            subscriptions=len(per_subscription),
+            instances=sum(stats.instances for stats in subscriptions),
+            connected=sum(stats.connected for stats in subscriptions),
+            messages=sum(stats.messages for stats in subscriptions),
+            handler_errors=sum(stats.handler_errors for stats in subscriptions),
+            restarts=sum(stats.restarts for stats in subscriptions),
+            reconnects=sum(stats.reconnects for stats in subscriptions),
+            active_handlers=self.__scheduler.active,
+            waiting_handlers=self.__scheduler.waiting,
+            per_subscription=per_subscription,
+        )
+
+    def __add_instance(self, key: str, entry: "SubscriptionManager.Entry"):
+        """Define a new connection for a subscription, and start it if running"""
+        handling = []
+        instance = SubscriptionManager.Instance(
+            ResilientSubscription(
+                data_client=self.data_client,
+                stream=entry.stream,
+                consumer=entry.consumer,
+                subject_filter=entry.subject_filter,
+                forward_data_cb=functools.partial(self.__handle, key, entry, handling),
+                context=entry.context,
+                **entry.options,
+            ),
+            handling,
+        )
+        entry.instances.append(instance)
+        total = sum(len(one.instances) for one in self.__entries.values())
+        limit = self.data_client.client.max_connections
+        if limit and total >= limit:
+            LOG.warning(
+                "%d push subscription connections leave no room in the pool of %d",
+                total,
+                limit,
+            )
+        if self.running:
+            self.__start_instance(key, entry, instance)
+
+    def __start_instance(
+        self,
+        key: str,
+        entry: "SubscriptionManager.Entry",
+        instance: "SubscriptionManager.Instance",
+    ):
+        """Start running one connection of a subscription"""
+        instance.stop.clear()
+        instance.task = asyncio.get_running_loop().create_task(
+            self.__supervise(key, entry, instance)
+        )
+
+    async def __stop_instances(
+        self,
+        entry: "SubscriptionManager.Entry",
+        instances: List["SubscriptionManager.Instance"],
+        retire: bool = True,
+    ):
+        """Stop connections of a subscription, and wait for them to end"""
+        for instance in instances:
+            instance.stop.set()
+        for instance in instances:
+            if instance.task is not None:
+                await instance.task
+                instance.task = None
+            if retire:
+                stats = instance.subscription.get_stats()
+                entry.retired_reconnects += stats.reconnects
+                entry.retired_downtime_sec += stats.downtime_sec
+
+    async def __supervise(
+        self,
+        key: str,
+        entry: "SubscriptionManager.Entry",
+        instance: "SubscriptionManager.Instance",
+    ):
+        """Run one connection of a subscription, restarting it whenever it fails"""
+        backoff_sec = self.restart_backoff_sec
+        while not instance.stop.is_set():
+            connects = instance.subscription.get_stats().connects
+            started = time.monotonic()
+            try:
+                await instance.subscription.run(instance.stop)
+                continue
+            except Exception as err:  # pylint: disable=broad-except
+                if (
+                    instance.subscription.get_stats().connects > connects
+                    or time.monotonic() - started > backoff_sec
+                ):
+                    # The connection was up, so this is not a consecutive failure
+                    backoff_sec = self.restart_backoff_sec
+                entry.restarts += 1
+                entry.last_error = repr(err)
+                LOG.error(
+                    "Subscription %s failed, restart in %.2f sec: %r",
+                    key,
+                    backoff_sec,
+                    err,
+                )
+            try:
+                await asyncio.wait_for(instance.stop.wait(), timeout=backoff_sec)
+            except asyncio.TimeoutError:
+                pass
+            backoff_sec = min(self.max_restart_backoff_sec, backoff_sec * 2)
+
+    async def __handle(
+        self,
+        key: str,
+        entry: "SubscriptionManager.Entry",
+        handling: List[ReceivedMessage],
+        message: ReceivedMessage,
+    ):
+        """Run the handler of a subscription for one message"""
+        if not isinstance(message, ReceivedMessage):
+            # Errors reported by the server end the connection, and are handled there
+            return
+        handling.append(message)
+        try:
+            await self.__scheduler.acquire(key)
+        except asyncio.CancelledError:
+            handling.remove(message)
+            raise
+        start = time.perf_counter()
+        try:
+            await entry.handler(message)
+        except Exception as err:  # pylint: disable=broad-except
+            entry.handler_errors += 1
+            entry.last_error = repr(err)
+            LOG.exception(
+                "Subscription %s handler failed on message [S:%d]",
+                key,
+                message.stream_seq,
+            )
+        finally:
+            handling.remove(message)
+            entry.handler_time_sec += time.perf_counter() - start
+            entry.messages += 1
+            self.__scheduler.release()
+        # Let the other subscriptions run between the messages of a burst
+        await asyncio.sleep(0)
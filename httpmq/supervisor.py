@@ -0,0 +1,417 @@
+"""Multi-process consumers scaling one delivery group across CPU cores"""
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-few-public-methods
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from httpmq.dataplane import DataClient, ReceivedMessage
+from httpmq.subscription import SubscriptionManager
+
+LOG = logging.getLogger("httpmq-sdk.general")
+
+ClientFactory = Callable[[], DataClient]
+HandlerFactory = Callable[[DataClient], Callable[[ReceivedMessage], Awaitable[None]]]
+
+
+class WorkerStats:
+    """Snapshot of the state of one worker process of a ConsumerSupervisor"""
+
+    def __init__(
+        self,
+        worker_id: int,
+        pid: Optional[int],
+        alive: bool,
+        restarts: int,
+        exit_code: Optional[int],
+        connected: bool,
+        messages: int,
+        handler_errors: int,
+        handler_time_sec: float,
+        reconnects: int,
+        downtime_sec: float,
+        reported_at: Optional[float],
+    ):
+        """Constructor
+
+        :param worker_id: index of the worker
+        :param pid: process ID of the current worker process
+        :param alive: whether the worker process is running
+        :param restarts: number of times the worker process was restarted
+        :param exit_code: exit code of the last worker process which ended
+        :param connected: whether the worker's subscription is connected
+        :param messages: number of messages handled, over all processes of the worker
+        :param handler_errors: number of messages the handler raised an exception for
+        :param handler_time_sec: total time spent in the handler
+        :param reconnects: number of subscription reconnect attempts
+        :param downtime_sec: total time the subscription was not connected
+        :param reported_at: time (`time.time()`) the worker last reported its metrics
+        """
+        self.worker_id = worker_id
+        self.pid = pid
+        self.alive = alive
+        self.restarts = restarts
+        self.exit_code = exit_code
+        self.connected = connected
+        self.messages = messages
+        self.handler_errors = handler_errors
+        self.handler_time_sec = handler_time_sec
+        self.reconnects = reconnects
+        self.downtime_sec = downtime_sec
+        self.reported_at = reported_at
+
+
+class SupervisorStats:
+    """Snapshot of the state of a ConsumerSupervisor"""
+
+    def __init__(
+        self,
+        workers: int,
+        alive: int,
+        connected: int,
+        restarts: int,
+        messages: int,
+        handler_errors: int,
+        reconnects: int,
+        per_worker: List[WorkerStats],
+    ):
+        """Constructor
+
+        :param workers: number of workers
+        :param alive: number of worker processes running
+        :param connected: number of workers with a connected subscription
+        :param restarts: number of worker process restarts
+        :param messages: number of messages handled by all workers
+        :param handler_errors: number of messages a handler raised an exception for
+        :param reconnects: number of subscription reconnect attempts over all workers
+        :param per_worker: statistics of each worker
+        """
+        self.workers = workers
+        self.alive = alive
+        self.connected = connected
+        self.restarts = restarts
+        self.messages = messages
+        self.handler_errors = handler_errors
+        self.reconnects = reconnects
+        self.per_worker = per_worker
+
+
+async def _run_worker(
+    worker_id: int,
+    config: Dict[str, object],
+    stop_event: multiprocessing.Event,
+    metrics: multiprocessing.Queue,
+):
+    """Run the subscription of one worker process until the supervisor stops it"""
+    data_client = config["client_factory"]()
+    manager = SubscriptionManager(
+        data_client=data_client,
+        restart_backoff_sec=config["restart_backoff_sec"],
+    )
+    key = manager.add(
+        stream=config["stream"],
+        consumer=config["consumer"],
+        subject_filter=config["subject_filter"],
+        handler=config["handler_factory"](data_client),
+        delivery_group=config["delivery_group"],
+        **config["subscription_options"],
+    )
+
+    def report():
+        """Send the worker metrics to the supervisor"""
+        stats = manager.get_stats().per_subscription[key]
+        metrics.put(
+            {
+                "worker_id": worker_id,
+                "pid": os.getpid(),
+                "connected": stats.connected > 0,
+                "messages": stats.messages,
+                "handler_errors": stats.handler_errors,
+                "handler_time_sec": stats.handler_time_sec,
+                "reconnects": stats.reconnects,
+                "downtime_sec": stats.downtime_sec,
+                "reported_at": time.time(),
+            }
+        )
+
+    manager.start()
+    try:
+        while not stop_event.is_set():
+            report()
+            await asyncio.sleep(config["metrics_interval_sec"])
+    finally:
+        await manager.stop()
+        report()
+        await data_client.disconnect()
+
+
+def _worker_main(
+    worker_id: int,
+    config: Dict[str, object],
+    stop_event: multiprocessing.Event,
+    metrics: multiprocessing.Queue,
+):
+    """Entry point of a worker process"""
+    asyncio.run(_run_worker(worker_id, config, stop_event, metrics))
+
+
+class ConsumerSupervisor:
+    """
+    Runs a consumer in several worker processes, sharing one delivery group
+
+    Each worker process runs its own event loop, `DataClient`, and push subscription, so
+    CPU-bound handlers scale across cores; httpmq spreads the messages of the consumer over
+    the subscriptions of the delivery group. This spreads the chunks of a chunked message
+    across workers as well, which can not reassemble it (see `httpmq.chunking`), so the
+    consumer must not receive chunked messages. A worker process which exits while the
+    supervisor is running is restarted, after a backoff which doubles on each consecutive
+    crash of that worker; a worker which ran for `stable_uptime_sec` before exiting is
+    restarted after the initial backoff again.
+
+    The data client and the handler are created inside each worker by the factories, which
+    must be picklable (i.e. module level functions, or `functools.partial` of them):
+    `client_factory()` returns the worker's DataClient, and `handler_factory(data_client)`
+    returns the worker's message handler. The handler is responsible for ACKing messages.
+
+    Workers report their metrics to the supervisor every `metrics_interval_sec`; see
+    `get_stats`.
+    """
+
+    class Worker:
+        """Supervisor side state of one worker"""
+
+        def __init__(self, worker_id: int):
+            """Constructor
+
+            :param worker_id: index of the worker
+            """
+            self.worker_id = worker_id
+            self.process: Optional[multiprocessing.Process] = None
+            self.restarts = 0
+            self.exit_code: Optional[int] = None
+            self.backoff_sec = 0.0
+            self.started_at: Optional[float] = None
+            self.restart_at: Optional[float] = None
+            # Metrics of the current process, and totals of the processes before it
+            self.report: Dict[str, object] = {}
+            self.previous: Dict[str, float] = {}
+
+    # Counters which accumulate across the processes of a worker
+    __COUNTERS = ["messages", "handler_errors", "handler_time_sec", "reconnects"]
+
+    def __init__(
+        self,
+        client_factory: ClientFactory,
+        handler_factory: HandlerFactory,
+        stream: str,
+        consumer: str,
+        subject_filter: str,
+        delivery_group: str,
+        workers: Optional[int] = None,
+        subscription_options: Optional[Dict[str, object]] = None,
+        start_method: str = "spawn",
+        metrics_interval_sec: float = 1.0,
+        check_interval_sec: float = 0.5,
+        restart_backoff_sec: float = 1.0,
+        max_restart_backoff_sec: float = 60.0,
+        stable_uptime_sec: float = 60.0,
+    ):
+        """Constructor
+
+        :param client_factory: creates the DataClient of a worker
+        :param handler_factory: creates the message handler of a worker from its DataClient
+        :param stream: target stream
+        :param consumer: consumer name
+        :param subject_filter: subscribe for message which subject matches the filter
+        :param delivery_group: the delivery group shared by the workers
+        :param workers: number of worker processes; defaults to the number of CPUs
+        :param subscription_options: additional `ResilientSubscription` parameters (i.e.
+            `max_msg_inflight`, `dedup_window`, `idle_timeout_sec`)
+        :param start_method: the multiprocessing start method
+        :param metrics_interval_sec: the interval between worker metric reports
+        :param check_interval_sec: the interval between worker liveness checks
+        :param restart_backoff_sec: the wait before restarting a worker process which
+            exited. It doubles on each consecutive crash of the worker.
+        :param max_restart_backoff_sec: the max wait before restarting a worker process
+        :param stable_uptime_sec: a worker process which ran for this long before exiting
+            is restarted after `restart_backoff_sec` again
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.check_interval_sec = check_interval_sec
+        self.restart_backoff_sec = restart_backoff_sec
+        self.max_restart_backoff_sec = max_restart_backoff_sec
+        self.stable_uptime_sec = stable_uptime_sec
+        self.running = False
+        self.__config = {
+            "client_factory": client_factory,
+            "handler_factory": handler_factory,
+            "stream": stream,
+            "consumer": consumer,
+            "subject_filter": subject_filter,
+            "delivery_group": delivery_group,
+            "subscription_options": dict(subscription_options or {}),
+            "metrics_interval_sec": metrics_interval_sec,
+            "restart_backoff_sec": restart_backoff_sec,
+        }
+        self.__mp = multiprocessing.get_context(start_method)
+        self.__stop_event = self.__mp.Event()
+        self.__metrics = self.__mp.Queue()
+        self.__workers = [ConsumerSupervisor.Worker(idx) for idx in range(self.workers)]
+        self.__task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the worker processes, and supervise them from the running event loop"""
+        if self.running:
+            return
+        self.running = True
+        self.__stop_event.clear()
+        for worker in self.__workers:
+            self.__start_worker(worker)
+        self.__task = asyncio.get_running_loop().create_task(self.__supervise())
+
+    async def stop(self, timeout_sec: float = 10.0):
+        """Stop the worker processes
+
+        The workers close their subscriptions and exit. Workers still running after the
+        timeout are terminated.
+
+        :param timeout_sec: time the workers are given to exit
+        """
+        if not self.running:
+            return
+        self.running = False
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__stop_event.set()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_sec
+        for worker in self.__workers:
+            if worker.process is None:
+                continue
+            await loop.run_in_executor(
+                None, worker.process.join, max(0.0, deadline - loop.time())
+            )
+            if worker.process.is_alive():
+                LOG.warning(
+                    "Worker %d (pid %d) did not exit, terminating it",
+                    worker.worker_id,
+                    worker.process.pid,
+                )
+                worker.process.terminate()
+                await loop.run_in_executor(None, worker.process.join)
+            worker.exit_code = worker.process.exitcode
+        self.__collect_metrics()
+
+    def get_stats(self) -> SupervisorStats:
+        """Fetch the current state of the workers
+
+        :return: the supervisor statistics
+        """
+        self.__collect_metrics()
+        per_worker = []
+        for worker in self.__workers:
+            report = worker.report
+            alive = worker.process is not None and worker.process.is_alive()
+            per_worker.append(
+                WorkerStats(
+                    worker_id=worker.worker_id,
+                    pid=worker.process.pid if worker.process is not None else None,
+                    alive=alive,
+                    restarts=worker.restarts,
+                    exit_code=worker.exit_code,
+                    connected=alive and bool(report.get("connected")),
+                    messages=self.__total(worker, "messages"),
+                    handler_errors=self.__total(worker, "handler_errors"),
+                    handler_time_sec=self.__total(worker, "handler_time_sec"),
+                    reconnects=self.__total(worker, "reconnects"),
+                    downtime_sec=report.get("downtime_sec", 0.0),
+                    reported_at=report.get("reported_at"),
+                )
+            )
+        return SupervisorStats(
+            workers=len(per_worker),
+            alive=sum(stats.alive for stats in per_worker),
+            connected=sum(stats.connected for stats in per_worker),
+            restarts=sum(stats.restarts for stats in per_worker),
+            messages=sum(stats.messages for stats in per_worker),
+            handler_errors=sum(stats.handler_errors for stats in per_worker),
+            reconnects=sum(stats.reconnects for stats in per_worker),
+            per_worker=per_worker,
+        )
+
+    @staticmethod
+    def __total(worker: "ConsumerSupervisor.Worker", counter: str) -> float:
+        """Value of a counter over all processes of a worker"""
+        return worker.previous.get(counter, 0) + worker.report.get(counter, 0)
+
+    def __start_worker(self, worker: "ConsumerSupervisor.Worker"):
+        """Start a new process for a worker"""
+        worker.process = self.__mp.Process(
+            target=_worker_main,
+            args=(worker.worker_id, self.__config, self.__stop_event, self.__metrics),
+            name=f"httpmq-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = asyncio.get_running_loop().time()
+        worker.restart_at = None
+        LOG.info("Started worker %d (pid %d)", worker.worker_id, worker.process.pid)
+
+    def __collect_metrics(self):
+        """Read the metrics reported by the workers
+
+        Reports of a process which already ended arrive late; its counters were carried
+        over, so those reports are dropped rather than counted twice.
+        """
+        while True:
+            try:
+                report = self.__metrics.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.__workers[report["worker_id"]]
+            if worker.process is None or report["pid"] != worker.process.pid:
+                continue
+            worker.report = report
+
+    async def __supervise(self):
+        """Restart worker processes which exited"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.check_interval_sec)
+            self.__collect_metrics()
+            for worker in self.__workers:
+                if worker.process.is_alive():
+                    continue
+                if worker.restart_at is None:
+                    worker.exit_code = worker.process.exitcode
+                    # Carry the counters of the ended process over
+                    for counter in ConsumerSupervisor.__COUNTERS:
+                        worker.previous[counter] = self.__total(worker, counter)
+                    worker.report = {}
+                    if loop.time() - worker.started_at >= self.stable_uptime_sec:
+                        worker.backoff_sec = 0.0
+                    worker.backoff_sec = (
+                        min(self.max_restart_backoff_sec, worker.backoff_sec * 2)
+                        if worker.backoff_sec
+                        else self.restart_backoff_sec
+                    )
+                    worker.restart_at = loop.time() + worker.backoff_sec
+                    LOG.error(
+                        "Worker %d (pid %d) exited with %s, restart in %.2f sec",
+                        worker.worker_id,
+                        worker.process.pid,
+                        worker.exit_code,
+                        worker.backoff_sec,
+                    )
+                elif loop.time() >= worker.restart_at:
+                    worker.restarts += 1
+                    self.__start_worker(worker)
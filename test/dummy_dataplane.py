@@ -0,0 +1,199 @@
+"""Stand-in for the httpmq dataplane API used by the unit-tests"""
+
+# pylint: disable=too-few-public-methods
+# pylint: disable=too-many-instance-attributes
+
+import asyncio
+import json
+import logging
+from typing import Dict, List
+from aiohttp import web
+from aiohttp.test_utils import AioHTTPTestCase
+import httpmq
+
+
+class DummyDataplane:
+    """
+    Minimal in-memory implementation of the httpmq dataplane API.
+
+    All published messages belong to a single stream, and are delivered to every open push
+    subscription regardless of subject filter.
+    """
+
+    class Subscriber:
+        """An open push subscription connection"""
+
+        def __init__(self, stream: str, consumer: str, params: Dict[str, str]):
+            """Constructor"""
+            self.stream = stream
+            self.consumer = consumer
+            self.params = params
+            self.queue = asyncio.Queue()
+
+    def __init__(self, stream: str = "test-stream"):
+        """Constructor
+
+        :param stream: name of the stream the published messages are placed in
+        """
+        self.log = logging.getLogger("httpmq-sdk.general")
+        self.stream = stream
+        self.available = True
+        # Number of upcoming publishes to store, but then drop the connection instead of
+        # responding to
+        self.lost_responses = 0
+        # Number of upcoming publishes to reject as bad requests
+        self.rejected_publishes = 0
+        # Number of upcoming ACKs to reject
+        self.failed_acks = 0
+        # Whether errors are answered as by a proxy in front of the dataplane, with a
+        # non-JSON body
+        self.proxy_errors = False
+        self.published: List[Dict[str, object]] = []
+        self.acks: List[Dict[str, object]] = []
+        self.subscribers: List[DummyDataplane.Subscriber] = []
+        self.consumer_seq: Dict[str, int] = {}
+
+    def routes(self) -> List[web.RouteDef]:
+        """Fetch the routes served by the dummy dataplane"""
+        return [
+            web.get("/v1/data/ready", self.ready_handler),
+            web.post("/v1/data/subject/{subject}", self.publish_handler),
+            web.get(
+                "/v1/data/stream/{stream}/consumer/{consumer}", self.subscribe_handler
+            ),
+            web.post(
+                "/v1/data/stream/{stream}/consumer/{consumer}/ack", self.ack_handler
+            ),
+        ]
+
+    def application(self) -> web.Application:
+        """Build an aiohttp application serving the dummy dataplane"""
+        app = web.Application()
+        app.router.add_routes(self.routes())
+        return app
+
+    def __response(self, request: web.Request, status: int = 200) -> web.Response:
+        """Build a standard httpmq response"""
+        if status != 200 and self.proxy_errors:
+            return web.Response(
+                status=status,
+                content_type="text/html",
+                text=f"<html><body><h1>{status}</h1></body></html>",
+            )
+        body = {
+            "request_id": request.headers.get(
+                httpmq.common.DEFAULT_REQUEST_ID_FIELD, ""
+            ),
+            "success": status == 200,
+        }
+        if status != 200:
+            body["error"] = {"code": status, "message": "dummy dataplane unavailable"}
+        return web.json_response(body, status=status)
+
+    async def ready_handler(self, request: web.Request):
+        """Handle readiness check"""
+        return self.__response(request, 200 if self.available else 503)
+
+    async def publish_handler(self, request: web.Request):
+        """Record the message, and deliver it to all subscribers"""
+        payload = await request.read()
+        if not self.available:
+            return self.__response(request, 503)
+        if self.rejected_publishes > 0:
+            self.rejected_publishes -= 1
+            return self.__response(request, 400)
+        subject = request.match_info["subject"]
+        self.published.append({"subject": subject, "b64_msg": payload.decode("ascii")})
+        stream_seq = len(self.published)
+        for subscriber in self.subscribers:
+            consumer_seq = self.consumer_seq.get(subscriber.consumer, 0) + 1
+            self.consumer_seq[subscriber.consumer] = consumer_seq
+            await subscriber.queue.put(
+                {
+                    "b64_msg": payload.decode("ascii"),
+                    "consumer": subscriber.consumer,
+                    "request_id": request.headers.get(
+                        httpmq.common.DEFAULT_REQUEST_ID_FIELD, ""
+                    ),
+                    "sequence": {"consumer": consumer_seq, "stream": stream_seq},
+                    "stream": subscriber.stream,
+                    "subject": subject,
+                    "success": True,
+                }
+            )
+        if self.lost_responses > 0:
+            self.lost_responses -= 1
+            request.transport.close()
+        return self.__response(request)
+
+    async def subscribe_handler(self, request: web.Request):
+        """Push subscription handler streaming NDJSON records"""
+        if not self.available:
+            return self.__response(request, 503)
+        subscriber = DummyDataplane.Subscriber(
+            stream=request.match_info["stream"],
+            consumer=request.match_info["consumer"],
+            params=dict(request.query),
+        )
+        self.subscribers.append(subscriber)
+        response = web.StreamResponse()
+        await response.prepare(request=request)
+        try:
+            while True:
+                record = await subscriber.queue.get()
+                if record is None:
+                    break
+                await response.write(f"{json.dumps(record)}\n".encode("utf-8"))
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.subscribers.remove(subscriber)
+        return response
+
+    async def ack_handler(self, request: web.Request):
+        """Record a message ACK"""
+        payload = json.loads(await request.read())
+        if not self.available:
+            return self.__response(request, 503)
+        if self.failed_acks > 0:
+            self.failed_acks -= 1
+            return self.__response(request, 500)
+        self.acks.append(
+            {
+                "stream": request.match_info["stream"],
+                "consumer": request.match_info["consumer"],
+                "stream_seq": payload["stream"],
+                "consumer_seq": payload["consumer"],
+            }
+        )
+        return self.__response(request)
+
+    async def close_subscriptions(self):
+        """Close all open push subscription connections from the server side"""
+        for subscriber in list(self.subscribers):
+            await subscriber.queue.put(None)
+
+
+class DummyDataplaneTestCase(AioHTTPTestCase):
+    """Base test bench running against a DummyDataplane"""
+
+    # pylint: disable=attribute-defined-outside-init
+
+    @classmethod
+    def setUpClass(cls):
+        """To be called for all test cases"""
+        httpmq.configure_sdk_logging(global_log_level=logging.DEBUG)
+
+    async def get_application(self) -> web.Application:
+        """Return custom test server"""
+        self.dataplane = DummyDataplane()
+        return self.dataplane.application()
+
+    def data_client(self, **kwargs) -> httpmq.DataClient:
+        """Define a dataplane client connected to the stand-in server"""
+        return httpmq.DataClient(
+            api_client=httpmq.APIClient(
+                base_url=f"http://{self.server.host}:{self.server.port}"
+            ),
+            **kwargs,
+        )
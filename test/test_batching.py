@@ -0,0 +1,179 @@
+"""Test bench for httpmq.batching"""
+
+import asyncio
+import base64
+import time
+import httpmq
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+class TestMessageBatcher(DummyDataplaneTestCase):
+    """Test bench for httpmq.batching.MessageBatcher"""
+
+    @staticmethod
+    def build_message(
+        seq: int, message: bytes, encoded: bool = False
+    ) -> httpmq.ReceivedMessage:
+        """Build a received message, optionally only in its Base64 encoded form"""
+        return httpmq.ReceivedMessage(
+            stream="stream",
+            stream_seq=seq,
+            consumer="c0",
+            consumer_seq=seq,
+            subject="subj.a",
+            message=None if encoded else message,
+            request_id="",
+            b64_message=base64.b64encode(message) if encoded else None,
+        )
+
+    async def test_batching(self):
+        """Verify messages are batched by count, size, and linger time"""
+
+        uut_client = self.data_client()
+        batches = []
+
+        async def handler(batch):
+            batches.append([msg.stream_seq for msg in batch])
+            # Fail every message with "bad" in it
+            return [idx for idx, msg in enumerate(batch) if b"bad" in msg.message]
+
+        uut = httpmq.MessageBatcher(
+            data_client=uut_client,
+            handler=handler,
+            max_msg_inflight=16,
+            max_batch_size=3,
+            max_batch_bytes=100,
+            linger_sec=0.1,
+        )
+        uut.start()
+
+        # Case 0: flush by count
+        for seq in range(1, 4):
+            await uut(self.build_message(seq, b"good"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(batches, [[1, 2, 3]])
+
+        # Case 1: flush by size, of messages which are not decoded for it
+        await uut(self.build_message(4, b"x" * 60, encoded=True))
+        pending = self.build_message(5, b"x" * 60, encoded=True)
+        await uut(pending)
+        self.assertIsNone(pending._message)  # pylint: disable=protected-access
+        await asyncio.sleep(0.01)
+        self.assertEqual(batches, [[1, 2, 3], [4]])
+
+        # Case 2: flush by linger time, with partial failure
+        await uut(self.build_message(6, b"bad"))
+        await asyncio.sleep(0.01)
+        self.assertEqual(uut.get_stats().pending, 2)
+        await asyncio.sleep(0.2)
+        self.assertEqual(batches, [[1, 2, 3], [4], [5, 6]])
+
+        stats = uut.get_stats()
+        self.assertEqual(stats.pending, 0)
+        self.assertEqual(stats.inflight, 0)
+        self.assertEqual(stats.batches, 3)
+        self.assertEqual(stats.messages, 6)
+        self.assertEqual(stats.succeeded, 5)
+        self.assertEqual(stats.failed, 1)
+        self.assertEqual(stats.count_flushes, 1)
+        self.assertEqual(stats.bytes_flushes, 1)
+        self.assertEqual(stats.linger_flushes, 1)
+        # The failed message is not ACKed
+        self.assertEqual(
+            sorted(ack["stream_seq"] for ack in self.dataplane.acks), [1, 2, 3, 4, 5]
+        )
+
+        await uut.stop()
+        await uut_client.disconnect()
+
+    async def test_handler_error(self):
+        """Verify no message of a batch is ACKed if the handler raises"""
+
+        uut_client = self.data_client()
+        release = asyncio.Event()
+
+        async def handler(batch):
+            await release.wait()
+            if any(msg.message == b"raise" for msg in batch):
+                raise ValueError("Failing on request")
+
+        # The batch size is bounded by the max inflight messages
+        uut = httpmq.MessageBatcher(
+            data_client=uut_client,
+            handler=handler,
+            max_msg_inflight=2,
+            max_batch_size=10,
+            linger_sec=10,
+        )
+        self.assertEqual(uut.max_batch_size, 2)
+        uut.start()
+
+        await uut(self.build_message(1, b"raise"))
+        await uut(self.build_message(2, b"ok"))
+        # No inflight slot left until the first batch completes
+        blocked = asyncio.create_task(uut(self.build_message(3, b"ok")))
+        await asyncio.sleep(0.05)
+        self.assertFalse(blocked.done())
+        self.assertEqual(uut.get_stats().inflight, 2)
+        release.set()
+        await asyncio.wait_for(blocked, 1)
+
+        # Stopping flushes the last batch
+        await uut.stop()
+        stats = uut.get_stats()
+        self.assertEqual(stats.batches, 2)
+        self.assertEqual(stats.failed, 2)
+        self.assertEqual(stats.succeeded, 1)
+        self.assertEqual([ack["stream_seq"] for ack in self.dataplane.acks], [3])
+        await uut_client.disconnect()
+
+    async def test_columnar(self):
+        """Verify batches passed to the handler in columnar form"""
+
+        uut_client = self.data_client()
+        batches = []
+
+        async def handler(batch: httpmq.ColumnarBatch):
+            batches.append(batch)
+            return [1]
+
+        uut = httpmq.MessageBatcher(
+            data_client=uut_client,
+            handler=handler,
+            max_msg_inflight=3,
+            columnar=True,
+        )
+        uut.start()
+        before = time.time()
+        for seq, (subject, message) in enumerate(
+            [("subj.a", b"hello"), ("subj.b", b""), ("subj.a", b"world!")]
+        ):
+            msg = self.build_message(seq + 1, message)
+            msg.subject = subject
+            await uut(msg)
+        await uut.stop()
+
+        self.assertEqual(len(batches), 1)
+        batch = batches[0]
+        self.assertEqual(len(batch), 3)
+        self.assertEqual((batch.stream, batch.consumer), ("stream", "c0"))
+        self.assertEqual(batch.stream_seq.tolist(), [1, 2, 3])
+        self.assertEqual(batch.consumer_seq.tolist(), [1, 2, 3])
+        self.assertEqual(batch.offsets.tolist(), [0, 5, 5, 11])
+        self.assertEqual(batch.sizes.tolist(), [5, 0, 6])
+        self.assertEqual(bytes(batch.buffer), b"helloworld!")
+        self.assertEqual(batch.payload(2), b"world!")
+        self.assertEqual(batch.subjects, ["subj.a", "subj.b"])
+        self.assertEqual(batch.subject_ids.tolist(), [0, 1, 0])
+        self.assertEqual(batch.subject(1), "subj.b")
+        for timestamp in batch.received_at:
+            self.assertGreaterEqual(timestamp, before)
+        # The columns are exposed through the buffer protocol
+        self.assertEqual(memoryview(batch.stream_seq).itemsize, 8)
+        self.assertEqual(memoryview(batch.received_at).format, "d")
+
+        # Failed messages are reported by index
+        self.assertEqual(
+            sorted(ack["stream_seq"] for ack in self.dataplane.acks), [1, 3]
+        )
+        await uut_client.disconnect()
@@ -0,0 +1,146 @@
+"""Test bench for httpmq.chunking"""
+
+# pylint: disable=too-many-locals
+
+import base64
+import os
+import random
+import time
+import unittest
+from httpmq import chunking
+
+
+class TestChunking(unittest.TestCase):
+    """Test bench for httpmq.chunking"""
+
+    def test_split(self):
+        """Verify the chunks decode into headers and slices of the message"""
+
+        for size in [0, 1, 2, 99, 100, 101, 1000]:
+            message = os.urandom(size)
+            encoded = base64.b64encode(message)
+            self.assertEqual(chunking.decoded_size(encoded), size)
+            chunks = chunking.split_encoded(encoded, max_msg_size=100)
+            self.assertEqual(len(chunks), max(1, -(-size // 54)))
+            rebuilt = b""
+            for index, chunk in enumerate(chunks):
+                decoded = base64.b64decode(chunk)
+                self.assertLessEqual(len(decoded), 100)
+                header = chunking.peek_header(chunk)
+                self.assertEqual(header, chunking.peek_header(chunk.decode("ascii")))
+                self.assertEqual(header, chunking.parse_header(decoded))
+                self.assertEqual(header.index, index)
+                self.assertEqual(header.count, len(chunks))
+                self.assertEqual(header.offset, len(rebuilt))
+                self.assertEqual(header.total_size, size)
+                rebuilt += decoded[chunking.HEADER_SIZE :]
+            self.assertEqual(rebuilt, message)
+
+        # Not chunks
+        for data in [b"", b"aGVsbG8=", base64.b64encode(b"\xc1HQ" + bytes(60))]:
+            self.assertIsNone(chunking.peek_header(data))
+            self.assertIsNone(chunking.parse_header(base64.b64decode(data)))
+        with self.assertRaises(ValueError):
+            chunking.split_encoded(b"AAAA", max_msg_size=chunking.HEADER_SIZE)
+
+        # A message needing more chunks than allowed is rejected
+        encoded = base64.b64encode(os.urandom(200))
+        self.assertEqual(
+            len(chunking.split_encoded(encoded, max_msg_size=100, max_chunks=4)), 4
+        )
+        with self.assertRaises(ValueError):
+            chunking.split_encoded(encoded, max_msg_size=100, max_chunks=3)
+
+        # The same message ID splits into the same chunks
+        encoded = base64.b64encode(os.urandom(300))
+        chunk_id = chunking.chunk_id("msg-0")
+        self.assertEqual(chunk_id, chunking.chunk_id("msg-0"))
+        self.assertNotEqual(chunk_id, chunking.chunk_id("msg-1"))
+        self.assertListEqual(
+            chunking.split_encoded(encoded, max_msg_size=100, message_id=chunk_id),
+            chunking.split_encoded(encoded, max_msg_size=100, message_id=chunk_id),
+        )
+
+    def test_reassemble(self):
+        """Verify out of order, redelivered, and spilled chunks reassemble"""
+
+        uut = chunking.Reassembler(spool_threshold=256, max_partial_messages=2)
+        messages = [os.urandom(2000), os.urandom(500)]
+        chunked = []
+        for message in messages:
+            chunks = []
+            for chunk in chunking.split_encoded(
+                base64.b64encode(message), max_msg_size=200
+            ):
+                decoded = base64.b64decode(chunk)
+                chunks.append(
+                    (chunking.parse_header(decoded), decoded[chunking.HEADER_SIZE :])
+                )
+            chunked.append(chunks)
+
+        # Interleave the two messages, out of order, with a redelivery
+        order = [(0, idx) for idx in range(len(chunked[0]))] + [
+            (1, idx) for idx in range(len(chunked[1]))
+        ]
+        random.Random(7).shuffle(order)
+        order.insert(3, order[0])
+        results = []
+        for msg_idx, chunk_idx in order:
+            header, body = chunked[msg_idx][chunk_idx]
+            result = uut.add(header, body, (msg_idx, chunk_idx))
+            if result is not None:
+                results.append(result)
+        self.assertEqual(len(results), 2)
+        for data, tags in results:
+            msg_idx = messages.index(data)
+            self.assertListEqual(
+                tags, [(msg_idx, idx) for idx in range(len(chunked[msg_idx]))]
+            )
+        self.assertEqual(uut.pending_messages, 0)
+
+        # Oldest partial message is evicted beyond the limit; its chunks are not ACKed,
+        # so they are redelivered
+        for idx, message in enumerate([os.urandom(300) for _ in range(3)]):
+            chunk = chunking.split_encoded(base64.b64encode(message), max_msg_size=200)[
+                0
+            ]
+            decoded = base64.b64decode(chunk)
+            header = chunking.parse_header(decoded)
+            self.assertIsNone(uut.add(header, decoded[chunking.HEADER_SIZE :], idx))
+        self.assertEqual(uut.pending_messages, 2)
+        self.assertListEqual(uut.take_abandoned(), [])
+        uut.close()
+        self.assertEqual(uut.pending_messages, 0)
+
+    def test_duplicate_chunks(self):
+        """Verify duplicate copies of chunks are ACKed along with their message"""
+
+        uut = chunking.Reassembler(max_partial_age_sec=0.05)
+        encoded = base64.b64encode(os.urandom(300))
+        chunks = []
+        for chunk in chunking.split_encoded(
+            encoded, max_msg_size=200, message_id=chunking.chunk_id("msg-0")
+        ):
+            decoded = base64.b64decode(chunk)
+            chunks.append(
+                (chunking.parse_header(decoded), decoded[chunking.HEADER_SIZE :])
+            )
+        self.assertEqual(len(chunks), 2)
+
+        # The first publish attempt stored chunk 0 as stream message 1, and the retry
+        # stored both chunks as stream messages 2 and 3
+        self.assertIsNone(uut.add(*chunks[0], tag=(1, 1), origin=1))
+        self.assertIsNone(uut.add(*chunks[0], tag=(2, 2), origin=2))
+        # Redelivery of stream message 2
+        self.assertIsNone(uut.add(*chunks[0], tag=(2, 4), origin=2))
+        data, tags = uut.add(*chunks[1], tag=(3, 3), origin=3)
+        self.assertEqual(data, base64.b64decode(encoded))
+        self.assertListEqual(tags, [(1, 1), (2, 4), (3, 3)])
+
+        # A message missing chunks for too long is discarded
+        self.assertIsNone(uut.add(*chunks[0], tag=(5, 5), origin=5))
+        time.sleep(0.1)
+        self.assertIsNone(uut.add(*chunks[0], tag=(6, 6), origin=6))
+        self.assertListEqual(uut.take_abandoned(), [(5, 5)])
+        self.assertEqual(uut.pending_messages, 1)
+        uut.close()
@@ -0,0 +1,62 @@
+"""Test bench for httpmq.codec"""
+
+import json
+import unittest
+import httpmq
+from httpmq.codec import JSONCodec, OrjsonCodec, StdlibJSONCodec, default_json_codec
+
+
+def available_codecs():
+    """Fetch all the JSON codecs usable in this environment"""
+    codecs = [StdlibJSONCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        pass
+    return codecs
+
+
+class TestJSONCodec(unittest.TestCase):
+    """Test bench for httpmq.codec"""
+
+    def test_round_trip(self):
+        """Verify all codecs encode and decode bytes payloads"""
+
+        test_obj = {"a": 12, "c": {"b": 1.31, "d": "hhaseé"}, "e": [True, None]}
+        for uut in available_codecs():
+            encoded = uut.dumps(test_obj)
+            self.assertIsInstance(encoded, bytes)
+            self.assertDictEqual(test_obj, json.loads(encoded))
+            self.assertDictEqual(test_obj, uut.loads(encoded))
+            self.assertDictEqual(test_obj, uut.loads(bytearray(encoded)))
+            self.assertDictEqual(test_obj, uut.loads(memoryview(encoded)))
+            self.assertDictEqual(test_obj, uut.loads(encoded.decode("utf-8")))
+            with self.assertRaises(json.JSONDecodeError):
+                uut.loads(b'{"a":')
+
+    def test_default_codec(self):
+        """Verify the default codec prefers orjson when installed"""
+
+        with self.assertRaises(TypeError):
+            JSONCodec()  # pylint: disable=abstract-class-instantiated
+        uut = default_json_codec()
+        self.assertIsInstance(uut, JSONCodec)
+        self.assertIs(uut, default_json_codec())
+        try:
+            import orjson  # pylint: disable=import-outside-toplevel,unused-import
+
+            self.assertIsInstance(uut, OrjsonCodec)
+        except ImportError:
+            self.assertIsInstance(uut, StdlibJSONCodec)
+
+    def test_message_splitter_codecs(self):
+        """Verify RxMessageSplitter with each codec, including split UTF-8 sequences"""
+
+        payload = '{"hello":"wörld"}\n'.encode("utf-8")
+        split_at = payload.index(b"\xc3") + 1
+        for codec in available_codecs():
+            uut = httpmq.DataClient.RxMessageSplitter(json_codec=codec)
+            self.assertListEqual([], uut.process_new_segment(payload[:split_at]))
+            self.assertListEqual(
+                [{"hello": "wörld"}], uut.process_new_segment(payload[split_at:])
+            )
@@ -0,0 +1,43 @@
+"""Test bench for httpmq.compression"""
+
+import unittest
+from httpmq import compression
+
+
+class TestCompression(unittest.TestCase):
+    """Test bench for httpmq.compression"""
+
+    def test_round_trip(self):
+        """Verify all available compressors mark and restore messages"""
+
+        message = b'{"field":"value","other":[1,2,3]}' * 100
+        compressors = compression.available_compressors()
+        self.assertIn("zlib", compressors)
+        for name, compressor in compressors.items():
+            self.assertEqual(compressor.name, name)
+            self.assertIs(compression.get_compressor(compressor), compressor)
+            for data in [message, bytearray(message), memoryview(message)[10:]]:
+                compressed = compression.compress(data, compressor)
+                self.assertTrue(compressed.startswith(compression.COMPRESSION_MAGIC))
+                self.assertLess(len(compressed), len(data))
+                self.assertEqual(compression.decompress(compressed), bytes(data))
+                self.assertEqual(
+                    compression.decompress(memoryview(compressed)), bytes(data)
+                )
+
+    def test_not_compressed(self):
+        """Verify incompressible messages, and messages without the marker"""
+
+        compressor = compression.get_compressor("zlib")
+        # Compressing does not help
+        self.assertIsNone(compression.compress(b"abc", compressor))
+        # Pass through
+        for message in [b"", b"hello", compression.COMPRESSION_MAGIC]:
+            self.assertIs(compression.decompress(message), message)
+
+        with self.assertRaises(ValueError):
+            compression.get_compressor("snappy")
+        with self.assertRaises(ValueError):
+            compression.decompress(compression.COMPRESSION_MAGIC + b"\xff1234")
+        with self.assertRaises(TypeError):
+            compression.Compressor()  # pylint: disable=abstract-class-instantiated
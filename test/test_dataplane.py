@@ -2,18 +2,28 @@
 
 # pylint: disable=too-many-locals
 # pylint: disable=too-many-statements
+# pylint: disable=too-many-lines
 
 import asyncio
+import base64
+import decimal
+import io
+import json
+import os
+import tempfile
 from typing import Union
 import uuid
 import aiohttp
 import httpmq
+from httpmq import compression, envelope
+from httpmq.codec import StdlibJSONCodec
 from . import (
     BaseTestCase,
     async_test,
     get_unittest_httpmq_data_api_url,
     get_unittest_httpmq_mgmt_api_url,
 )
+from .dummy_dataplane import DummyDataplaneTestCase
 
 
 class TestDataplane(BaseTestCase):
@@ -58,6 +68,141 @@ class TestDataplane(BaseTestCase):
             parsed_list = uut.process_new_segment(one_case["input"])
             self.assertListEqual(one_case["expect"], parsed_list)
 
+    def test_message_decoder(self):
+        """Basic sanity check RxMessageDecoder"""
+
+        uut = httpmq.DataClient.RxMessageDecoder()
+
+        # Case 0: successful delivery
+        msg = uut(
+            b'{"b64_msg":"aGVsbG8=","consumer":"c","request_id":"r",'
+            b'"sequence":{"consumer":2,"stream":5},"stream":"s","subject":"s.a",'
+            b'"success":true}'
+        )
+        self.assertIsInstance(msg, httpmq.ReceivedMessage)
+        self.assertEqual(msg.stream, "s")
+        self.assertEqual(msg.stream_seq, 5)
+        self.assertEqual(msg.consumer, "c")
+        self.assertEqual(msg.consumer_seq, 2)
+        self.assertEqual(msg.subject, "s.a")
+        self.assertEqual(msg.request_id, "r")
+        self.assertEqual(msg.b64_message, "aGVsbG8=")
+        self.assertEqual(msg.message, b"hello")
+        self.assertFalse(hasattr(msg, "__dict__"))
+
+        # Case 1: name strings are reused across records
+        another = uut(
+            b'{"b64_msg":"aGVsbG8=","consumer":"c","request_id":"r",'
+            b'"sequence":{"consumer":3,"stream":6},"stream":"s","subject":"s.a",'
+            b'"success":true}'
+        )
+        self.assertIs(msg.stream, another.stream)
+        self.assertIs(msg.consumer, another.consumer)
+        self.assertIs(msg.subject, another.subject)
+
+        # Case 2: error reported by the server
+        error = uut(
+            b'{"request_id":"r","success":false,'
+            b'"error":{"code":500,"message":"failed","detail":"oops"}}'
+        )
+        self.assertIsInstance(error, httpmq.HttpmqAPIError)
+        self.assertEqual(error.request_id, "r")
+        self.assertEqual(error.status_code, 500)
+        self.assertEqual(error.detail, "oops")
+
+        # Case 3: eager decode of a large record
+        for record in [
+            b'{"b64_msg":"aGVsbG8=","consumer":"c","request_id":"r",'
+            b'"sequence":{"consumer":2,"stream":5},"stream":"s","subject":"s.a",'
+            b'"success":true}',
+            b'{"consumer":"c","request_id":"r","b64_msg" : "aGVsbG8=",'
+            b'"sequence":{"consumer":2,"stream":5},"stream":"s","subject":"s.a",'
+            b'"success":true}',
+        ]:
+            eager = uut.decode_eagerly(bytearray(record))
+            self.assertIsNotNone(eager._message)  # pylint: disable=protected-access
+            self.assertEqual(eager.message, b"hello")
+            encoded = eager.b64_message
+            if isinstance(encoded, str):
+                encoded = encoded.encode("ascii")
+            self.assertEqual(bytes(encoded), b"aGVsbG8=")
+            self.assertEqual(eager.stream_seq, 5)
+            self.assertEqual(eager.subject, "s.a")
+
+        # Case 4: eager decode of an enveloped message
+        b64_msg = base64.b64encode(envelope.wrap(b"hello", {"k": "v"})).decode()
+        eager = uut.decode_eagerly(
+            b'{"b64_msg":"' + b64_msg.encode() + b'","consumer":"c","request_id":"r",'
+            b'"sequence":{"consumer":2,"stream":5},"stream":"s","subject":"s.a",'
+            b'"success":true}'
+        )
+        self.assertDictEqual(eager.headers, {"k": "v"})
+        self.assertEqual(eager.message, b"hello")
+        self.assertEqual(eager.b64_message, b64_msg.encode())
+
+        # Case 5: used as the record parser of the splitter
+        splitter = httpmq.DataClient.RxMessageSplitter(record_parser=uut)
+        self.assertListEqual(
+            [], splitter.process_new_segment(b'{"b64_msg":"aGVsbG8=","consumer":"c",')
+        )
+        parsed = splitter.process_new_segment(
+            b'"request_id":"r","sequence":{"consumer":2,"stream":5},"stream":"s",'
+            b'"subject":"s.a","success":true}\n'
+        )
+        self.assertEqual(len(parsed), 1)
+        self.assertEqual(parsed[0].message, b"hello")
+
+    def test_message_splitter_defer(self):
+        """Verify RxMessageSplitter leaves large records unparsed"""
+
+        uut = httpmq.DataClient.RxMessageSplitter(defer_threshold=32)
+        large = b'{"hello":"' + b"x" * 64 + b'"}'
+
+        # Case 0: a large record is not parsed before its NL arrives
+        self.assertListEqual([], uut.process_new_segment(large[:20]))
+        self.assertListEqual([], uut.process_new_segment(large[20:]))
+
+        # Case 1: once complete, it is returned raw; small records are still parsed
+        parsed = uut.process_new_segment(b'\n{"a":1}\n')
+        self.assertEqual(len(parsed), 2)
+        self.assertIsInstance(parsed[0], httpmq.DataClient.RxMessageSplitter.RawRecord)
+        self.assertEqual(bytes(parsed[0].data), large)
+        self.assertDictEqual(parsed[1], {"a": 1})
+
+    def test_dedup_window(self):
+        """Verify DedupWindow tells duplicates apart from redeliveries"""
+
+        def msg(message_id, stream_seq):
+            return httpmq.ReceivedMessage(
+                stream="s",
+                stream_seq=stream_seq,
+                consumer="c",
+                consumer_seq=stream_seq,
+                subject="subj",
+                message=b"",
+                request_id="r",
+                headers=(
+                    {envelope.MESSAGE_ID_HEADER: message_id}
+                    if message_id is not None
+                    else None
+                ),
+            )
+
+        uut = httpmq.DataClient.DedupWindow(max_size=2)
+        self.assertFalse(uut.is_duplicate(msg("a", 1)))
+        # Redelivery of the same stream message
+        self.assertFalse(uut.is_duplicate(msg("a", 1)))
+        # Another copy of the message
+        self.assertTrue(uut.is_duplicate(msg("a", 2)))
+        # Messages without an ID are never duplicates
+        self.assertFalse(uut.is_duplicate(msg(None, 3)))
+        self.assertFalse(uut.is_duplicate(msg(None, 3)))
+        # Only the most recent IDs are remembered
+        self.assertFalse(uut.is_duplicate(msg("b", 4)))
+        self.assertFalse(uut.is_duplicate(msg("c", 5)))
+        self.assertTrue(uut.is_duplicate(msg("c", 6)))
+        self.assertFalse(uut.is_duplicate(msg("a", 7)))
+
     @async_test
     async def test_basic_sanity(self):
         """Basic sanity check of management API client"""
@@ -366,3 +511,600 @@ class TestDataplane(BaseTestCase):
             await mgmt_client.get_stream(
                 stream=stream_0, context=httpmq.RequestContext()
             )
+
+
+class TestDataplaneDummyServer(DummyDataplaneTestCase):
+    """Test bench for httpmq.dataplane against a stand-in dataplane server"""
+
+    async def start_subscription(
+        self, data_client: httpmq.DataClient, consumer: str, **kwargs
+    ):
+        """Start a push subscription forwarding the messages into a queue
+
+        :return: the message queue, the stop signal, and the subscription task
+        """
+        rx_msgs = asyncio.Queue()
+        stop_signal = asyncio.Event()
+        rx_runner = asyncio.create_task(
+            data_client.push_subscribe(
+                stream=self.dataplane.stream,
+                consumer=consumer,
+                subject_filter="subj.*",
+                forward_data_cb=rx_msgs.put,
+                context=httpmq.RequestContext(),
+                stop_loop=stop_signal,
+                loop_interval_sec=0.01,
+                **kwargs,
+            )
+        )
+        while not self.dataplane.subscribers:
+            await asyncio.sleep(0.01)
+        return rx_msgs, stop_signal, rx_runner
+
+    async def test_lazy_decode_and_republish(self):
+        """Verify messages are decoded lazily, and republished without re-encoding"""
+
+        uut = self.data_client()
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        # Case 0: the payload is only decoded on access
+        payload = str(uuid.uuid4()).encode("utf-8")
+        await uut.publish(
+            subject="subj.a", message=payload, context=httpmq.RequestContext()
+        )
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertIsNone(received._message)  # pylint: disable=protected-access
+        self.assertEqual(received.b64_message, base64.b64encode(payload).decode())
+        self.assertEqual(received.message, payload)
+
+        # Case 1: republish forwards the encoded form as is
+        await uut.republish(
+            subject="subj.b", original_msg=received, context=httpmq.RequestContext()
+        )
+        self.assertEqual(self.dataplane.published[-1]["subject"], "subj.b")
+        self.assertEqual(self.dataplane.published[-1]["b64_msg"], received.b64_message)
+        republished: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertEqual(republished.subject, "subj.b")
+        self.assertEqual(republished.message, payload)
+
+        # Case 2: a replaced message is republished with its headers
+        await uut.publish_idempotent(
+            subject="subj.a",
+            message=payload,
+            context=httpmq.RequestContext(),
+            message_id="msg-0",
+        )
+        received = await rx_msgs.get()
+        received.message = b"replaced"
+        await uut.republish(
+            subject="subj.b", original_msg=received, context=httpmq.RequestContext()
+        )
+        republished = await rx_msgs.get()
+        self.assertEqual(republished.message, b"replaced")
+        self.assertEqual(republished.message_id, "msg-0")
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_publish_buffers(self):
+        """Verify publishing buffer-protocol objects and preencoded payloads"""
+
+        uut = self.data_client()
+        backing = bytearray(b"0123456789abcdef")
+
+        # Case 0: a memoryview slice of a larger buffer
+        await uut.publish(
+            subject="subj.a",
+            message=memoryview(backing)[4:12],
+            context=httpmq.RequestContext(),
+        )
+        self.assertEqual(
+            self.dataplane.published[-1]["b64_msg"],
+            base64.b64encode(b"456789ab").decode(),
+        )
+
+        # Case 1: an already encoded payload is sent as is
+        await uut.publish(
+            subject="subj.a",
+            message=base64.b64encode(b"preencoded"),
+            context=httpmq.RequestContext(),
+            preencoded=True,
+        )
+        self.assertEqual(
+            self.dataplane.published[-1]["b64_msg"],
+            base64.b64encode(b"preencoded").decode(),
+        )
+
+        await uut.disconnect()
+
+    async def test_idempotent_publish(self):
+        """Verify retried publishes are deduplicated by the subscription"""
+
+        uut = self.data_client()
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(
+            uut, "c0", dedup_window=16
+        )
+
+        # The first attempt is stored, but its response is lost
+        self.dataplane.lost_responses = 1
+        await uut.publish_idempotent(
+            subject="subj.a",
+            message=b"hello",
+            context=httpmq.RequestContext(),
+            message_id="msg-0",
+            retry_interval_sec=0.01,
+        )
+        self.assertEqual(len(self.dataplane.published), 2)
+        await uut.publish_idempotent(
+            subject="subj.a", message=b"world", context=httpmq.RequestContext()
+        )
+        await uut.publish(
+            subject="subj.a", message=b"plain", context=httpmq.RequestContext()
+        )
+
+        msgs = [await asyncio.wait_for(rx_msgs.get(), timeout=5) for _ in range(3)]
+        self.assertEqual(msgs[0].message_id, "msg-0")
+        self.assertEqual(msgs[0].message, b"hello")
+        self.assertEqual(msgs[0].stream_seq, 1)
+        self.assertEqual(msgs[1].message, b"world")
+        self.assertIsNotNone(msgs[1].message_id)
+        self.assertIsNone(msgs[2].message_id)
+        self.assertEqual(msgs[2].message, b"plain")
+        # The duplicate was ACKed by the subscription, not forwarded
+        self.assertTrue(rx_msgs.empty())
+        self.assertListEqual([ack["stream_seq"] for ack in self.dataplane.acks], [2])
+
+        # Failing to ACK a duplicate does not end the subscription
+        self.dataplane.failed_acks = 1
+        await uut.publish_idempotent(
+            subject="subj.a",
+            message=b"hello",
+            context=httpmq.RequestContext(),
+            message_id="msg-0",
+        )
+        await uut.publish(
+            subject="subj.a", message=b"after", context=httpmq.RequestContext()
+        )
+        msg = await asyncio.wait_for(rx_msgs.get(), timeout=5)
+        self.assertEqual(msg.message, b"after")
+        self.assertFalse(rx_runner.done())
+        self.assertEqual(self.dataplane.failed_acks, 0)
+
+        # A proxy in front of httpmq answering with an HTML page is retried as well
+        self.dataplane.available = False
+        self.dataplane.proxy_errors = True
+        asyncio.get_running_loop().call_later(
+            0.05, setattr, self.dataplane, "available", True
+        )
+        await uut.publish_idempotent(
+            subject="subj.a",
+            message=b"behind-proxy",
+            context=httpmq.RequestContext(),
+            retry_interval_sec=0.01,
+        )
+        self.dataplane.proxy_errors = False
+        msg = await asyncio.wait_for(rx_msgs.get(), timeout=5)
+        self.assertEqual(msg.message, b"behind-proxy")
+
+        # The failure is raised once the retries are used up
+        self.dataplane.available = False
+        with self.assertRaises(httpmq.HttpmqAPIError):
+            await uut.publish_idempotent(
+                subject="subj.a",
+                message=b"hello",
+                context=httpmq.RequestContext(),
+                max_retries=1,
+                retry_interval_sec=0.01,
+            )
+        self.dataplane.available = True
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_message_headers(self):
+        """Verify messages published with headers are unwrapped on receive"""
+
+        uut = self.data_client()
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        headers = {"content-type": "text/plain", "trace-id": "abc"}
+        backing = bytearray(b"0123456789")
+        await uut.publish(
+            subject="subj.a",
+            message=memoryview(backing)[2:8],
+            context=httpmq.RequestContext(),
+            headers=headers,
+        )
+        await uut.publish(
+            subject="subj.a",
+            message=base64.b64encode(b"preencoded"),
+            context=httpmq.RequestContext(),
+            preencoded=True,
+            headers={"a": "b"},
+        )
+        await uut.publisher("subj.b").publish(b"handle", headers={"c": "d"})
+        await uut.publish(
+            subject="subj.a", message=b"plain", context=httpmq.RequestContext()
+        )
+
+        msgs = [await asyncio.wait_for(rx_msgs.get(), timeout=5) for _ in range(4)]
+        # Headers are read without decoding the message
+        self.assertDictEqual(msgs[0].headers, headers)
+        self.assertIsNone(msgs[0].message_id)
+        self.assertEqual(msgs[0].message_view, b"234567")
+        self.assertEqual(msgs[0].message, b"234567")
+        self.assertIsInstance(msgs[0].message, bytes)
+        self.assertDictEqual(msgs[1].headers, {"a": "b"})
+        self.assertEqual(msgs[1].message, b"preencoded")
+        self.assertDictEqual(msgs[2].headers, {"c": "d"})
+        self.assertEqual(msgs[2].message, b"handle")
+        # Messages without an envelope are passed through
+        self.assertDictEqual(msgs[3].headers, {})
+        self.assertEqual(msgs[3].message, b"plain")
+
+        # Republished messages keep their headers
+        await uut.republish(
+            subject="subj.c", original_msg=msgs[0], context=httpmq.RequestContext()
+        )
+        republished = await asyncio.wait_for(rx_msgs.get(), timeout=5)
+        self.assertDictEqual(republished.headers, headers)
+        self.assertEqual(republished.message, b"234567")
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_compression(self):
+        """Verify messages are compressed above the threshold, and decompressed on receive"""
+
+        uut = self.data_client(
+            compressor="zlib", compress_threshold=100, offload_threshold=10000
+        )
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        small = b'{"a":1}'
+        large = b'{"field":"value"}' * 100
+        huge = b'{"field":"value"}' * 1000
+        await uut.publish(
+            subject="subj.a", message=small, context=httpmq.RequestContext()
+        )
+        await uut.publish(
+            subject="subj.a", message=large, context=httpmq.RequestContext()
+        )
+        # Offloaded, and enveloped
+        await uut.publish(
+            subject="subj.a",
+            message=huge,
+            context=httpmq.RequestContext(),
+            headers={"k": "v"},
+        )
+
+        on_wire = [base64.b64decode(msg["b64_msg"]) for msg in self.dataplane.published]
+        self.assertEqual(on_wire[0], small)
+        self.assertTrue(on_wire[1].startswith(compression.COMPRESSION_MAGIC))
+        self.assertLess(len(on_wire[1]), len(large))
+        headers, body = envelope.unwrap(on_wire[2])
+        self.assertDictEqual(headers, {"k": "v"})
+        self.assertTrue(bytes(body).startswith(compression.COMPRESSION_MAGIC))
+
+        msgs = [await asyncio.wait_for(rx_msgs.get(), timeout=5) for _ in range(3)]
+        self.assertListEqual([msg.message for msg in msgs], [small, large, huge])
+        self.assertDictEqual(msgs[2].headers, {"k": "v"})
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_publish_objects(self):
+        """Verify publishing objects, and deserializing them on receive"""
+
+        uut = self.data_client(offload_threshold=4096)
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        small = {"id": 1, "tags": ["a", "b"]}
+        large = {"values": list(range(2000))}
+        await uut.publish_object(
+            subject="subj.a", obj=small, context=httpmq.RequestContext()
+        )
+        await uut.publish_object(
+            subject="subj.a",
+            obj=large,
+            context=httpmq.RequestContext(),
+            headers={"k": "v"},
+        )
+        publisher = uut.publisher("subj.b")
+        await publisher.publish_object(b"\x00\x01", serializer="raw")
+        # Published without a content type
+        await uut.publish(
+            subject="subj.a", message=b'{"plain":true}', context=httpmq.RequestContext()
+        )
+
+        # Case 0: deserialized on first access
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertEqual(received.content_type, "application/json")
+        self.assertDictEqual(received.value, small)
+        self.assertIs(received.value, received.value)
+
+        # Case 1: large message was deserialized off the loop before delivery
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertIsInstance(received._value, dict)  # pylint: disable=protected-access
+        self.assertDictEqual(received.value, large)
+        self.assertEqual(received.headers["k"], "v")
+
+        # Case 2: raw bytes
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertEqual(received.content_type, "application/octet-stream")
+        self.assertEqual(received.value, b"\x00\x01")
+
+        # Case 3: no content type; the client's serializer is used
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertIsNone(received.content_type)
+        self.assertDictEqual(received.value, {"plain": True})
+        received.message = b"[1]"
+        self.assertListEqual(received.value, [1])
+
+        # Case 4: unknown content type
+        await uut.publish(
+            subject="subj.a",
+            message=b"x",
+            context=httpmq.RequestContext(),
+            headers={"content-type": "text/x-unknown"},
+        )
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        with self.assertRaises(ValueError):
+            _ = received.value
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_publish_objects_json_codec(self):
+        """Verify the JSON serializer uses the JSON codec of the client"""
+
+        class DecimalJSONCodec(StdlibJSONCodec):
+            """JSON codec parsing floats as Decimal, and indenting its output"""
+
+            def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> object:
+                if not isinstance(data, str):
+                    data = str(data, "utf-8")
+                return json.loads(data, parse_float=decimal.Decimal)
+
+            def dumps(self, obj: object) -> bytes:
+                return json.dumps(obj, indent=1).encode("utf-8")
+
+        uut = self.data_client(json_codec=DecimalJSONCodec())
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        await uut.publish_object(
+            subject="subj.a", obj={"x": 1.5}, context=httpmq.RequestContext()
+        )
+        await uut.publisher("subj.a").publish_object({"y": 2.5}, serializer="json")
+        for published in self.dataplane.published:
+            self.assertIn(b"\n", base64.b64decode(published["b64_msg"]))
+
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertDictEqual(received.value, {"x": decimal.Decimal("1.5")})
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertDictEqual(received.value, {"y": decimal.Decimal("2.5")})
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_chunking(self):
+        """Verify large messages are published in chunks, and reassembled on receive"""
+
+        uut = self.data_client(
+            max_msg_size=1000, chunk_spool_threshold=2000, offload_threshold=1200
+        )
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        small = b"small"
+        large = os.urandom(5000)
+        await uut.publish(
+            subject="subj.a",
+            message=large,
+            context=httpmq.RequestContext(),
+            headers={"k": "v"},
+        )
+        await uut.publish(
+            subject="subj.a", message=small, context=httpmq.RequestContext()
+        )
+        await uut.publisher("subj.a").publish_object({"values": list(range(1000))})
+
+        # Every message on the wire is within the size limit
+        on_wire = [base64.b64decode(msg["b64_msg"]) for msg in self.dataplane.published]
+        self.assertGreater(len(on_wire), 10)
+        self.assertTrue(all(len(msg) <= 1000 for msg in on_wire))
+
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertEqual(received.message, large)
+        self.assertDictEqual(received.headers, {"k": "v"})
+        self.assertEqual(len(received.chunks), 6)
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertEqual(received.message, small)
+        self.assertIsNone(received.chunks)
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertDictEqual(received.value, {"values": list(range(1000))})
+
+        # ACK all the chunks of the message
+        await uut.send_ack_simple(received, httpmq.RequestContext())
+        self.assertListEqual(
+            [ack["stream_seq"] for ack in self.dataplane.acks],
+            [seq for seq, _ in received.chunks],
+        )
+        self.assertEqual(self.dataplane.acks[-1]["stream_seq"], len(on_wire))
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_chunking_retry(self):
+        """Verify a retried chunked publish completes the chunks of the earlier attempt"""
+
+        uut = self.data_client(max_msg_size=1000)
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        # The first chunk is stored, but its response is lost
+        self.dataplane.lost_responses = 1
+        large = os.urandom(2000)
+        await uut.publish_idempotent(
+            subject="subj.a",
+            message=large,
+            context=httpmq.RequestContext(),
+            message_id="msg-0",
+            retry_interval_sec=0.01,
+        )
+        self.assertEqual(len(self.dataplane.published), 4)
+
+        received: httpmq.ReceivedMessage = await asyncio.wait_for(rx_msgs.get(), 5)
+        self.assertEqual(received.message, large)
+        self.assertEqual(received.message_id, "msg-0")
+        # Both copies of the first chunk are ACKed with the message
+        await uut.send_ack_simple(received, httpmq.RequestContext())
+        self.assertListEqual(
+            sorted(ack["stream_seq"] for ack in self.dataplane.acks), [1, 2, 3, 4]
+        )
+
+        stop_signal.set()
+        await rx_runner
+
+        # A subscription which can not hold all the chunks of a message drops it, and
+        # ACKs its chunks
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(
+            uut, "c1", max_msg_inflight=2
+        )
+        while not any(sub.consumer == "c1" for sub in self.dataplane.subscribers):
+            await asyncio.sleep(0.01)
+        self.dataplane.acks.clear()
+        published = len(self.dataplane.published)
+        await uut.publish(
+            subject="subj.a", message=large, context=httpmq.RequestContext()
+        )
+        await uut.publish(
+            subject="subj.a", message=b"small", context=httpmq.RequestContext()
+        )
+        received = await asyncio.wait_for(rx_msgs.get(), 5)
+        self.assertEqual(received.message, b"small")
+        self.assertListEqual(
+            [ack["stream_seq"] for ack in self.dataplane.acks],
+            [published + 1, published + 2, published + 3],
+        )
+        self.assertFalse(rx_runner.done())
+        stop_signal.set()
+        await rx_runner
+
+        # Publishers can be held to the chunk count the subscriptions can reassemble
+        uut.max_chunk_count = 2
+        with self.assertRaises(ValueError):
+            await uut.publish(
+                subject="subj.a", message=large, context=httpmq.RequestContext()
+            )
+        self.assertEqual(len(self.dataplane.published), published + 4)
+        await uut.disconnect()
+
+    async def test_publisher(self):
+        """Verify publishing through a publisher bound to a subject"""
+
+        uut = self.data_client()
+
+        for subject in ["", "subj a", "subj/a", "subj?a"]:
+            with self.assertRaises(ValueError):
+                uut.publisher(subject)
+
+        publisher = uut.publisher(
+            "subj.b", context=httpmq.RequestContext().add_header("X-Test", "a")
+        )
+        request_ids = set()
+        for idx in range(3):
+            request_ids.add(await publisher.publish(f"msg-{idx}".encode()))
+            self.assertEqual(self.dataplane.published[-1]["subject"], "subj.b")
+            self.assertEqual(
+                self.dataplane.published[-1]["b64_msg"],
+                base64.b64encode(f"msg-{idx}".encode()).decode(),
+            )
+        # Each message gets its own request ID
+        self.assertEqual(len(request_ids), 3)
+        self.assertEqual(
+            await publisher.publish(
+                base64.b64encode(b"preencoded"), preencoded=True, request_id="req-1"
+            ),
+            "req-1",
+        )
+        self.assertEqual(
+            self.dataplane.published[-1]["b64_msg"],
+            base64.b64encode(b"preencoded").decode(),
+        )
+        # The header template does not carry the request ID
+        self.assertEqual(publisher.request.headers["X-Test"], "a")
+        self.assertNotIn(
+            httpmq.common.DEFAULT_REQUEST_ID_FIELD, publisher.request.headers
+        )
+
+        await uut.disconnect()
+
+    async def test_offload_large_messages(self):
+        """Verify large messages are encoded and decoded in the executor"""
+
+        uut = self.data_client(offload_threshold=1024)
+        rx_msgs, stop_signal, rx_runner = await self.start_subscription(uut, "c0")
+
+        small = b"small"
+        large = bytes(range(256)) * 256
+        for payload in [small, large]:
+            await uut.publish(
+                subject="subj.a", message=payload, context=httpmq.RequestContext()
+            )
+        await uut.publish(
+            subject="subj.a",
+            message=large,
+            context=httpmq.RequestContext(),
+            headers={"trace-id": "abc"},
+        )
+
+        # Case 0: the small message is decoded lazily
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertIsNone(received._message)  # pylint: disable=protected-access
+        self.assertEqual(received.message, small)
+
+        # Case 1: the large message was decoded off the loop before delivery
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertIsNotNone(received._message)  # pylint: disable=protected-access
+        self.assertEqual(received.message, large)
+
+        # Case 2: the large message was placed in its envelope off the loop
+        received: httpmq.ReceivedMessage = await rx_msgs.get()
+        self.assertEqual(received.headers, {"trace-id": "abc"})
+        self.assertEqual(received.message, large)
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+
+    async def test_publish_stream(self):
+        """Verify publishing from files and async iterators"""
+
+        uut = self.data_client()
+        raw = os.urandom(100000)
+        expected = base64.b64encode(raw).decode()
+
+        async def chunks():
+            for offset in range(0, len(raw), 7001):
+                yield raw[offset : offset + 7001]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "payload")
+            with open(file_path, "wb") as file_obj:
+                file_obj.write(raw)
+            for source in [file_path, io.BytesIO(raw), chunks()]:
+                await uut.publish_stream(
+                    subject="subj.a",
+                    source=source,
+                    context=httpmq.RequestContext(),
+                    chunk_size=4096,
+                )
+                self.assertEqual(self.dataplane.published[-1]["b64_msg"], expected)
+
+        await uut.disconnect()
@@ -0,0 +1,184 @@
+"""Test bench for httpmq.dispatch"""
+
+import asyncio
+import multiprocessing
+import threading
+import httpmq
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+def build_payload(size: int) -> bytes:
+    """Build a test payload of a given size"""
+    return bytes(idx % 251 for idx in range(size))
+
+
+def check_payload(msg: httpmq.DispatchedMessage):
+    """Handler verifying the payload matches the size given in the subject"""
+    if msg.subject == "subj.fail":
+        raise ValueError("Failing on request")
+    if msg.payload != build_payload(int(msg.subject.split(".")[1])):
+        raise ValueError(f"Corrupted payload for {msg.subject}")
+
+
+class TestProcessPoolDispatcher(DummyDataplaneTestCase):
+    """Test bench for httpmq.dispatch.ProcessPoolDispatcher"""
+
+    async def test_dispatch(self):
+        """Verify messages are processed in worker processes, and ACKed on success"""
+
+        uut_client = self.data_client()
+        uut = httpmq.ProcessPoolDispatcher(
+            data_client=uut_client,
+            handler=check_payload,
+            max_msg_inflight=2,
+            workers=2,
+            shm_threshold=1024,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        uut.start()
+
+        sizes = [0, 100, 1024, 300000]
+        for idx, size in enumerate(sizes):
+            await uut(
+                httpmq.ReceivedMessage(
+                    stream="stream",
+                    stream_seq=idx + 1,
+                    consumer="c0",
+                    consumer_seq=idx + 1,
+                    subject=f"subj.{size}",
+                    message=build_payload(size),
+                    request_id="",
+                )
+            )
+            self.assertLessEqual(uut.get_stats().inflight, 2)
+        await uut(
+            httpmq.ReceivedMessage(
+                stream="stream",
+                stream_seq=10,
+                consumer="c0",
+                consumer_seq=10,
+                subject="subj.fail",
+                message=b"",
+                request_id="",
+            )
+        )
+        await uut.stop()
+
+        stats = uut.get_stats()
+        self.assertEqual(stats.inflight, 0)
+        self.assertEqual(stats.dispatched, 5)
+        self.assertEqual(stats.succeeded, 4)
+        self.assertEqual(stats.failed, 1)
+        self.assertEqual(stats.shared_memory, 2)
+        # Only the messages the handler completed for are ACKed
+        self.assertEqual(
+            sorted(ack["stream_seq"] for ack in self.dataplane.acks), [1, 2, 3, 4]
+        )
+        await uut_client.disconnect()
+
+    async def test_subscription(self):
+        """Verify the dispatcher as the handler of a push subscription"""
+
+        uut_client = self.data_client()
+        dispatcher = httpmq.ProcessPoolDispatcher(
+            data_client=uut_client,
+            handler=check_payload,
+            max_msg_inflight=4,
+            workers=2,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        dispatcher.start()
+        uut = httpmq.ResilientSubscription(
+            data_client=uut_client,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            forward_data_cb=dispatcher,
+            max_msg_inflight=4,
+            loop_interval_sec=0.01,
+        )
+        stop_signal = asyncio.Event()
+        runner = asyncio.create_task(uut.run(stop_signal))
+        while not self.dataplane.subscribers:
+            await asyncio.sleep(0.01)
+        for size in [10, 2**17]:
+            await uut_client.publish(
+                subject=f"subj.{size}",
+                message=build_payload(size),
+                context=httpmq.RequestContext(),
+            )
+        for _ in range(600):
+            if len(self.dataplane.acks) == 2:
+                break
+            await asyncio.sleep(0.05)
+        self.assertEqual(len(self.dataplane.acks), 2)
+        self.assertEqual(dispatcher.get_stats().shared_memory, 1)
+
+        stop_signal.set()
+        await runner
+        await dispatcher.stop()
+        await uut_client.disconnect()
+
+
+class TestThreadPoolDispatcher(DummyDataplaneTestCase):
+    """Test bench for httpmq.dispatch.ThreadPoolDispatcher"""
+
+    async def test_dispatch(self):
+        """Verify blocking handlers run in the thread pool, and messages are ACKed"""
+
+        uut_client = self.data_client()
+        release = threading.Event()
+        handled = []
+
+        def handler(msg: httpmq.ReceivedMessage):
+            # Blocks the worker thread, but not the event loop
+            release.wait()
+            if msg.message == b"fail":
+                raise ValueError("Failing on request")
+            handled.append((threading.current_thread().name, msg.message))
+
+        # The base class only defines the worker hooks
+        with self.assertRaises(TypeError):
+            # pylint: disable-next=abstract-class-instantiated
+            httpmq.Dispatcher(data_client=uut_client)
+        uut = httpmq.ThreadPoolDispatcher(
+            data_client=uut_client, handler=handler, max_msg_inflight=3, workers=1
+        )
+        uut.start()
+        for idx, message in enumerate([b"msg-0", b"fail", b"msg-1"]):
+            await uut(
+                httpmq.ReceivedMessage(
+                    stream="stream",
+                    stream_seq=idx + 1,
+                    consumer="c0",
+                    consumer_seq=idx + 1,
+                    subject="subj.a",
+                    message=message,
+                    request_id="",
+                )
+            )
+        await asyncio.sleep(0.1)
+        stats = uut.get_stats()
+        self.assertEqual(stats.inflight, 3)
+        self.assertEqual(stats.workers, 1)
+        self.assertEqual(stats.busy, 1)
+        self.assertEqual(stats.queued, 2)
+
+        release.set()
+        await uut.stop()
+        stats = uut.get_stats()
+        self.assertEqual(stats.inflight, 0)
+        self.assertEqual(stats.busy, 0)
+        self.assertEqual(stats.queued, 0)
+        self.assertEqual(stats.succeeded, 2)
+        self.assertEqual(stats.failed, 1)
+        self.assertGreater(stats.busy_time_sec, 0.1)
+        self.assertGreater(stats.utilization, 0)
+        self.assertLessEqual(stats.utilization, 1)
+        self.assertEqual([message for _, message in handled], [b"msg-0", b"msg-1"])
+        for thread_name, _ in handled:
+            self.assertTrue(thread_name.startswith("httpmq-handler"))
+        self.assertEqual(
+            sorted(ack["stream_seq"] for ack in self.dataplane.acks), [1, 3]
+        )
+        await uut_client.disconnect()
@@ -0,0 +1,129 @@
+"""Test bench for httpmq.drain"""
+
+import asyncio
+import tempfile
+import threading
+import httpmq
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+class TestDrain(DummyDataplaneTestCase):
+    """Test bench for httpmq.drain.drain_all"""
+
+    async def test_drain(self):
+        """Verify received messages are handled, ACKed, and their output published"""
+
+        uut_client = self.data_client()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            outbox = httpmq.Outbox(data_client=uut_client, directory=tmp_dir)
+
+            async def handler(batch):
+                for msg in batch:
+                    await outbox.publish(subject="out.a", message=msg.message.upper())
+
+            # Batches are only flushed by the drain
+            batcher = httpmq.MessageBatcher(
+                data_client=uut_client,
+                handler=handler,
+                max_msg_inflight=16,
+                linger_sec=60,
+            )
+            manager = httpmq.SubscriptionManager(data_client=uut_client)
+            manager.add(
+                stream=self.dataplane.stream,
+                consumer="c0",
+                subject_filter="subj.*",
+                handler=batcher,
+                loop_interval_sec=0.01,
+            )
+            outbox.start()
+            batcher.start()
+            manager.start()
+            while not manager.get_stats().connected:
+                await asyncio.sleep(0.01)
+
+            for idx in range(3):
+                await uut_client.publish(
+                    subject="subj.a",
+                    message=f"msg-{idx}".encode(),
+                    context=httpmq.RequestContext(),
+                )
+            while manager.get_stats().messages < 3:
+                await asyncio.sleep(0.01)
+            self.assertEqual(batcher.get_stats().pending, 3)
+            self.assertEqual(self.dataplane.acks, [])
+
+            report = await httpmq.drain_all([manager, batcher, outbox], timeout_sec=5)
+            self.assertTrue(report.completed)
+            self.assertEqual(report.handled, 3)
+            # Part of the output may be published while the batches are being drained
+            self.assertGreaterEqual(report.published, 1)
+            self.assertEqual(report.abandoned, [])
+            self.assertEqual(report.pending_publishes, 0)
+            self.assertEqual(manager.get_stats().connected, 0)
+            self.assertEqual(
+                sorted(ack["stream_seq"] for ack in self.dataplane.acks), [1, 2, 3]
+            )
+            self.assertEqual(
+                [msg["subject"] for msg in self.dataplane.published[3:]], ["out.a"] * 3
+            )
+
+        await uut_client.disconnect()
+
+    async def test_deadline(self):
+        """Verify handlers still running at the deadline are abandoned, and reported"""
+
+        uut_client = self.data_client()
+        release = threading.Event()
+
+        def blocking_handler(msg: httpmq.ReceivedMessage):
+            if msg.message == b"stuck":
+                release.wait()
+
+        dispatcher = httpmq.ThreadPoolDispatcher(
+            data_client=uut_client, handler=blocking_handler, workers=2
+        )
+
+        async def handler(msg: httpmq.ReceivedMessage):
+            if msg.subject == "subj.stuck":
+                await asyncio.sleep(60)
+            await dispatcher(msg)
+
+        manager = httpmq.SubscriptionManager(data_client=uut_client)
+        manager.add(
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            handler=handler,
+            loop_interval_sec=0.01,
+        )
+        dispatcher.start()
+        manager.start()
+        while not manager.get_stats().connected:
+            await asyncio.sleep(0.01)
+
+        for subject, message in [
+            ("subj.a", b"ok"),
+            ("subj.a", b"stuck"),
+            ("subj.stuck", b"ok"),
+        ]:
+            await uut_client.publish(
+                subject=subject, message=message, context=httpmq.RequestContext()
+            )
+        while dispatcher.get_stats().dispatched < 2:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+        report = await httpmq.drain_all([manager, dispatcher], timeout_sec=0.3)
+        self.assertFalse(report.completed)
+        self.assertGreaterEqual(report.elapsed_sec, 0.3)
+        self.assertLess(report.elapsed_sec, 2)
+        # The async handler stuck in the manager, and the message stuck in the thread pool
+        self.assertEqual(
+            sorted(report.abandoned),
+            [(self.dataplane.stream, "c0", 2), (self.dataplane.stream, "c0", 3)],
+        )
+        self.assertEqual([ack["stream_seq"] for ack in self.dataplane.acks], [1])
+
+        release.set()
+        await uut_client.disconnect()
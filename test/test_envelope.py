@@ -0,0 +1,76 @@
+"""Test bench for httpmq.envelope"""
+
+import base64
+import unittest
+from httpmq import envelope
+
+
+class TestEnvelope(unittest.TestCase):
+    """Test bench for httpmq.envelope"""
+
+    def test_wrap_unwrap(self):
+        """Verify messages and headers survive the envelope"""
+
+        header_sets = [
+            {},
+            {"a": ""},
+            {envelope.MESSAGE_ID_HEADER: "id-0"},
+            {"content-type": "application/json", "trace-id": "é" * 100, "ts": "1.5"},
+        ]
+        for headers in header_sets:
+            prefix = envelope.encode_headers(headers)
+            self.assertEqual(len(prefix) % 3, 0)
+            for message in [
+                b"",
+                b"hello",
+                bytearray(b"\xc1HQ"),
+                memoryview(b"x" * 1000),
+            ]:
+                wrapped = envelope.wrap(message=message, headers=headers)
+                self.assertTrue(wrapped.startswith(envelope.ENVELOPE_MAGIC))
+                parsed_headers, body = envelope.unwrap(wrapped)
+                self.assertDictEqual(parsed_headers, headers)
+                # The message is a view into the envelope, not a copy
+                self.assertIsInstance(body, memoryview)
+                self.assertIs(body.obj, wrapped)
+                self.assertEqual(body, bytes(message))
+                # The envelope and the message can be encoded separately
+                self.assertEqual(
+                    base64.b64encode(wrapped),
+                    base64.b64encode(prefix) + base64.b64encode(message),
+                )
+
+        for headers in [{"": "a"}, {"k" * 256: "a"}, {"a": "x" * 2**16}]:
+            with self.assertRaises(ValueError):
+                envelope.encode_headers(headers)
+
+    def test_pass_through(self):
+        """Verify messages without an envelope are returned as is"""
+
+        for message in [
+            b"",
+            b"hello",
+            b'{"a":1}',
+            envelope.ENVELOPE_MAGIC,
+            envelope.ENVELOPE_MAGIC + b"\x01\xff\xff",
+            # Header block without the end marker
+            envelope.ENVELOPE_MAGIC + b"\x01\x03\x00\x01a\x00",
+        ]:
+            headers, body = envelope.unwrap(message)
+            self.assertIsNone(headers)
+            self.assertIs(body, message)
+            self.assertIsNone(envelope.peek_headers(base64.b64encode(message)))
+
+    def test_peek_headers(self):
+        """Verify the headers are read from a prefix of the Base64 encoded message"""
+
+        for headers in [{}, {"a": "b"}, {"msg": "é" * 1000, "x": "y"}]:
+            for message in [b"", b"hello", b"x" * 100000]:
+                encoded = base64.b64encode(envelope.wrap(message, headers))
+                self.assertDictEqual(envelope.peek_headers(encoded), headers)
+                self.assertDictEqual(
+                    envelope.peek_headers(encoded.decode("ascii")), headers
+                )
+                self.assertDictEqual(
+                    envelope.peek_headers(memoryview(encoded)), headers
+                )
@@ -0,0 +1,210 @@
+"""Test bench for httpmq.flow_control"""
+
+import asyncio
+import os
+import httpmq
+from . import BaseTestCase, async_test
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+def build_message(seq: int, stream_seq: int = None) -> httpmq.ReceivedMessage:
+    """Build a received message"""
+    return httpmq.ReceivedMessage(
+        stream="stream",
+        stream_seq=stream_seq if stream_seq is not None else seq,
+        consumer="c0",
+        consumer_seq=seq,
+        subject="subj.a",
+        message=b"msg",
+        request_id="",
+    )
+
+
+class TestAdaptiveInflight(BaseTestCase):
+    """Test bench for httpmq.flow_control.AdaptiveInflight"""
+
+    @async_test
+    async def test_aimd(self):
+        """Verify the window grows on healthy ACKs, and shrinks on congestion"""
+
+        uut = httpmq.AdaptiveInflight(
+            min_window=1,
+            max_window=8,
+            initial_window=2,
+            target_latency_sec=0.05,
+            min_reconnect_interval_sec=0,
+        )
+        uut.on_connect(uut.connection_window())
+        self.assertEqual(uut.connection_window(), 3)
+
+        # Case 0: additive increase
+        for seq in range(1, 6):
+            await uut.acquire(build_message(seq))
+            uut.on_ack(seq, seq, True)
+        self.assertEqual(uut.window, 3)
+        self.assertTrue(uut.needs_reconnect())
+
+        # Case 1: multiplicative decrease on a slow ACK
+        await uut.acquire(build_message(6))
+        await asyncio.sleep(0.1)
+        uut.on_ack(6, 6, True)
+        self.assertEqual(uut.window, 1)
+
+        # Case 2: no further decrease within the same window's worth of messages
+        uut.on_connect(uut.connection_window())
+        await uut.acquire(build_message(7))
+        uut.on_ack(7, 7, False)
+        self.assertEqual(uut.get_stats().decreases, 2)
+        self.assertEqual(uut.window, 1)
+
+        stats = uut.get_stats()
+        self.assertEqual(stats.inflight, 0)
+        self.assertEqual(stats.ack_failures, 1)
+        self.assertGreater(stats.latency_sec, 0)
+        self.assertEqual([window for _, window in stats.history], [2, 3, 1])
+
+    @async_test
+    async def test_throttle(self):
+        """Verify messages wait for the window to open"""
+
+        uut = httpmq.AdaptiveInflight(
+            min_window=1, max_window=1, initial_window=1, ack_wait_sec=0.2
+        )
+        await uut.acquire(build_message(1))
+        blocked = asyncio.create_task(uut.acquire(build_message(2)))
+        await asyncio.sleep(0.05)
+        self.assertFalse(blocked.done())
+        uut.on_ack(1, 1, True)
+        await asyncio.wait_for(blocked, 1)
+        self.assertGreater(uut.get_stats().throttled_sec, 0)
+
+        # Message 2 is never ACKed; once its ACK wait passes, it no longer holds the window
+        await asyncio.wait_for(uut.acquire(build_message(3)), 1)
+        self.assertEqual(uut.get_stats().timeouts, 1)
+
+        # Message 3 is redelivered before its ACK
+        await uut.acquire(build_message(4, stream_seq=3))
+        stats = uut.get_stats()
+        self.assertEqual(stats.redeliveries, 1)
+        self.assertEqual(stats.inflight, 1)
+
+
+class TestFlowControlledSubscription(DummyDataplaneTestCase):
+    """Test bench for httpmq.subscription.ResilientSubscription with flow control"""
+
+    async def test_reconnect_with_new_window(self):
+        """Verify the subscription reconnects once the window outgrows the connection"""
+
+        uut_client = self.data_client()
+
+        async def handler(msg: httpmq.ReceivedMessage):
+            await uut_client.send_ack_simple(msg, httpmq.RequestContext())
+
+        flow_control = httpmq.AdaptiveInflight(
+            min_window=1,
+            max_window=16,
+            initial_window=2,
+            headroom=1.0,
+            min_reconnect_interval_sec=0,
+        )
+        uut = httpmq.ResilientSubscription(
+            data_client=uut_client,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            forward_data_cb=handler,
+            loop_interval_sec=0.01,
+            flow_control=flow_control,
+        )
+        stop_signal = asyncio.Event()
+        runner = asyncio.create_task(uut.run(stop_signal))
+        while not uut.get_stats().connected:
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.dataplane.subscribers[0].params["max_msg_inflight"], "2")
+
+        for idx in range(8):
+            await uut_client.publish(
+                subject="subj.a",
+                message=f"msg-{idx}".encode(),
+                context=httpmq.RequestContext(),
+            )
+            await asyncio.sleep(0.02)
+        for _ in range(200):
+            if uut.get_stats().window_reconnects and uut.get_stats().connected:
+                break
+            await asyncio.sleep(0.01)
+
+        stats = uut.get_stats()
+        self.assertGreaterEqual(stats.window_reconnects, 1)
+        self.assertGreaterEqual(stats.flow_control.window, 3)
+        self.assertEqual(
+            self.dataplane.subscribers[-1].params["max_msg_inflight"],
+            str(stats.flow_control.connection_window),
+        )
+        self.assertEqual(stats.flow_control.inflight, 0)
+        self.assertEqual(stats.flow_control.decreases, 0)
+
+        stop_signal.set()
+        await runner
+        self.assertEqual(uut_client.ack_observers, [])
+        await uut_client.disconnect()
+
+    async def test_chunked_message_in_shrunk_window(self):
+        """Verify chunked messages are still reassembled once the window shrank"""
+
+        uut_client = self.data_client(max_msg_size=1000, max_chunk_count=4)
+        rx_msgs = asyncio.Queue()
+
+        async def handler(msg: httpmq.ReceivedMessage):
+            if msg.message == b"slow":
+                await asyncio.sleep(0.1)
+            await uut_client.send_ack_simple(msg, httpmq.RequestContext())
+            await rx_msgs.put(msg)
+
+        flow_control = httpmq.AdaptiveInflight(
+            min_window=1,
+            max_window=16,
+            initial_window=2,
+            target_latency_sec=0.05,
+            headroom=1.0,
+            min_reconnect_interval_sec=0,
+            min_connection_window=4,
+        )
+        uut = httpmq.ResilientSubscription(
+            data_client=uut_client,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            forward_data_cb=handler,
+            loop_interval_sec=0.01,
+            flow_control=flow_control,
+        )
+        stop_signal = asyncio.Event()
+        runner = asyncio.create_task(uut.run(stop_signal))
+        while not uut.get_stats().connected:
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.dataplane.subscribers[0].params["max_msg_inflight"], "4")
+
+        # A slow message shrinks the window to its minimum
+        await uut_client.publish(
+            subject="subj.a", message=b"slow", context=httpmq.RequestContext()
+        )
+        await asyncio.wait_for(rx_msgs.get(), 5)
+        self.assertEqual(flow_control.window, 1)
+        self.assertEqual(flow_control.connection_window(), 4)
+
+        # A message of 4 chunks still fits the connection
+        large = os.urandom(3000)
+        await uut_client.publish(
+            subject="subj.a", message=large, context=httpmq.RequestContext()
+        )
+        received = await asyncio.wait_for(rx_msgs.get(), 5)
+        self.assertEqual(received.message, large)
+        self.assertEqual(len(received.chunks), 4)
+        self.assertEqual(len(self.dataplane.acks), 5)
+        for subscriber in self.dataplane.subscribers:
+            self.assertEqual(subscriber.params["max_msg_inflight"], "4")
+
+        stop_signal.set()
+        await runner
+        await uut_client.disconnect()
@@ -0,0 +1,81 @@
+"""Test bench for httpmq.monitor"""
+
+import asyncio
+import time
+from typing import Union
+import httpmq
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+class TestLoopLagMonitor(DummyDataplaneTestCase):
+    """Test bench for httpmq.monitor.LoopLagMonitor"""
+
+    async def test_lag_attribution(self):
+        """Verify lag is measured and attributed to the running handler"""
+
+        uut = httpmq.LoopLagMonitor(interval_sec=0.01, spike_threshold_sec=0.05)
+        uut.start()
+        self.assertTrue(uut.running)
+
+        # Case 0: an idle loop has no spikes
+        await asyncio.sleep(0.1)
+        stats = uut.get_stats()
+        self.assertGreater(stats.samples, 0)
+        self.assertEqual(stats.spikes, 0)
+
+        # Case 1: a blocking handler causes a spike attributed to it
+        with uut.track_handler("stream/blocking"):
+            time.sleep(0.1)
+        await asyncio.sleep(0.02)
+        with uut.track_handler("stream/polite"):
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.05)
+        stats = uut.get_stats()
+        self.assertGreaterEqual(stats.spikes, 1)
+        self.assertGreaterEqual(stats.max_sec, 0.05)
+        self.assertIn("stream/blocking", stats.spikes_by_handler)
+        self.assertNotIn("stream/polite", stats.spikes_by_handler)
+
+        await uut.stop()
+        self.assertFalse(uut.running)
+
+    async def test_push_subscribe_integration(self):
+        """Verify DataClient starts the monitor and tracks subscription handlers"""
+
+        monitor = httpmq.LoopLagMonitor(interval_sec=0.01, spike_threshold_sec=0.05)
+        uut = self.data_client(lag_monitor=monitor)
+        await uut.ready(context=httpmq.RequestContext())
+        self.assertTrue(monitor.running)
+
+        received = asyncio.Queue()
+
+        async def slow_handler(msg: Union[httpmq.ReceivedMessage, Exception]):
+            """Handler blocking the loop"""
+            time.sleep(0.1)
+            await received.put(msg)
+
+        stop_signal = asyncio.Event()
+        rx_runner = asyncio.create_task(
+            uut.push_subscribe(
+                stream="test-stream",
+                consumer="slow",
+                subject_filter="subj",
+                forward_data_cb=slow_handler,
+                context=httpmq.RequestContext(),
+                stop_loop=stop_signal,
+                loop_interval_sec=0.01,
+            )
+        )
+        await asyncio.sleep(0.05)
+        await uut.publish(
+            subject="subj", message=b"hello", context=httpmq.RequestContext()
+        )
+        msg = await received.get()
+        self.assertEqual(msg.message, b"hello")
+        await asyncio.sleep(0.05)
+        self.assertIn("test-stream/slow", monitor.get_stats().spikes_by_handler)
+
+        stop_signal.set()
+        await rx_runner
+        await uut.disconnect()
+        self.assertFalse(monitor.running)
@@ -0,0 +1,261 @@
+"""Test bench for httpmq.outbox"""
+
+# pylint: disable=consider-using-with
+
+import asyncio
+import base64
+import os
+import socket
+import tempfile
+import unittest
+import httpmq
+from httpmq.outbox import SegmentedLog
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+class TestSegmentedLog(unittest.TestCase):
+    """Test bench for httpmq.outbox.SegmentedLog"""
+
+    def setUp(self):
+        """Called for each test case"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Called after each test case"""
+        self.tmp_dir.cleanup()
+
+    def segment_files(self):
+        """List the segment files in the log directory"""
+        return sorted(
+            name for name in os.listdir(self.tmp_dir.name) if name.endswith(".seg")
+        )
+
+    def test_append_read_commit(self):
+        """Verify records are read back in order across segments"""
+
+        uut = SegmentedLog(directory=self.tmp_dir.name, segment_size=256)
+        messages = [f"message-{idx}".encode() * (idx + 1) for idx in range(20)]
+        for idx, msg in enumerate(messages):
+            uut.append(subject=f"subj.{idx % 3}", message=memoryview(msg))
+        self.assertEqual(uut.depth, 20)
+        self.assertEqual(uut.pending_bytes, sum(len(msg) for msg in messages))
+        self.assertGreater(uut.segment_count, 1)
+
+        # Reading does not consume
+        self.assertEqual(len(uut.read(5)), 5)
+        records = uut.read(5)
+        self.assertListEqual([rec.message for rec in records], messages[:5])
+        self.assertListEqual(
+            [rec.subject for rec in records], [f"subj.{idx % 3}" for idx in range(5)]
+        )
+        uut.commit(records)
+        self.assertEqual(uut.depth, 15)
+
+        # Consume the rest; only the segment being written remains
+        records = uut.read(100)
+        self.assertListEqual([rec.message for rec in records], messages[5:])
+        uut.commit(records)
+        self.assertEqual(uut.depth, 0)
+        self.assertEqual(uut.pending_bytes, 0)
+        self.assertListEqual(uut.read(10), [])
+        self.assertIsNone(uut.oldest_enqueued_at())
+        self.assertEqual(uut.segment_count, 1)
+        self.assertEqual(len(self.segment_files()), 1)
+
+        # A record larger than the segment size gets a segment of its own
+        uut.append(subject="subj.big", message=b"x" * 1000)
+        self.assertEqual(uut.read(1)[0].message, b"x" * 1000)
+        uut.close()
+
+    def test_recovery(self):
+        """Verify the pending records and read position survive a reopen"""
+
+        uut = SegmentedLog(directory=self.tmp_dir.name, segment_size=128)
+        for idx in range(10):
+            uut.append(subject="subj", message=f"msg-{idx}".encode(), enqueued_at=idx)
+        uut.commit(uut.read(4))
+        uut.close()
+
+        uut = SegmentedLog(directory=self.tmp_dir.name, segment_size=128)
+        self.assertEqual(uut.depth, 6)
+        records = uut.read(100)
+        self.assertListEqual(
+            [rec.message for rec in records],
+            [f"msg-{idx}".encode() for idx in range(4, 10)],
+        )
+        self.assertEqual(uut.oldest_enqueued_at(), 4)
+        uut.commit(records[:2])
+        self.assertEqual(uut.oldest_enqueued_at(), 6)
+        uut.append(subject="subj", message=b"msg-10")
+        uut.close()
+        with self.assertRaises(RuntimeError):
+            uut.append(subject="subj", message=b"after-close")
+
+        uut = SegmentedLog(directory=self.tmp_dir.name, segment_size=128)
+        self.assertListEqual(
+            [rec.message for rec in uut.read(100)],
+            [f"msg-{idx}".encode() for idx in range(6, 11)],
+        )
+        uut.close()
+
+    def test_torn_record(self):
+        """Verify a partially written record is discarded on reopen"""
+
+        uut = SegmentedLog(directory=self.tmp_dir.name, segment_size=4096)
+        for idx in range(3):
+            uut.append(subject="subj", message=f"msg-{idx}".encode())
+        uut.close()
+
+        # Corrupt the body of the last record
+        seg_path = os.path.join(self.tmp_dir.name, self.segment_files()[-1])
+        record_len = SegmentedLog.HEADER.size + len("subjmsg-0")
+        with open(seg_path, "r+b") as file_obj:
+            file_obj.seek(record_len * 3 - 1)
+            file_obj.write(b"?")
+
+        uut = SegmentedLog(directory=self.tmp_dir.name, segment_size=4096)
+        self.assertEqual(uut.depth, 2)
+        # New records replace the discarded one
+        uut.append(subject="subj", message=b"msg-3")
+        self.assertListEqual(
+            [rec.message for rec in uut.read(10)], [b"msg-0", b"msg-1", b"msg-3"]
+        )
+        uut.close()
+
+
+class TestOutbox(DummyDataplaneTestCase):
+    """Test bench for httpmq.outbox.Outbox against a stand-in dataplane server"""
+
+    async def asyncSetUp(self):
+        """Called for each test case"""
+        await super().asyncSetUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        """Called after each test case"""
+        self.tmp_dir.cleanup()
+        await super().asyncTearDown()
+
+    def outbox(self, base_url: str, **kwargs) -> httpmq.Outbox:
+        """Define an outbox delivering to a server"""
+        return httpmq.Outbox(
+            data_client=httpmq.DataClient(
+                api_client=httpmq.APIClient(base_url=base_url)
+            ),
+            directory=self.tmp_dir.name,
+            retry_interval_sec=0.01,
+            max_retry_interval_sec=0.05,
+            **kwargs,
+        )
+
+    def published_messages(self):
+        """Fetch the decoded messages received by the stand-in server"""
+        return [base64.b64decode(msg["b64_msg"]) for msg in self.dataplane.published]
+
+    async def test_outage(self):
+        """Verify messages are held during an outage and delivered in order after"""
+
+        uut = self.outbox(
+            f"http://{self.server.host}:{self.server.port}",
+            segment_size=512,
+            batch_size=4,
+        )
+        uut.start()
+        await uut.publish(subject="subj.a", message=b"msg-0")
+        await uut.wait_drained()
+        self.assertListEqual(self.published_messages(), [b"msg-0"])
+
+        # Server becomes unavailable
+        self.dataplane.available = False
+        for idx in range(1, 21):
+            await uut.publish(subject="subj.a", message=f"msg-{idx}".encode())
+        await asyncio.sleep(0.1)
+        stats = uut.get_stats()
+        self.assertEqual(stats.depth, 20)
+        self.assertEqual(stats.enqueued, 21)
+        self.assertEqual(stats.delivered, 1)
+        self.assertGreater(stats.failed_attempts, 0)
+        self.assertGreater(stats.oldest_age_sec, 0.05)
+        self.assertGreater(stats.segments, 1)
+
+        # Server recovers
+        self.dataplane.available = True
+        await asyncio.wait_for(uut.wait_drained(), timeout=5)
+        self.assertListEqual(
+            self.published_messages(), [f"msg-{idx}".encode() for idx in range(21)]
+        )
+        stats = uut.get_stats()
+        self.assertEqual(stats.depth, 0)
+        self.assertEqual(stats.pending_bytes, 0)
+        self.assertEqual(stats.oldest_age_sec, 0)
+        self.assertEqual(stats.delivered, 21)
+        self.assertEqual(stats.segments, 1)
+        await uut.stop()
+        await uut.data_client.disconnect()
+
+    async def test_drain_rejected(self):
+        """Verify messages rejected by httpmq are reported as dropped by the drain"""
+
+        uut = self.outbox(f"http://{self.server.host}:{self.server.port}")
+        self.dataplane.available = False
+        uut.start()
+        for idx in range(5):
+            await uut.publish(subject="subj.a", message=f"msg-{idx}".encode())
+        await asyncio.sleep(0.05)
+        self.assertEqual(uut.get_stats().depth, 5)
+
+        # The first two messages are rejected once the server recovers
+        self.dataplane.rejected_publishes = 2
+        self.dataplane.available = True
+        report = await uut.drain(timeout_sec=5)
+        self.assertTrue(report.completed)
+        self.assertEqual(report.published, 3)
+        self.assertEqual(report.dropped, 2)
+        self.assertEqual(report.pending_publishes, 0)
+        self.assertListEqual(
+            self.published_messages(), [f"msg-{idx}".encode() for idx in range(2, 5)]
+        )
+        await uut.data_client.disconnect()
+
+    async def test_server_down_and_restart(self):
+        """Verify messages held while the server is down are delivered after a reopen"""
+
+        # Find a port nothing listens on
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            down_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+        uut = self.outbox(down_url, fsync_policy="always")
+        uut.start()
+        for idx in range(5):
+            await uut.publish(subject="subj.b", message=f"msg-{idx}".encode())
+        await asyncio.sleep(0.1)
+        self.assertEqual(uut.get_stats().depth, 5)
+        self.assertGreater(uut.get_stats().failed_attempts, 0)
+        await uut.stop()
+        # A stopped outbox rejects new messages, and keeps the pending ones
+        with self.assertRaises(RuntimeError):
+            await uut.publish(subject="subj.b", message=b"after-stop")
+        with self.assertRaises(RuntimeError):
+            uut.start()
+        await uut.data_client.disconnect()
+
+        # Reopen the outbox against a running server
+        uut = self.outbox(f"http://{self.server.host}:{self.server.port}")
+        self.assertEqual(uut.get_stats().depth, 5)
+        uut.start()
+        await asyncio.wait_for(uut.wait_drained(), timeout=5)
+        self.assertListEqual(
+            self.published_messages(), [f"msg-{idx}".encode() for idx in range(5)]
+        )
+        self.assertListEqual(
+            [msg["subject"] for msg in self.dataplane.published], ["subj.b"] * 5
+        )
+        await uut.stop()
+        await uut.data_client.disconnect()
+
+    async def test_fsync_policy(self):
+        """Verify unknown fsync policies are rejected"""
+
+        with self.assertRaises(ValueError):
+            self.outbox("http://127.0.0.1", fsync_policy="sometimes")
@@ -0,0 +1,114 @@
+"""Test bench for httpmq.payload"""
+
+import array
+import asyncio
+import base64
+import io
+import os
+import tempfile
+import unittest
+from httpmq.payload import (
+    as_byte_view,
+    b64decode_chunked,
+    b64encode_buffer,
+    b64encode_buffer_chunked,
+    b64encode_stream,
+    iter_stream_source,
+)
+
+
+async def collect(chunks) -> bytes:
+    """Join all chunks from an async iterator"""
+    return b"".join([bytes(chunk) async for chunk in chunks])
+
+
+async def async_chunks(raw: bytes, sizes):
+    """Yield `raw` split into chunks of the given sizes"""
+    offset = 0
+    for size in sizes:
+        yield memoryview(raw)[offset : offset + size]
+        offset += size
+    yield raw[offset:]
+
+
+class TestPayload(unittest.TestCase):
+    """Test bench for httpmq.payload"""
+
+    def test_b64encode_buffer(self):
+        """Verify Base64 encoding of the different buffer types"""
+
+        raw = bytes(range(256)) * 4
+        test_cases = [
+            {"input": raw, "expect": raw},
+            {"input": bytearray(raw), "expect": raw},
+            {"input": memoryview(raw)[10:100], "expect": raw[10:100]},
+            {"input": memoryview(bytearray(raw))[::3], "expect": raw[::3]},
+            {"input": memoryview(raw).cast("B", shape=[32, 32]), "expect": raw},
+            {
+                "input": array.array("I", [1, 2, 3]),
+                "expect": array.array("I", [1, 2, 3]).tobytes(),
+            },
+            {"input": b"", "expect": b""},
+        ]
+        for one_case in test_cases:
+            self.assertEqual(
+                base64.b64encode(one_case["expect"]),
+                b64encode_buffer(one_case["input"]),
+            )
+
+    def test_as_byte_view_no_copy(self):
+        """Verify contiguous buffers are not copied"""
+
+        raw = bytearray(b"hello world")
+        view = as_byte_view(memoryview(raw)[6:])
+        raw[6:] = b"WORLD"
+        self.assertEqual(view.tobytes(), b"WORLD")
+
+    def test_chunked_codec(self):
+        """Verify chunked Base64 encode and decode match the one-shot versions"""
+
+        for size in [0, 1, 2, 3, 299, 300, 301, 4096]:
+            raw = bytes(idx % 251 for idx in range(size))
+            encoded = base64.b64encode(raw)
+            self.assertEqual(encoded, b64encode_buffer_chunked(raw, chunk_size=30))
+            self.assertEqual(
+                encoded, b64encode_buffer_chunked(memoryview(raw), chunk_size=3)
+            )
+            self.assertEqual(
+                b"AAAA" + encoded,
+                b64encode_buffer_chunked(raw, chunk_size=30, prefix=b"AAAA"),
+            )
+            self.assertEqual(raw, b64decode_chunked(encoded, chunk_size=40))
+            self.assertEqual(raw, b64decode_chunked(encoded.decode(), chunk_size=4))
+            self.assertEqual(
+                raw, b64decode_chunked(memoryview(bytearray(encoded)), chunk_size=8)
+            )
+
+    def test_b64encode_stream(self):
+        """Verify streaming Base64 encode with arbitrary chunk boundaries"""
+
+        raw = bytes(idx % 251 for idx in range(1000))
+        for sizes in [[], [1], [1, 1, 1], [2, 2, 2, 2], [5, 0, 7, 300], [999], [1000]]:
+            self.assertEqual(
+                base64.b64encode(raw),
+                asyncio.run(collect(b64encode_stream(async_chunks(raw, sizes)))),
+            )
+
+    def test_iter_stream_source(self):
+        """Verify reading the payload from the different source types"""
+
+        raw = os.urandom(10000)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "payload")
+            with open(file_path, "wb") as file_obj:
+                file_obj.write(raw)
+            sources = [
+                file_path,
+                io.BytesIO(raw),
+                async_chunks(raw, [10, 100, 1000]),
+            ]
+            for source in sources:
+                self.assertEqual(
+                    raw,
+                    asyncio.run(collect(iter_stream_source(source, chunk_size=999))),
+                )
@@ -0,0 +1,66 @@
+"""Test bench for httpmq.serialization"""
+
+import unittest
+from httpmq import serialization
+
+
+class UpperSerializer(serialization.Serializer):
+    """Custom serializer storing strings in upper case"""
+
+    name = "upper"
+    content_type = "text/x-upper"
+
+    def serialize(self, obj: object) -> bytes:
+        """Serialize an object into a message"""
+        return obj.upper().encode("utf-8")
+
+    def deserialize(self, data) -> object:
+        """Deserialize a message into an object"""
+        return str(data, "utf-8").lower()
+
+
+class TestSerialization(unittest.TestCase):
+    """Test bench for httpmq.serialization"""
+
+    def test_round_trip(self):
+        """Verify all available serializers restore objects"""
+
+        obj = {"name": "sensor", "values": [1, 2.5, None, True], "nested": {"a": "b"}}
+        serializers = serialization.available_serializers()
+        self.assertIn("json", serializers)
+        self.assertIn("raw", serializers)
+        for name, serializer in serializers.items():
+            self.assertEqual(serializer.name, name)
+            self.assertIs(serialization.get_serializer(name), serializer)
+            self.assertIs(serialization.get_serializer(serializer), serializer)
+            self.assertIs(
+                serialization.find_serializer(serializer.content_type), serializer
+            )
+            # Raw and custom serializers do not handle arbitrary objects
+            if name not in ("json", "msgpack"):
+                continue
+            data = serializer.serialize(obj)
+            self.assertDictEqual(serializer.deserialize(data), obj)
+            self.assertDictEqual(serializer.deserialize(memoryview(bytes(data))), obj)
+
+        # Raw messages are passed through
+        raw = serialization.get_serializer("raw")
+        self.assertEqual(bytes(raw.serialize(bytearray(b"abc"))), b"abc")
+        self.assertEqual(raw.deserialize(memoryview(b"abcd")[1:]), b"bcd")
+
+    def test_registry(self):
+        """Verify custom serializers, and unknown names and content types"""
+
+        with self.assertRaises(ValueError):
+            serialization.get_serializer("yaml")
+        self.assertIsNone(serialization.find_serializer("text/yaml"))
+        with self.assertRaises(ValueError):
+            serialization.get_serializer("json").deserialize(b"{not json")
+
+        with self.assertRaises(TypeError):
+            serialization.Serializer()  # pylint: disable=abstract-class-instantiated
+        custom = UpperSerializer()
+        serialization.register_serializer(custom)
+        self.assertIs(serialization.get_serializer("upper"), custom)
+        self.assertIs(serialization.find_serializer("text/x-upper"), custom)
+        self.assertEqual(custom.deserialize(custom.serialize("Hello")), "hello")
@@ -0,0 +1,327 @@
+"""Test bench for httpmq.subscription"""
+
+import asyncio
+import aiohttp
+import httpmq
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+class TestResilientSubscription(DummyDataplaneTestCase):
+    """Test bench for httpmq.subscription.ResilientSubscription"""
+
+    async def wait_for_subscriber(self):
+        """Wait for a push subscription to connect to the stand-in server"""
+        while not self.dataplane.subscribers:
+            await asyncio.sleep(0.01)
+
+    async def test_reconnect(self):
+        """Verify the subscription reconnects after the server closes it, or is down"""
+
+        uut_client = self.data_client()
+        rx_msgs = asyncio.Queue()
+        context = httpmq.RequestContext()
+        uut = httpmq.ResilientSubscription(
+            data_client=uut_client,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            forward_data_cb=rx_msgs.put,
+            context=context,
+            max_msg_inflight=4,
+            loop_interval_sec=0.01,
+            initial_backoff_sec=0.02,
+            max_backoff_sec=0.05,
+        )
+        stop_signal = asyncio.Event()
+        runner = asyncio.create_task(uut.run(stop_signal))
+        await self.wait_for_subscriber()
+        self.assertTrue(uut.get_stats().connected)
+
+        # Case 0: server closes the connection
+        await self.dataplane.close_subscriptions()
+        while self.dataplane.subscribers:
+            await asyncio.sleep(0.01)
+        await self.wait_for_subscriber()
+        await uut_client.publish(
+            subject="subj.a", message=b"msg-0", context=httpmq.RequestContext()
+        )
+        self.assertEqual((await asyncio.wait_for(rx_msgs.get(), 5)).message, b"msg-0")
+        stats = uut.get_stats()
+        self.assertEqual(stats.connects, 2)
+        self.assertEqual(stats.reconnects, 1)
+        self.assertEqual(stats.messages, 1)
+
+        # Case 1: server is down for a while, behind a proxy answering with HTML pages
+        self.dataplane.available = False
+        self.dataplane.proxy_errors = True
+        await self.dataplane.close_subscriptions()
+        await asyncio.sleep(0.2)
+        stats = uut.get_stats()
+        self.assertFalse(stats.connected)
+        self.assertGreater(stats.failed_attempts, 1)
+        self.assertGreater(stats.downtime_sec, 0.1)
+        self.assertIn("503", stats.last_error)
+        self.dataplane.available = True
+        self.dataplane.proxy_errors = False
+        await self.wait_for_subscriber()
+        self.assertTrue(uut.get_stats().connected)
+        self.assertEqual(uut.get_stats().connects, 3)
+
+        # Each connection used the same parameters; the caller context is untouched
+        self.assertDictEqual(
+            self.dataplane.subscribers[0].params,
+            {"subject_name": "subj.*", "max_msg_inflight": "4"},
+        )
+        self.assertDictEqual(context.additional_params, {})
+
+        stop_signal.set()
+        await runner
+        self.assertFalse(uut.get_stats().connected)
+        await uut_client.disconnect()
+
+    async def test_give_up(self):
+        """Verify the subscription ends after too many failed connection attempts"""
+
+        self.dataplane.available = False
+        uut_client = self.data_client()
+        uut = httpmq.ResilientSubscription(
+            data_client=uut_client,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            forward_data_cb=asyncio.Queue().put,
+            initial_backoff_sec=0.01,
+            max_failed_attempts=3,
+        )
+        with self.assertRaises(httpmq.HttpmqAPIError):
+            await asyncio.wait_for(uut.run(asyncio.Event()), timeout=5)
+        self.assertEqual(uut.get_stats().failed_attempts, 3)
+        await uut_client.disconnect()
+
+    async def test_idle_timeout(self):
+        """Verify idle connections are replaced only when the dataplane is not ready"""
+
+        # Subscriptions are not bound by the total request timeout
+        uut_client = httpmq.DataClient(
+            api_client=httpmq.APIClient(
+                base_url=f"http://{self.server.host}:{self.server.port}",
+                http_timeout=aiohttp.ClientTimeout(total=0.3),
+            )
+        )
+        rx_msgs = asyncio.Queue()
+        uut = httpmq.ResilientSubscription(
+            data_client=uut_client,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            forward_data_cb=rx_msgs.put,
+            loop_interval_sec=0.01,
+            initial_backoff_sec=0.02,
+            max_backoff_sec=0.05,
+            idle_timeout_sec=0.1,
+        )
+        stop_signal = asyncio.Event()
+        runner = asyncio.create_task(uut.run(stop_signal))
+        await self.wait_for_subscriber()
+
+        # Case 0: idle, but the dataplane is ready
+        await asyncio.sleep(0.5)
+        stats = uut.get_stats()
+        self.assertTrue(stats.connected)
+        self.assertEqual(stats.connects, 1)
+        self.assertEqual(stats.idle_timeouts, 0)
+
+        # Case 1: the stream goes silent, and the dataplane is not ready
+        self.dataplane.available = False
+        while uut.get_stats().idle_timeouts == 0:
+            await asyncio.sleep(0.01)
+        self.assertIn("no data", uut.get_stats().last_error)
+        self.dataplane.available = True
+        while uut.get_stats().connects < 2:
+            await asyncio.sleep(0.01)
+        await uut_client.publish(
+            subject="subj.a", message=b"msg-0", context=httpmq.RequestContext()
+        )
+        self.assertEqual((await asyncio.wait_for(rx_msgs.get(), 5)).message, b"msg-0")
+
+        stop_signal.set()
+        await runner
+        await uut_client.disconnect()
+
+
+class TestSubscriptionManager(DummyDataplaneTestCase):
+    """Test bench for httpmq.subscription.SubscriptionManager"""
+
+    async def wait_for_subscribers(self, count: int):
+        """Wait for a number of push subscriptions to connect to the stand-in server"""
+        while len(self.dataplane.subscribers) != count:
+            await asyncio.sleep(0.01)
+
+    async def test_many_subscriptions(self):
+        """Verify running, scaling, and removing many subscriptions"""
+
+        uut_client = self.data_client()
+        uut = httpmq.SubscriptionManager(
+            data_client=uut_client, max_concurrent_handlers=4
+        )
+        received = {}
+
+        async def handler(message: httpmq.ReceivedMessage):
+            """Record the message, failing on one of them"""
+            received.setdefault(message.consumer, []).append(message.message)
+            if message.consumer == "c3" and message.message == b"msg-1":
+                raise RuntimeError("handler failure")
+
+        for idx in range(20):
+            uut.add(
+                stream=self.dataplane.stream,
+                consumer=f"c{idx}",
+                subject_filter="subj.*",
+                handler=handler,
+                loop_interval_sec=0.01,
+            )
+        self.assertEqual(len(uut.subscriptions), 20)
+        with self.assertRaises(ValueError):
+            uut.add(self.dataplane.stream, "c0", "subj.*", handler)
+        uut.start()
+        await self.wait_for_subscribers(20)
+
+        for idx in range(5):
+            await uut_client.publish(
+                subject="subj.a",
+                message=f"msg-{idx}".encode(),
+                context=httpmq.RequestContext(),
+            )
+        while uut.get_stats().messages < 100:
+            await asyncio.sleep(0.01)
+        stats = uut.get_stats()
+        self.assertEqual(stats.subscriptions, 20)
+        self.assertEqual(stats.instances, 20)
+        self.assertEqual(stats.connected, 20)
+        self.assertEqual(stats.handler_errors, 1)
+        self.assertEqual(stats.active_handlers, 0)
+        self.assertEqual(stats.per_subscription["test-stream/c3"].handler_errors, 1)
+        self.assertIn(
+            "handler failure", stats.per_subscription["test-stream/c3"].last_error
+        )
+        for idx in range(20):
+            self.assertListEqual(
+                received[f"c{idx}"], [f"msg-{idx}".encode() for idx in range(5)]
+            )
+            self.assertEqual(stats.per_subscription[f"test-stream/c{idx}"].messages, 5)
+
+        # Scale one subscription up, and back down
+        key = uut.add(
+            stream=self.dataplane.stream,
+            consumer="grouped",
+            subject_filter="subj.*",
+            handler=handler,
+            delivery_group="group-a",
+            loop_interval_sec=0.01,
+        )
+        with self.assertRaises(ValueError):
+            await uut.scale("test-stream/c0", 2)
+        await uut.scale(key, 3)
+        await self.wait_for_subscribers(23)
+        self.assertEqual(uut.get_stats().per_subscription[key].instances, 3)
+        self.assertEqual(
+            self.dataplane.subscribers[-1].params["delivery_group"], "group-a"
+        )
+        await uut.scale(key, 1)
+        self.assertEqual(uut.get_stats().per_subscription[key].instances, 1)
+
+        # Remove subscriptions
+        for idx in range(10):
+            await uut.remove(f"test-stream/c{idx}")
+        self.assertEqual(uut.get_stats().subscriptions, 11)
+
+        await uut.stop()
+        self.assertEqual(uut.get_stats().connected, 0)
+        await uut_client.disconnect()
+
+    async def test_restart(self):
+        """Verify failed subscriptions are restarted"""
+
+        self.dataplane.available = False
+        uut_client = self.data_client()
+        uut = httpmq.SubscriptionManager(
+            data_client=uut_client, restart_backoff_sec=0.01
+        )
+        key = uut.add(
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            handler=asyncio.Queue().put,
+            initial_backoff_sec=0.01,
+            max_failed_attempts=1,
+        )
+        uut.start()
+        while uut.get_stats().restarts < 2:
+            await asyncio.sleep(0.01)
+        self.assertIn("503", uut.get_stats().per_subscription[key].last_error)
+        self.dataplane.available = True
+        await self.wait_for_subscribers(1)
+        await uut.stop()
+        await uut_client.disconnect()
+
+    async def test_restart_backoff_reset(self):
+        """Verify the restart backoff is reset once the connection was up"""
+
+        self.dataplane.available = False
+        uut_client = self.data_client()
+        uut = httpmq.SubscriptionManager(
+            data_client=uut_client, restart_backoff_sec=0.01, max_restart_backoff_sec=10
+        )
+        uut.add(
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            handler=asyncio.Queue().put,
+            initial_backoff_sec=0.01,
+            max_failed_attempts=1,
+        )
+        uut.start()
+        # Consecutive failures grow the backoff to 0.64 sec
+        while uut.get_stats().restarts < 7:
+            await asyncio.sleep(0.01)
+        self.dataplane.available = True
+        await self.wait_for_subscribers(1)
+
+        # Failing after connecting restarts quickly again
+        restarts = uut.get_stats().restarts
+        self.dataplane.available = False
+        await self.dataplane.close_subscriptions()
+
+        async def wait_for_restarts():
+            """Wait for the subscription to fail twice more"""
+            while uut.get_stats().restarts < restarts + 2:
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(wait_for_restarts(), timeout=0.5)
+
+        self.dataplane.available = True
+        await uut.stop()
+        await uut_client.disconnect()
+
+    async def test_fair_scheduler(self):
+        """Verify handler slots are handed out round-robin across subscriptions"""
+
+        uut = httpmq.SubscriptionManager.FairScheduler(max_active=1)
+        order = []
+
+        async def run(key: str, idx: int):
+            """Take a slot, and record the order"""
+            await uut.acquire(key)
+            order.append(f"{key}{idx}")
+            await asyncio.sleep(0.01)
+            uut.release()
+
+        await uut.acquire("x")
+        tasks = [asyncio.create_task(run("a", idx)) for idx in range(3)]
+        tasks += [asyncio.create_task(run("b", idx)) for idx in range(2)]
+        await asyncio.sleep(0.01)
+        self.assertEqual(uut.waiting, 5)
+        uut.release()
+        await asyncio.gather(*tasks)
+        self.assertListEqual(order, ["a0", "b0", "a1", "b1", "a2"])
+        self.assertEqual(uut.active, 0)
@@ -0,0 +1,103 @@
+"""Test bench for httpmq.supervisor"""
+
+import asyncio
+import functools
+import os
+import httpmq
+from .dummy_dataplane import DummyDataplaneTestCase
+
+
+def build_client(base_url: str) -> httpmq.DataClient:
+    """Create the data client of a worker process"""
+    return httpmq.DataClient(api_client=httpmq.APIClient(base_url=base_url))
+
+
+def build_handler(data_client: httpmq.DataClient):
+    """Create the message handler of a worker process"""
+
+    async def handler(msg: httpmq.ReceivedMessage):
+        if msg.message == b"crash":
+            # Die without any cleanup, as a crashing worker would
+            os._exit(3)
+        await data_client.send_ack_simple(msg, httpmq.RequestContext())
+
+    return handler
+
+
+class TestConsumerSupervisor(DummyDataplaneTestCase):
+    """Test bench for httpmq.supervisor.ConsumerSupervisor"""
+
+    async def wait_for(self, uut: httpmq.ConsumerSupervisor, condition):
+        """Wait for the supervisor statistics to meet a condition"""
+        for _ in range(600):
+            stats = uut.get_stats()
+            if condition(stats):
+                return stats
+            await asyncio.sleep(0.05)
+        raise AssertionError(f"Condition not met; last stats {vars(uut.get_stats())}")
+
+    async def test_workers(self):
+        """Verify messages are handled by the workers, and crashed workers restart"""
+
+        base_url = f"http://{self.server.host}:{self.server.port}"
+        uut = httpmq.ConsumerSupervisor(
+            client_factory=functools.partial(build_client, base_url),
+            handler_factory=build_handler,
+            stream=self.dataplane.stream,
+            consumer="c0",
+            subject_filter="subj.*",
+            delivery_group="group-0",
+            workers=2,
+            subscription_options={"max_msg_inflight": 4},
+            metrics_interval_sec=0.05,
+            check_interval_sec=0.05,
+            restart_backoff_sec=0.05,
+        )
+        uut.start()
+        await self.wait_for(uut, lambda stats: stats.connected == 2)
+        for subscriber in self.dataplane.subscribers:
+            self.assertEqual(subscriber.params.get("delivery_group"), "group-0")
+
+        # The stand-in server delivers every message to every worker
+        client = build_client(base_url)
+        for idx in range(3):
+            await client.publish(
+                subject="subj.a",
+                message=f"msg-{idx}".encode(),
+                context=httpmq.RequestContext(),
+            )
+        stats = await self.wait_for(uut, lambda stats: stats.messages == 6)
+        self.assertEqual(len(self.dataplane.acks), 6)
+        self.assertEqual([worker.messages for worker in stats.per_worker], [3, 3])
+        self.assertEqual(stats.restarts, 0)
+
+        # Both workers crash, and are restarted
+        pids = [worker.pid for worker in stats.per_worker]
+        await client.publish(
+            subject="subj.a", message=b"crash", context=httpmq.RequestContext()
+        )
+        stats = await self.wait_for(
+            uut, lambda stats: stats.restarts == 2 and stats.connected == 2
+        )
+        for worker, pid in zip(stats.per_worker, pids):
+            self.assertEqual(worker.exit_code, 3)
+            self.assertNotEqual(worker.pid, pid)
+        # Counters carry over the restart
+        self.assertEqual(stats.messages, 6)
+
+        await uut.stop()
+        stats = uut.get_stats()
+        self.assertEqual(stats.alive, 0)
+        self.assertEqual(stats.messages, 6)
+        for worker in stats.per_worker:
+            self.assertEqual(worker.exit_code, 0)
+
+        # A late report of an ended process is not counted again
+        late_report = {"worker_id": 0, "pid": pids[0], "messages": 100}
+        uut._ConsumerSupervisor__metrics.put(  # pylint: disable=protected-access
+            late_report
+        )
+        await asyncio.sleep(0.1)
+        self.assertEqual(uut.get_stats().messages, 6)
+
+        await client.disconnect()